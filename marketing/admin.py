@@ -1,3 +1,26 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import LoyaltyAccount, LoyaltyStamp
+
+
+@admin.register(LoyaltyAccount)
+class LoyaltyAccountAdmin(admin.ModelAdmin):
+    list_display = ("user", "stamps", "updated_at")
+    search_fields = ("user__username",)
+    readonly_fields = ("stamps",)
+
+
+@admin.register(LoyaltyStamp)
+class LoyaltyStampAdmin(admin.ModelAdmin):
+    # journal en ajout seul : lecture uniquement
+    list_display = ("created_at", "user", "delta", "reason", "order", "ref")
+    list_filter = ("reason",)
+    search_fields = ("user__username", "ref")
+    raw_id_fields = ("user", "order")
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -5,4 +5,4 @@ class MarketingConfig(AppConfig):
     name = "marketing"
 
     def ready(self):
-        from . import signals  # noqa
+        from . import handlers, signals  # noqa
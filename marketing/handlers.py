@@ -0,0 +1,31 @@
+"""
+Handlers outbox du marketing (enregistrés dans MarketingConfig.ready).
+Idempotents : un événement rejoué ne crédite ni ne récompense deux fois.
+"""
+from orders import outbox
+from orders.models import Order
+
+from . import loyalty
+from .models import Referral
+from .services import ReferralService
+
+
+def _order_ids(events):
+    return {e.payload["order_id"] for e in events}
+
+
+@outbox.register("order.delivered")
+def credit_loyalty(events):
+    # tout le lot en requêtes groupées (quantités agrégées par utilisateur)
+    loyalty.credit_orders(_order_ids(events))
+
+
+@outbox.register("order.delivered")
+def reward_referrals(events):
+    # seuls les filleuls encore en attente sont examinés
+    orders = Order.objects.filter(
+        id__in=_order_ids(events),
+        user__referral_received__status=Referral.Status.PENDING,
+    )
+    for order in orders:
+        ReferralService.try_qualify_and_reward(order)
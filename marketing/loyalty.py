@@ -0,0 +1,160 @@
+"""
+Moteur de fidélité unique : 8 plats livrés => 1 bon "plat offert".
+
+- LoyaltyStamp : journal en ajout seul, une ligne par événement (clé ``ref``
+  unique => un même événement n'est jamais compté deux fois) ;
+- LoyaltyAccount.stamps : solde matérialisé, lecture O(1), mis à jour par
+  UPDATE ... SET stamps = stamps + n dans la même transaction que le journal ;
+- bons émis en un seul INSERT (bulk_create) par crédit ;
+- livraison en lot : credit_orders() crédite N commandes en requêtes groupées.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import FreeItemVoucher, LoyaltyAccount, LoyaltyStamp
+
+
+STAMPS_TARGET = 8
+VOUCHER_MAX_VALUE = Decimal("2000.00")
+VOUCHER_DAYS_VALID = 30
+
+
+def balance(user) -> int:
+    return LoyaltyAccount.objects.filter(user=user).values_list("stamps", flat=True).first() or 0
+
+
+def _new_vouchers(user, count, max_item_value=VOUCHER_MAX_VALUE, expires_at=None):
+    expires_at = expires_at or timezone.now() + timedelta(days=VOUCHER_DAYS_VALID)
+    return [FreeItemVoucher(user=user, max_item_value=max_item_value, expires_at=expires_at) for _ in range(count)]
+
+
+@transaction.atomic
+def credit(user, stamps: int, reason=LoyaltyStamp.Reason.ORDER, order=None, ref=None) -> int:
+    """
+    Ajoute ``stamps`` tampons et émet les bons atteints.
+    Retourne le nombre de bons émis (0 si ``ref`` déjà enregistrée).
+    """
+    if stamps <= 0:
+        return 0
+    try:
+        with transaction.atomic():
+            LoyaltyStamp.objects.create(user=user, delta=stamps, reason=reason, order=order, ref=ref)
+    except IntegrityError:
+        return 0  # déjà crédité
+
+    LoyaltyAccount.objects.bulk_create([LoyaltyAccount(user=user)], ignore_conflicts=True)
+    account = LoyaltyAccount.objects.filter(user=user)
+    account.update(stamps=F("stamps") + stamps, updated_at=timezone.now())
+
+    current = account.select_for_update().values_list("stamps", flat=True).get()
+    vouchers = current // STAMPS_TARGET
+    if not vouchers:
+        return 0
+
+    spent = vouchers * STAMPS_TARGET
+    account.update(stamps=F("stamps") - spent)
+    LoyaltyStamp.objects.create(
+        user=user, delta=-spent, reason=LoyaltyStamp.Reason.VOUCHER, order=order,
+        ref=f"{ref}:vouchers" if ref else None,
+    )
+    FreeItemVoucher.objects.bulk_create(_new_vouchers(user, vouchers))
+    return vouchers
+
+
+def _per_user(values: dict):
+    """CASE user_id WHEN .. THEN n .. END : une seule requête pour tous les comptes."""
+    return Case(
+        *(When(user_id=user_id, then=Value(n)) for user_id, n in values.items()),
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+@transaction.atomic
+def credit_orders(order_ids) -> int:
+    """
+    Crédite un lot de commandes livrées en requêtes groupées, quel que soit
+    le nombre de commandes : quantités agrégées par commande, journal et bons
+    en bulk_create, soldes mis à jour par un UPDATE ... CASE par utilisateur.
+    Idempotent (ref "order:<id>"). Retourne le nombre de bons émis.
+    """
+    from orders.models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(order_id__in=list(order_ids), order__user__isnull=False)
+        .values("order_id", "order__user_id")
+        .annotate(meals=Sum("quantity"))
+    )
+    per_order = {r["order_id"]: (r["order__user_id"], r["meals"]) for r in rows if r["meals"] > 0}
+    done = set(
+        LoyaltyStamp.objects.filter(ref__in=[f"order:{pk}" for pk in per_order]).values_list("ref", flat=True)
+    )
+    per_order = {pk: v for pk, v in per_order.items() if f"order:{pk}" not in done}
+    if not per_order:
+        return 0
+
+    gained = {}
+    for user_id, meals in per_order.values():
+        gained[user_id] = gained.get(user_id, 0) + meals
+
+    LoyaltyStamp.objects.bulk_create([
+        LoyaltyStamp(user_id=user_id, delta=meals, reason=LoyaltyStamp.Reason.ORDER, order_id=pk, ref=f"order:{pk}")
+        for pk, (user_id, meals) in per_order.items()
+    ])
+    LoyaltyAccount.objects.bulk_create([LoyaltyAccount(user_id=u) for u in gained], ignore_conflicts=True)
+    accounts = LoyaltyAccount.objects.filter(user_id__in=list(gained))
+    accounts.update(stamps=F("stamps") + _per_user(gained), updated_at=timezone.now())
+
+    spent = {
+        user_id: (stamps // STAMPS_TARGET) * STAMPS_TARGET
+        for user_id, stamps in accounts.select_for_update().values_list("user_id", "stamps")
+        if stamps >= STAMPS_TARGET
+    }
+    if not spent:
+        return 0
+
+    accounts.filter(user_id__in=list(spent)).update(stamps=F("stamps") - _per_user(spent))
+    LoyaltyStamp.objects.bulk_create([
+        LoyaltyStamp(user_id=user_id, delta=-n, reason=LoyaltyStamp.Reason.VOUCHER) for user_id, n in spent.items()
+    ])
+    expires_at = timezone.now() + timedelta(days=VOUCHER_DAYS_VALID)
+    vouchers = [
+        FreeItemVoucher(user_id=user_id, max_item_value=VOUCHER_MAX_VALUE, expires_at=expires_at)
+        for user_id, n in spent.items()
+        for _ in range(n // STAMPS_TARGET)
+    ]
+    FreeItemVoucher.objects.bulk_create(vouchers)
+    return len(vouchers)
+
+
+def credit_order(order) -> int:
+    """Crédite une commande livrée (idempotent : une fois par commande)."""
+    return credit_orders([order.pk])
+
+
+def issue_vouchers(user, count: int, **kwargs) -> list:
+    """Bons hors tampons (import, geste commercial) : un seul INSERT."""
+    return FreeItemVoucher.objects.bulk_create(_new_vouchers(user, count, **kwargs))
+
+
+def available_voucher(user, now=None):
+    """(id, valeur max) du bon valable le plus ancien, ou None."""
+    return (
+        FreeItemVoucher.objects
+        .filter(user=user, status=FreeItemVoucher.Status.AVAILABLE, expires_at__gt=now or timezone.now())
+        .order_by("expires_at", "id")
+        .values_list("id", "max_item_value")
+        .first()
+    )
+
+
+def use_voucher(voucher_id, order) -> bool:
+    """Consomme le bon (conditionnel : un double clic ne l'utilise pas deux fois)."""
+    return bool(
+        FreeItemVoucher.objects
+        .filter(pk=voucher_id, status=FreeItemVoucher.Status.AVAILABLE)
+        .update(status=FreeItemVoucher.Status.USED, used_order=order)
+    )
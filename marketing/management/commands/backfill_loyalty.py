@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from marketing import loyalty
+from marketing.models import LoyaltyAccount, LoyaltyStamp
+from orders.models import FreeMealVoucher, LoyaltyAccount as LegacyAccount
+from shop.models import Meal
+
+
+class Command(BaseCommand):
+    help = (
+        "Replie les anciennes données de fidélité dans le journal : "
+        "soldes marketing existants, points orders.LoyaltyAccount, FreeMealVoucher non utilisés. "
+        "Relançable sans double comptage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            opened = self._open_balances()
+            points, issued = self._fold_points()
+            converted = self._convert_vouchers()
+            if opts["dry_run"]:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{opened} solde(s) d'ouverture, {points} compte(s) orders repliés ({issued} bon(s) émis), "
+            f"{converted} FreeMealVoucher convertis"
+            + (" [dry-run, rien d'écrit]" if opts["dry_run"] else "")
+        )
+
+    def _open_balances(self):
+        """Solde marketing déjà présent sans journal => écriture d'ouverture."""
+        journaled = dict(
+            LoyaltyStamp.objects.values("user_id").annotate(n=Sum("delta")).values_list("user_id", "n")
+        )
+        rows = [
+            LoyaltyStamp(
+                user_id=user_id, delta=stamps - journaled.get(user_id, 0),
+                reason=LoyaltyStamp.Reason.LEGACY, ref=f"legacy:opening:{user_id}",
+            )
+            for user_id, stamps in LoyaltyAccount.objects.values_list("user_id", "stamps")
+            if stamps != journaled.get(user_id, 0)
+        ]
+        return len(LoyaltyStamp.objects.bulk_create(rows, ignore_conflicts=True))
+
+    def _fold_points(self):
+        """orders.LoyaltyAccount.points => tampons (un utilisateur peut avoir plusieurs lignes)."""
+        per_user = (
+            LegacyAccount.objects.filter(user__isnull=False, points__gt=0)
+            .values("user").annotate(points=Sum("points"))
+        )
+        folded = issued = 0
+        for row in per_user:
+            issued += loyalty.credit(
+                self._user(row["user"]), row["points"],
+                reason=LoyaltyStamp.Reason.LEGACY, ref=f"legacy:points:{row['user']}",
+            )
+            folded += 1
+        LegacyAccount.objects.filter(user__isnull=False, points__gt=0).update(points=0)
+        return folded, issued
+
+    def _convert_vouchers(self):
+        """FreeMealVoucher (sans plafond) => FreeItemVoucher plafonné au plat le plus cher."""
+        cap = max(
+            Meal.objects.aggregate(m=Max("price"))["m"] or loyalty.VOUCHER_MAX_VALUE,
+            loyalty.VOUCHER_MAX_VALUE,
+        )
+        per_user = (
+            FreeMealVoucher.objects.filter(is_used=False)
+            .values("user").annotate(n=Count("id"))
+        )
+        converted = 0
+        for row in per_user:
+            loyalty.issue_vouchers(self._user(row["user"]), row["n"], max_item_value=cap)
+            converted += row["n"]
+        FreeMealVoucher.objects.filter(is_used=False).update(is_used=True)
+        return converted
+
+    @staticmethod
+    def _user(user_id):
+        return get_user_model()(pk=user_id)
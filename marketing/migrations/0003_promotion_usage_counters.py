@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 10:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    Promotion = apps.get_model("marketing", "Promotion")
+    PromotionRedemption = apps.get_model("marketing", "PromotionRedemption")
+    PromotionUserUsage = apps.get_model("marketing", "PromotionUserUsage")
+
+    applied = PromotionRedemption.objects.filter(status="APPLIED")
+    for row in applied.values("promotion_id").annotate(n=Count("id")):
+        Promotion.objects.filter(pk=row["promotion_id"]).update(used_count=row["n"])
+
+    PromotionUserUsage.objects.bulk_create([
+        PromotionUserUsage(promotion_id=row["promotion_id"], user_id=row["user_id"], used_count=row["n"])
+        for row in applied.values("promotion_id", "user_id").annotate(n=Count("id"))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotion',
+            name='used_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PromotionUserUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('used_count', models.PositiveIntegerField(default=0)),
+                ('promotion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_usages', to='marketing.promotion')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promo_usages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('promotion', 'user'), name='uniq_promo_user_usage')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -42,6 +42,9 @@ class Promotion(models.Model):
     usage_limit_total = models.PositiveIntegerField(null=True, blank=True)
     usage_limit_per_user = models.PositiveIntegerField(null=True, blank=True)
 
+    # compteur dénormalisé des redemptions APPLIED (voir marketing.promotions)
+    used_count = models.PositiveIntegerField(default=0)
+
     non_cumulable = models.BooleanField(default=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -89,6 +92,18 @@ class PromotionRedemption(models.Model):
         ]
 
 
+class PromotionUserUsage(models.Model):
+    """Compteur par (promo, utilisateur) des redemptions APPLIED."""
+    promotion = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name="user_usages")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="promo_usages")
+    used_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["promotion", "user"], name="uniq_promo_user_usage"),
+        ]
+
+
 class ReferralCode(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="referral_code")
     code = models.CharField(max_length=24, unique=True)  # uppercase
@@ -151,10 +166,33 @@ class RewardLedger(models.Model):
 
 class LoyaltyAccount(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="loyalty")
-    stamps = models.PositiveIntegerField(default=0)  # number of paid meals counted
+    # solde matérialisé = somme des LoyaltyStamp.delta (voir marketing.loyalty)
+    stamps = models.PositiveIntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class LoyaltyStamp(models.Model):
+    """Journal des tampons, en ajout seul : jamais modifié ni supprimé."""
+    class Reason(models.TextChoices):
+        ORDER = "ORDER", "Order delivered"
+        VOUCHER = "VOUCHER", "Vouchers issued"
+        LEGACY = "LEGACY", "Legacy import"
+        ADJUST = "ADJUST", "Manual adjustment"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="loyalty_stamps")
+    delta = models.IntegerField()  # + tampons gagnés / - tampons convertis en bons
+    reason = models.CharField(max_length=12, choices=Reason.choices)
+    order = models.ForeignKey(
+        "orders.Order", on_delete=models.SET_NULL, null=True, blank=True, related_name="loyalty_stamps"
+    )
+    # clé d'idempotence ("order:12", "legacy:points:3"...) : un événement = une écriture
+    ref = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_at"])]
+
+
 class FreeItemVoucher(models.Model):
     class Status(models.TextChoices):
         AVAILABLE = "AVAILABLE", "Available"
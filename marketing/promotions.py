@@ -0,0 +1,338 @@
+"""
+Moteur de promotions unique (panier session + API marketing).
+
+Les promos actives sont chargées une fois par process dans un index par code,
+et les règles de chaque promo sont "compilées" en une liste de contrôles :
+une promo sans minimum, sans plafond d'usage et ouverte à tous n'exécute aucun
+contrôle inutile et ne coûte aucune requête.
+
+L'index est reconstruit :
+- quand une Promotion est modifiée (version partagée dans le cache) ;
+- à la prochaine borne start_at/end_at d'une promo indexée.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Promotion, PromotionRedemption, PromotionUserUsage
+
+
+VERSION_CACHE_KEY = "marketing:promotions:version"
+
+INACTIVE_DAYS = 30
+
+
+@dataclass(frozen=True)
+class PromoResult:
+    ok: bool
+    reason: str = ""
+    discount: Decimal = Decimal("0.00")
+
+
+# ---------- règles ----------
+
+def _segment_ok(user, segment: str) -> bool:
+    from orders.models import Order
+    from orders.states import PAID  # statuts "déjà client"
+
+    if segment == Promotion.Segment.NEW:
+        return not Order.objects.filter(user=user, status__in=PAID).exists()
+
+    if segment == Promotion.Segment.INACTIVE_30D:
+        last = (
+            Order.objects.filter(user=user, status__in=PAID)
+            .order_by("-created_at")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        return last is None or (timezone.now() - last).days >= INACTIVE_DAYS
+
+    return False
+
+
+class CompiledPromo:
+    """Promo figée + ses contrôles pré-calculés."""
+
+    def __init__(self, promo: Promotion):
+        self.id = promo.id
+        self.code = promo.code
+        self.promo_type = promo.promo_type
+        self.value = promo.value
+        self.min_order_amount = promo.min_order_amount
+        self.max_discount_amount = promo.max_discount_amount
+        self.segment = promo.segment
+        self.start_at = promo.start_at
+        self.end_at = promo.end_at
+        self.usage_limit_total = promo.usage_limit_total
+        self.usage_limit_per_user = promo.usage_limit_per_user
+        self._checks = self._compile_checks(promo)
+        self._compute = self._compile_compute()
+
+    def _compile_checks(self, promo: Promotion):
+        # chaque contrôle: (subtotal, user, now) -> raison d'échec ou None
+        checks = []
+
+        if not promo.is_active:
+            checks.append(lambda subtotal, user, now: "PROMO_INACTIVE")
+            return checks
+
+        start_at, end_at = self.start_at, self.end_at
+        if start_at or end_at:
+            def window(subtotal, user, now):
+                if (start_at and now < start_at) or (end_at and now > end_at):
+                    return "PROMO_INACTIVE"
+            checks.append(window)
+
+        if self.segment != Promotion.Segment.ALL:
+            segment = self.segment
+
+            def segment_check(subtotal, user, now):
+                if not user:
+                    return "LOGIN_REQUIRED"
+                if not _segment_ok(user, segment):
+                    return "NOT_ELIGIBLE"
+            checks.append(segment_check)
+
+        if self.min_order_amount:
+            min_order = self.min_order_amount
+            checks.append(lambda subtotal, user, now: "MIN_ORDER_NOT_MET" if subtotal < min_order else None)
+
+        # limites : lecture O(1) des compteurs (la vraie garantie est
+        # l'incrément conditionnel de reserve_usage au moment de la redemption)
+        promo_id = self.id
+        if self.usage_limit_total is not None:
+            total_cap = self.usage_limit_total
+
+            def total_limit(subtotal, user, now):
+                if used_total(promo_id) >= total_cap:
+                    return "PROMO_LIMIT_REACHED"
+            checks.append(total_limit)
+
+        if self.usage_limit_per_user is not None:
+            user_cap = self.usage_limit_per_user
+
+            def user_limit(subtotal, user, now):
+                if user and used_by_user(promo_id, user.pk) >= user_cap:
+                    return "USER_LIMIT_REACHED"
+            checks.append(user_limit)
+
+        return tuple(checks)
+
+    def _compile_compute(self):
+        value, cap = self.value, self.max_discount_amount
+
+        if self.promo_type == Promotion.PromoType.PERCENT:
+            rate = value / Decimal("100")
+
+            def base(subtotal):
+                return (subtotal * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        elif self.promo_type == Promotion.PromoType.FIXED_AMOUNT:
+            def base(subtotal):
+                return value
+        else:
+            # FREE_ITEM : géré via bon / fidélité, pas de remise directe
+            def base(subtotal):
+                return Decimal("0.00")
+
+        if cap is None:
+            return lambda subtotal: min(base(subtotal), subtotal)
+        return lambda subtotal: min(base(subtotal), cap, subtotal)
+
+    def evaluate(self, subtotal: Decimal, user=None, now=None) -> PromoResult:
+        now = now or timezone.now()
+        for check in self._checks:
+            reason = check(subtotal, user, now)
+            if reason:
+                return PromoResult(False, reason)
+        return PromoResult(True, discount=self._compute(subtotal))
+
+    def __repr__(self):
+        return f"<CompiledPromo {self.code}>"
+
+
+# ---------- compteurs d'usage ----------
+
+class UsageLimitReached(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def used_total(promo_id: int) -> int:
+    return Promotion.objects.filter(pk=promo_id).values_list("used_count", flat=True).first() or 0
+
+
+def used_by_user(promo_id: int, user_id: int) -> int:
+    return (
+        PromotionUserUsage.objects
+        .filter(promotion_id=promo_id, user_id=user_id)
+        .values_list("used_count", flat=True)
+        .first()
+    ) or 0
+
+
+def reserve_usage(promo: CompiledPromo, user) -> None:
+    """
+    Incrément conditionnel des compteurs (UPDATE ... WHERE used_count < limite).
+    Lève UsageLimitReached si une limite est atteinte ; rien n'est incrémenté.
+    """
+    with transaction.atomic():
+        qs = Promotion.objects.filter(pk=promo.id)
+        if promo.usage_limit_total is not None:
+            qs = qs.filter(used_count__lt=promo.usage_limit_total)
+        if not qs.update(used_count=F("used_count") + 1):
+            raise UsageLimitReached("PROMO_LIMIT_REACHED")
+
+        if user is None:
+            return
+        PromotionUserUsage.objects.bulk_create(
+            [PromotionUserUsage(promotion_id=promo.id, user_id=user.pk)],
+            ignore_conflicts=True,
+        )
+        qs = PromotionUserUsage.objects.filter(promotion_id=promo.id, user_id=user.pk)
+        if promo.usage_limit_per_user is not None:
+            qs = qs.filter(used_count__lt=promo.usage_limit_per_user)
+        if not qs.update(used_count=F("used_count") + 1):
+            raise UsageLimitReached("USER_LIMIT_REACHED")
+
+
+def release_usage(promo_id: int, user_id: int | None, n: int = 1) -> None:
+    Promotion.objects.filter(pk=promo_id).update(used_count=Greatest(F("used_count") - n, 0))
+    if user_id is not None:
+        PromotionUserUsage.objects.filter(promotion_id=promo_id, user_id=user_id).update(
+            used_count=Greatest(F("used_count") - n, 0)
+        )
+
+
+@transaction.atomic
+def redeem(promo: CompiledPromo, user, order, discount: Decimal, **extra) -> PromotionRedemption:
+    """Crée une redemption APPLIED en consommant les compteurs."""
+    reserve_usage(promo, user)
+    return PromotionRedemption.objects.create(
+        promotion_id=promo.id,
+        user=user,
+        order=order,
+        discount_amount=discount,
+        **extra,
+    )
+
+
+@transaction.atomic
+def end_redemptions(redemptions, status=PromotionRedemption.Status.CANCELLED) -> int:
+    """
+    Passe des redemptions APPLIED en CANCELLED/REVERSED et rend les usages.
+    ``redemptions`` est un queryset de PromotionRedemption.
+    """
+    rows = list(
+        redemptions.select_for_update()
+        .filter(status=PromotionRedemption.Status.APPLIED)
+        .values_list("id", "promotion_id", "user_id")
+    )
+    if not rows:
+        return 0
+    PromotionRedemption.objects.filter(
+        id__in=[r[0] for r in rows], status=PromotionRedemption.Status.APPLIED
+    ).update(status=status)
+
+    per_key = {}
+    for _, promo_id, user_id in rows:
+        per_key[(promo_id, user_id)] = per_key.get((promo_id, user_id), 0) + 1
+    for (promo_id, user_id), n in per_key.items():
+        release_usage(promo_id, user_id, n)
+    return len(rows)
+
+
+# ---------- index ----------
+
+class PromoIndex:
+    def __init__(self, version: int, promos, expires_at):
+        self.version = version
+        self.by_code = {p.code: p for p in promos}
+        self.expires_at = expires_at
+
+
+_lock = threading.Lock()
+_index: PromoIndex | None = None
+
+# au-delà, on recharge quand même (filet de sécurité si le cache a été vidé)
+MAX_INDEX_AGE = timedelta(minutes=15)
+
+
+def current_version() -> int:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, time.time_ns() // 1_000_000, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def bump_version() -> None:
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.add(VERSION_CACHE_KEY, time.time_ns() // 1_000_000, timeout=None)
+
+
+def _build(version: int, now) -> PromoIndex:
+    promos = list(
+        Promotion.objects
+        .filter(is_active=True)
+        .filter(Q(end_at__isnull=True) | Q(end_at__gt=now))
+    )
+    # prochaine borne : une promo démarre ou se termine => l'index expire
+    expires_at = now + MAX_INDEX_AGE
+    for p in promos:
+        for boundary in (p.start_at, p.end_at):
+            if boundary and now < boundary < expires_at:
+                expires_at = boundary
+    return PromoIndex(version, [CompiledPromo(p) for p in promos], expires_at)
+
+
+def get_index(now=None) -> PromoIndex:
+    global _index
+    now = now or timezone.now()
+    version = current_version()
+    index = _index
+    if index is None or index.version != version or now >= index.expires_at:
+        with _lock:
+            index = _index
+            if index is None or index.version != version or now >= index.expires_at:
+                index = _index = _build(version, now)
+    return index
+
+
+def normalize_code(code) -> str:
+    return (code or "").strip().upper()
+
+
+def get_promo(code) -> CompiledPromo | None:
+    return get_index().by_code.get(normalize_code(code))
+
+
+def compile_promotion(promo: Promotion) -> CompiledPromo:
+    """Version compilée d'une instance précise (indexée si possible)."""
+    compiled = get_promo(promo.code)
+    if compiled is None or compiled.id != promo.id:
+        compiled = CompiledPromo(promo)
+    return compiled
+
+
+def evaluate(code, subtotal: Decimal, user=None) -> tuple[CompiledPromo | None, PromoResult]:
+    """Point d'entrée unique : (promo compilée ou None, résultat)."""
+    code = normalize_code(code)
+    if not code:
+        return None, PromoResult(False, "EMPTY_CODE")
+    promo = get_promo(code)
+    if promo is None:
+        return None, PromoResult(False, "PROMO_NOT_FOUND")
+    return promo, promo.evaluate(subtotal, user)
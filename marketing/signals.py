@@ -1,12 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from orders.models import Order
-from .services import ReferralService, LoyaltyService
+from . import promotions
+from .models import Promotion
 
 
-@receiver(post_save, sender=Order)
-def on_order_paid(sender, instance: Order, created, **kwargs):
-    # déclencher uniquement au passage PAID
-    if instance.status == "PAID":
-        ReferralService.try_qualify_and_reward(instance)
-        LoyaltyService.on_order_paid(instance)
+@receiver([post_save, post_delete], sender=Promotion)
+def on_promotion_changed(sender, **kwargs):
+    # index des promos reconstruit paresseusement par chaque worker
+    transaction.on_commit(promotions.bump_version)
@@ -1,3 +1,175 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import loyalty, promotions
+from .models import FreeItemVoucher, LoyaltyStamp, Promotion, PromotionRedemption, PromotionUserUsage
+from orders.models import FreeMealVoucher, LoyaltyAccount as LegacyAccount, Order, OrderItem
+from shop.models import Category, Meal
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class PromotionUsageCounterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("client", password="x")
+        self.promo = Promotion.objects.create(
+            name="Lancement", code="LAUNCH", promo_type=Promotion.PromoType.FIXED_AMOUNT,
+            value=Decimal("500"), usage_limit_total=5, usage_limit_per_user=2,
+        )
+
+    def _order(self, user=None):
+        return Order.objects.create(user=user or self.user, customer_name="c", phone="1", address="a")
+
+    def test_per_user_limit(self):
+        compiled = promotions.CompiledPromo(self.promo)
+        promotions.redeem(compiled, self.user, self._order(), Decimal("500"))
+        promotions.redeem(compiled, self.user, self._order(), Decimal("500"))
+        with self.assertRaises(promotions.UsageLimitReached):
+            promotions.redeem(compiled, self.user, self._order(), Decimal("500"))
+
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.used_count, 2)
+        self.assertEqual(compiled.evaluate(Decimal("1000"), self.user).reason, "USER_LIMIT_REACHED")
+
+    def test_cancel_releases_counters(self):
+        compiled = promotions.CompiledPromo(self.promo)
+        order = self._order()
+        promotions.redeem(compiled, self.user, order, Decimal("500"))
+
+        self.assertEqual(promotions.end_redemptions(PromotionRedemption.objects.filter(order=order)), 1)
+        # deuxième annulation : plus rien d'APPLIED, les compteurs ne bougent pas
+        self.assertEqual(promotions.end_redemptions(PromotionRedemption.objects.filter(order=order)), 0)
+
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.used_count, 0)
+        self.assertEqual(PromotionUserUsage.objects.get(promotion=self.promo, user=self.user).used_count, 0)
+
+    def test_parallel_redemptions_never_overshoot(self):
+        users = [get_user_model().objects.create_user(f"u{i}", password="x") for i in range(20)]
+        orders = [self._order(u) for u in users]
+        compiled = promotions.CompiledPromo(self.promo)
+        barrier = threading.Barrier(len(users))
+        results = []
+
+        def worker(user, order):
+            barrier.wait()
+            try:
+                for _ in range(50):  # SQLite : réessayer si la base est verrouillée
+                    try:
+                        promotions.redeem(compiled, user, order, Decimal("500"))
+                        results.append(True)
+                        return
+                    except OperationalError:
+                        continue
+                    except promotions.UsageLimitReached:
+                        results.append(False)
+                        return
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=pair) for pair in zip(users, orders)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.promo.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(self.promo.used_count, 5)
+        self.assertEqual(PromotionRedemption.objects.filter(promotion=self.promo, status="APPLIED").count(), 5)
+
+
+class LoyaltyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [get_user_model().objects.create_user(f"client{i}", password="x") for i in range(3)]
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.meal = Meal.objects.create(category=category, name="Garba", slug="garba", price=Decimal("1500"))
+
+    def _vouchers(self, user):
+        return FreeItemVoucher.objects.filter(user=user).count()
+
+    def _delivered(self, user, meals):
+        order = Order.objects.create(user=user, customer_name="c", phone="1", address="a", status="delivered")
+        OrderItem.objects.create(order=order, meal=self.meal, quantity=meals, unit_price=self.meal.price)
+        return order.pk
+
+    def test_credit_is_idempotent_by_ref(self):
+        user = self.users[0]
+        self.assertEqual(loyalty.credit(user, 10, ref="geste:1"), 1)
+        self.assertEqual(loyalty.credit(user, 10, ref="geste:1"), 0)
+        self.assertEqual(loyalty.balance(user), 2)
+        self.assertEqual(self._vouchers(user), 1)
+        self.assertEqual(LoyaltyStamp.objects.filter(user=user, ref="geste:1").count(), 1)
+
+    def test_credit_orders_in_bulk(self):
+        a, b, c = self.users
+        orders = [self._delivered(a, 9), self._delivered(a, 8), self._delivered(b, 3), self._delivered(c, 16)]
+        self.assertEqual(loyalty.credit_orders(orders), 4)
+        self.assertEqual(loyalty.credit_orders(orders), 0)  # déjà crédité : ref "order:<id>"
+
+        self.assertEqual([self._vouchers(u) for u in self.users], [2, 0, 2])
+        self.assertEqual([loyalty.balance(u) for u in self.users], [1, 3, 0])
+
+    def test_credit_orders_query_count_does_not_grow(self):
+        few = [self._delivered(self.users[0], 8)]
+        many = [self._delivered(u, 8) for u in self.users for _ in range(3)]
+        counts = []
+        for order_ids in (few, many):
+            with CaptureQueriesContext(connection) as ctx:
+                loyalty.credit_orders(order_ids)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(FreeItemVoucher.objects.count(), 1 + 9)
+
+    def test_backfill_can_be_rerun(self):
+        user = self.users[0]
+        LegacyAccount.objects.create(user=user, points=11)
+        FreeMealVoucher.objects.bulk_create([FreeMealVoucher(user=user) for _ in range(2)])
+
+        call_command("backfill_loyalty", stdout=StringIO())
+        call_command("backfill_loyalty", stdout=StringIO())
+
+        self.assertEqual(loyalty.balance(user), 3)
+        self.assertEqual(self._vouchers(user), 3)  # 1 pour 8 points + 2 convertis
+        self.assertEqual(
+            sum(LoyaltyStamp.objects.filter(user=user).values_list("delta", flat=True)), loyalty.balance(user)
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class PromoIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("client", password="x")
+        Promotion.objects.create(name="Midi", code="MIDI10", promo_type=Promotion.PromoType.PERCENT,
+                                 value=Decimal("10"), max_discount_amount=Decimal("300"))
+        Promotion.objects.create(name="Gros panier", code="GROS", promo_type=Promotion.PromoType.FIXED_AMOUNT,
+                                 value=Decimal("500"), min_order_amount=Decimal("5000"))
+
+    def setUp(self):
+        cache.clear()
+        promotions.get_index()  # index chargé hors mesure
+
+    def test_warm_index_evaluates_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(promotions.evaluate("midi10", Decimal("2000"), self.user)[1].discount, Decimal("200.00"))
+            self.assertEqual(promotions.evaluate(" MIDI10 ", Decimal("9000"))[1].discount, Decimal("300"))
+            self.assertEqual(promotions.evaluate("GROS", Decimal("1000"))[1].reason, "MIN_ORDER_NOT_MET")
+            self.assertEqual(promotions.evaluate("NOPE", Decimal("1000"))[1].reason, "PROMO_NOT_FOUND")
+
+    def test_index_reloads_after_a_change(self):
+        Promotion.objects.filter(code="GROS").update(is_active=False)
+        promotions.bump_version()  # TestCase ne commit jamais : on_commit(bump_version) ne part pas
+        self.assertEqual(promotions.evaluate("GROS", Decimal("9000"))[1].reason, "PROMO_NOT_FOUND")
+        with self.assertNumQueries(0):
+            promotions.evaluate("MIDI10", Decimal("2000"))
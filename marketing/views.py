@@ -3,9 +3,11 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 
+from orders import states
 from orders.models import Order
 from .serializers import PromoApplySerializer, ReferralApplySerializer, VoucherRedeemSerializer, VoucherSerializer
 from .services import PromoService, ReferralService, LoyaltyService
+from . import loyalty
 from .models import FreeItemVoucher
 
 
@@ -16,7 +18,7 @@ class ApplyPromoView(APIView):
         ser = PromoApplySerializer(data=request.data)
         ser.is_valid(raise_exception=True)
 
-        order = get_object_or_404(Order, id=order_id, user=request.user, status="DRAFT")
+        order = get_object_or_404(Order, id=order_id, user=request.user, status=states.PENDING)
         res = PromoService.apply_promo(
             request.user,
             order,
@@ -52,6 +54,8 @@ class LoyaltyStatusView(APIView):
     def get(self, request):
         vouchers = FreeItemVoucher.objects.filter(user=request.user).order_by("-created_at")[:20]
         return Response({
+            "stamps": loyalty.balance(request.user),
+            "stamps_target": loyalty.STAMPS_TARGET,
             "vouchers": VoucherSerializer(vouchers, many=True).data
         })
 
@@ -63,6 +67,6 @@ class RedeemVoucherView(APIView):
         ser = VoucherRedeemSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
 
-        order = get_object_or_404(Order, id=order_id, user=request.user, status="DRAFT")
+        order = get_object_or_404(Order, id=order_id, user=request.user, status=states.PENDING)
         ok, reason, discount = LoyaltyService.redeem_voucher(request.user, order, ser.validated_data["voucher_id"])
         return Response({"ok": ok, "reason": reason, "discount": str(discount)})
@@ -1,4 +1,5 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from . import states
 from .models import Order, OrderItem
 
 
@@ -14,7 +15,26 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at', 'user')
     search_fields = ('customer_name', 'phone', 'user__username')
     inlines = [OrderItemInline]
-    readonly_fields = ('total', 'created_at')
+    readonly_fields = ('status', 'total', 'created_at', 'version')
+    actions = ['confirm_orders', 'deliver_orders', 'cancel_orders']
+
+    def _bulk(self, request, queryset, target, label):
+        ids = list(queryset.values_list('id', flat=True))
+        moved = states.bulk_transition(ids, target)
+        level = messages.SUCCESS if len(moved) == len(ids) else messages.WARNING
+        self.message_user(request, f"{len(moved)}/{len(ids)} commande(s) {label}.", level)
+
+    @admin.action(description="Confirmer les commandes sélectionnées")
+    def confirm_orders(self, request, queryset):
+        self._bulk(request, queryset, states.CONFIRMED, "confirmée(s)")
+
+    @admin.action(description="Marquer livrées")
+    def deliver_orders(self, request, queryset):
+        self._bulk(request, queryset, states.DELIVERED, "livrée(s)")
+
+    @admin.action(description="Annuler")
+    def cancel_orders(self, request, queryset):
+        self._bulk(request, queryset, states.CANCELED, "annulée(s)")
 
 
 
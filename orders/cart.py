@@ -1,37 +1,52 @@
-from decimal import Decimal
-from comptes.models import Meal
-from marketing.models import Promotion, PromotionRedemption  # adapte l'import si besoin
+from contextlib import contextmanager
+from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
+
+from marketing import promotions
 from django.utils import timezone
+from shop.catalog import MealRecord, get_catalog
+
+from .storage import CART_SESSION_ID, PROMO_SESSION_KEY, get_cart_storage  # noqa
+
 
+# attribut posé sur la requête : le panier résolu est partagé par toutes les
+# instances de Cart de la même requête (vue, context processor, templates)
+SNAPSHOT_ATTR = "_cart_snapshot"
 
-CART_SESSION_ID = "cart"
-PROMO_SESSION_KEY = "cart_promo"
 
+@dataclass(frozen=True)
+class CartLine:
+    meal: MealRecord
+    quantity: int
+    price: Decimal
+    total_price: Decimal
 
-PROMO_SESSION_KEY = "cart_promo"
-CART_SESSION_ID = "cart"
+
+@dataclass(frozen=True)
+class CartSnapshot:
+    """Panier résolu une seule fois : lignes + totaux, immuable."""
+    lines: tuple
+    subtotal: Decimal
+    discount: Decimal
+    total: Decimal
 
 
 class Cart:
     MAX_QTY = 20  # plafond global (ajuste si besoin)
 
     def __init__(self, request):
-        self.session = request.session
-        cart = self.session.get(CART_SESSION_ID)
-        if not cart:
-            cart = self.session[CART_SESSION_ID] = {}
-        self.cart = cart
+        self.request = request
+        self.storage = get_cart_storage(request)
+        state = self.storage.load()
+        self.cart = dict(state["i"])  # {meal_id (str): quantité}
+        self.promo = dict(state["p"]) if state["p"] else None
+        self._deferred = False
 
     def add(self, meal_id, quantity=1):
         """Incrémente la quantité (min 1, max MAX_QTY)."""
         meal_id = str(meal_id)
-
-        if meal_id not in self.cart:
-            self.cart[meal_id] = {"quantity": 0}
-
-        new_qty = self.cart[meal_id]["quantity"] + int(quantity)
-        self.cart[meal_id]["quantity"] = max(1, min(self.MAX_QTY, new_qty))
+        new_qty = self.cart.get(meal_id, 0) + int(quantity)
+        self.cart[meal_id] = max(1, min(self.MAX_QTY, new_qty))
         self.save()
 
     def set(self, meal_id, quantity):
@@ -40,12 +55,9 @@ class Cart:
         qty = int(quantity)
 
         if qty <= 0:
-            if meal_id in self.cart:
-                del self.cart[meal_id]
+            self.cart.pop(meal_id, None)
         else:
-            if meal_id not in self.cart:
-                self.cart[meal_id] = {"quantity": 0}
-            self.cart[meal_id]["quantity"] = max(1, min(self.MAX_QTY, qty))
+            self.cart[meal_id] = max(1, min(self.MAX_QTY, qty))
 
         self.save()
 
@@ -56,130 +68,143 @@ class Cart:
             self.save()
 
     def clear(self):
-        self.session[CART_SESSION_ID] = {}
+        self.cart = {}
+        self.promo = None
         self.save()
 
     def save(self):
-        self.session.modified = True
+        """Persiste l'état, seulement s'il a réellement changé."""
+        self.invalidate()
+        if self._deferred:
+            return
+        state = {"i": dict(self.cart), "p": dict(self.promo) if self.promo else None}
+        if state != self.storage.load():
+            self.storage.save(state)
+
+    @contextmanager
+    def batch(self):
+        """
+        Regroupe plusieurs modifications : une seule écriture à la sortie.
+        Si une exception sort du bloc, le panier revient à son état persisté.
+        """
+        self._deferred = True
+        try:
+            yield self
+        except Exception:
+            state = self.storage.load()
+            self.cart = dict(state["i"])
+            self.promo = dict(state["p"]) if state["p"] else None
+            raise
+        finally:
+            self._deferred = False
+            self.invalidate()
+        self.save()
 
-    def __iter__(self):
-        meal_ids = self.cart.keys()
-        meals = Meal.objects.filter(id__in=meal_ids)
-        meal_map = {str(m.id): m for m in meals}
+    # ---------- SNAPSHOT ----------
+
+    def invalidate(self):
+        """Oublie le panier résolu (à appeler après toute modification)."""
+        self.request.__dict__.pop(SNAPSHOT_ATTR, None)
 
-        for meal_id, item in self.cart.items():
-            meal = meal_map.get(meal_id)
+    @property
+    def snapshot(self) -> CartSnapshot:
+        snap = getattr(self.request, SNAPSHOT_ATTR, None)
+        if snap is None:
+            snap = self._resolve()
+            setattr(self.request, SNAPSHOT_ATTR, snap)
+        return snap
+
+    def _resolve(self) -> CartSnapshot:
+        # prix lus dans le catalogue en mémoire : pas de requête Meal
+        catalog = get_catalog()
+
+        lines = []
+        subtotal = Decimal("0")
+        for meal_id, quantity in self.cart.items():
+            meal = catalog.get(meal_id)
             if meal:
-                quantity = item["quantity"]
                 total_price = meal.price * quantity
-                yield {
-                    "meal": meal,
-                    "quantity": quantity,
-                    "price": meal.price,
-                    "total_price": total_price,
-                }
+                subtotal += total_price
+                lines.append(CartLine(meal, quantity, meal.price, total_price))
+
+        discount = self._stored_discount()
+        if discount < 0:
+            discount = Decimal("0")
+        if discount > subtotal:
+            discount = subtotal
+        total = (subtotal - discount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return CartSnapshot(tuple(lines), subtotal, discount, total)
+
+    def __iter__(self):
+        return iter(self.snapshot.lines)
 
     def get_total_price(self):
-        total = Decimal("0")
-        for item in self:
-            total += item["total_price"]
-        return total
+        return self.snapshot.subtotal
 
     def __len__(self):
-        return sum(item["quantity"] for item in self.cart.values())
+        return sum(self.cart.values())
     
 
     # ---------- PROMO (MVP) ----------
 
     @property
     def promo_code(self):
-        promo = self.session.get(PROMO_SESSION_KEY) or {}
-        return promo.get("code")
+        return (self.promo or {}).get("code")
 
     def get_subtotal_price(self):
         # ton total actuel = sous-total (sans remise)
-        return self.get_total_price()
+        return self.snapshot.subtotal
 
-    def get_discount_amount(self):
-        promo = self.session.get(PROMO_SESSION_KEY) or {}
+    def _stored_discount(self):
+        promo = self.promo or {}
         try:
             return Decimal(str(promo.get("discount", "0")))
         except Exception:
             return Decimal("0")
 
+    def get_discount_amount(self):
+        return self.snapshot.discount
+
     def get_total_after_discount(self):
-        subtotal = self.get_subtotal_price()
-        discount = self.get_discount_amount()
-        if discount < 0:
-            discount = Decimal("0")
-        if discount > subtotal:
-            discount = subtotal
-        return (subtotal - discount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return self.snapshot.total
 
     def remove_promo(self):
-        if PROMO_SESSION_KEY in self.session:
-            del self.session[PROMO_SESSION_KEY]
+        if self.promo:
+            self.promo = None
             self.save()
 
+    PROMO_MESSAGES = {
+        "EMPTY_CODE": "Code vide.",
+        "PROMO_NOT_FOUND": "Code invalide ou expiré.",
+        "PROMO_INACTIVE": "Code invalide ou expiré.",
+        "LOGIN_REQUIRED": "Connexion requise pour ce code.",
+        "NOT_ELIGIBLE": "Ce code n'est pas disponible pour ton compte.",
+        "PROMO_LIMIT_REACHED": "Ce code a atteint sa limite d'utilisation.",
+        "USER_LIMIT_REACHED": "Limite d'utilisation atteinte pour ce code.",
+    }
+
     def apply_promo(self, user, promo_code: str):
         """
-        Applique une promo au panier (stockée en session).
+        Applique une promo au panier (stockée avec le panier).
         Retour: (ok: bool, message: str)
         """
-        code = (promo_code or "").strip().upper()
-        if not code:
-            self.remove_promo()
-            return False, "Code vide."
-
-        promo = Promotion.objects.filter(code=code).first()
-        if not promo or not promo.is_valid_now():
-            self.remove_promo()
-            return False, "Code invalide ou expiré."
-
-        if promo.segment != Promotion.Segment.ALL and not user:
-            self.remove_promo()
-            return False, "Connexion requise pour ce code."
-
         subtotal = self.get_subtotal_price()
+        promo, res = promotions.evaluate(promo_code, subtotal, user)
 
-        if promo.min_order and subtotal < promo.min_order:
+        if not res.ok:
             self.remove_promo()
-            return False, f"Panier minimum requis : {promo.min_order} FCFA."
-
-        # Limites d’usage global / par utilisateur (optionnel mais recommandé)
-        if promo.usage_limit_total is not None:
-            used_total = PromotionRedemption.objects.filter(promotion=promo, status="APPLIED").count()
-            if used_total >= promo.usage_limit_total:
-                self.remove_promo()
-                return False, "Ce code a atteint sa limite d'utilisation."
-
-        if user and promo.usage_limit_per_user is not None:
-            used_user = PromotionRedemption.objects.filter(promotion=promo, user=user, status="APPLIED").count()
-            if used_user >= promo.usage_limit_per_user:
-                self.remove_promo()
-                return False, "Limite d'utilisation atteinte pour ce code."
-
-        # Segment NEW / INACTIVE_30D (si tu veux l’activer)
-        # Ici je garde simple. Si tu veux, je te branche la logique propre.
-
-        # Calcul remise
-        if promo.promo_type == Promotion.PromoType.PERCENT:
-            discount = (subtotal * promo.value / Decimal("100")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        else:
-            discount = promo.value
-
-        if promo.max_discount is not None:
-            discount = min(discount, promo.max_discount)
+            if res.reason == "MIN_ORDER_NOT_MET":
+                return False, f"Panier minimum requis : {promo.min_order_amount} FCFA."
+            return False, self.PROMO_MESSAGES.get(res.reason, "Code invalide ou expiré.")
 
-        discount = min(discount, subtotal)
-        if discount <= 0:
+        if res.discount <= 0:
             self.remove_promo()
             return False, "Ce code ne donne aucune remise."
 
-        # Stocker en session
-        self.session[PROMO_SESSION_KEY] = {
+        # Stocker avec le panier
+        self.promo = {
             "code": promo.code,
-            "discount": str(discount),
+            "discount": str(res.discount),
             "applied_at": timezone.now().isoformat(),
         }
         self.save()
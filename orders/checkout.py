@@ -0,0 +1,207 @@
+"""
+Pipeline de commande.
+
+Tout se fait dans une seule transaction, avec un nombre de requêtes constant
+quel que soit le nombre de lignes du panier :
+    1. prix figés une fois (snapshot du panier)
+    2. profil mis à jour, portions du jour réservées
+    3. promo revérifiée + bon repas réservé
+    4. Order inséré, OrderItem en bulk_create
+    5. bon et promo consommés, événement outbox "order.placed"
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from comptes.models import UserProfile
+from marketing import loyalty, promotions
+from shop import stock
+
+from . import outbox, states
+from .cart import Cart
+from .models import Order, OrderItem
+
+
+class CheckoutError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def _update_profile(user, data):
+    fields = {
+        "full_name": data["customer_name"],
+        "phone": data["phone"],
+        "address": data["address"],
+    }
+    if not UserProfile.objects.filter(user=user).update(**fields):
+        UserProfile.objects.create(user=user, **fields)
+
+
+@dataclass(frozen=True)
+class DraftLine:
+    meal_id: int
+    name: str
+    quantity: int
+    price: Decimal
+
+
+@dataclass(frozen=True)
+class OrderDraft:
+    """Commande validée et prix figés, pas encore écrite (sérialisable)."""
+    customer_name: str
+    phone: str
+    address: str
+    lines: tuple
+    subtotal: Decimal
+    promo_code: str | None = None
+    ticket: str | None = None
+
+    def to_dict(self):
+        return {
+            "customer_name": self.customer_name,
+            "phone": self.phone,
+            "address": self.address,
+            "lines": [[l.meal_id, l.name, l.quantity, str(l.price)] for l in self.lines],
+            "subtotal": str(self.subtotal),
+            "promo_code": self.promo_code,
+            "ticket": self.ticket,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            customer_name=data["customer_name"],
+            phone=data["phone"],
+            address=data["address"],
+            lines=tuple(DraftLine(m, n, q, Decimal(p)) for m, n, q, p in data["lines"]),
+            subtotal=Decimal(data["subtotal"]),
+            promo_code=data.get("promo_code"),
+            ticket=data.get("ticket"),
+        )
+
+
+def _promo_error(reason):
+    return CheckoutError(
+        Cart.PROMO_MESSAGES.get(reason, "Le code promo n'est plus valable.")
+        + " Retire-le du panier pour continuer."
+    )
+
+
+def _promo_discount(draft, user):
+    if not draft.promo_code:
+        return None, Decimal("0.00")
+    promo, res = promotions.evaluate(draft.promo_code, draft.subtotal, user)
+    if not res.ok or res.discount <= 0:
+        raise _promo_error(res.reason)
+    return promo, res.discount
+
+
+def _reserve_portions(draft, day):
+    try:
+        stock.reserve(day, {line.meal_id: line.quantity for line in draft.lines})
+    except stock.SoldOut as exc:
+        name = next(line.name for line in draft.lines if line.meal_id == exc.meal_id)
+        if exc.remaining:
+            raise CheckoutError(f"Plus que {exc.remaining} portion(s) de {name} aujourd'hui.")
+        raise CheckoutError(f"{name} est épuisé pour aujourd'hui.")
+
+
+def draft_from_cart(cart, data, ticket=None) -> OrderDraft:
+    """Fige le panier : lève CheckoutError s'il ne peut pas être commandé."""
+    snap = cart.snapshot
+    if not snap.lines:
+        raise CheckoutError("Ton panier est vide.")
+    for line in snap.lines:
+        if not line.meal.is_active:
+            raise CheckoutError(f"{line.meal.name} n'est plus disponible.")
+
+    return OrderDraft(
+        customer_name=data["customer_name"],
+        phone=data["phone"],
+        address=data["address"],
+        lines=tuple(DraftLine(l.meal.id, l.meal.name, l.quantity, l.price) for l in snap.lines),
+        subtotal=snap.subtotal,
+        promo_code=cart.promo_code,
+        ticket=ticket,
+    )
+
+
+def check_portions(draft: OrderDraft) -> None:
+    """Contrôle rapide (cache) avant mise en file ; la vraie réservation reste dans write_order."""
+    for line in draft.lines:
+        left = stock.remaining(line.meal_id)
+        if left is not None and left < line.quantity:
+            if left:
+                raise CheckoutError(f"Plus que {left} portion(s) de {line.name} aujourd'hui.")
+            raise CheckoutError(f"{line.name} est épuisé pour aujourd'hui.")
+
+
+@transaction.atomic
+def write_order(user, draft: OrderDraft, day=None) -> Order:
+    """Écrit la commande (profil, portions, promo, bon, lignes). Lève CheckoutError."""
+    _update_profile(user, {
+        "customer_name": draft.customer_name,
+        "phone": draft.phone,
+        "address": draft.address,
+    })
+    _reserve_portions(draft, day or timezone.localdate())
+
+    subtotal = draft.subtotal
+    promo, promo_discount = _promo_discount(draft, user)
+    discount = promo_discount
+
+    # bon "plat offert" : remise = le plat le moins cher, plafonnée par le bon
+    voucher = loyalty.available_voucher(user)
+    if voucher:
+        discount += min(min(line.price for line in draft.lines), voucher[1])
+    discount = min(discount, subtotal)
+
+    order = Order.objects.create(
+        user=user,
+        customer_name=draft.customer_name,
+        phone=draft.phone,
+        address=draft.address,
+        subtotal=subtotal,
+        discount_total=discount,
+        total=max(Decimal("0.00"), subtotal - discount),
+        promo_code=promo.code if promo else None,
+        ingest_ticket=draft.ticket,
+    )
+
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, meal_id=line.meal_id, quantity=line.quantity, unit_price=line.price)
+        for line in draft.lines
+    ])
+
+    if voucher and not loyalty.use_voucher(voucher[0], order):
+        raise CheckoutError("Ton bon repas vient d'être utilisé, réessaie.")
+
+    if promo:
+        try:
+            promotions.redeem(promo, user, order, promo_discount)
+        except promotions.UsageLimitReached as exc:
+            raise _promo_error(exc.reason)
+
+    # tableaux de bord, cuisine... : traités hors requête par process_outbox
+    outbox.record("order.placed", order_id=order.pk)
+    return order
+
+
+def place_order(user, cart, data) -> Order:
+    """Crée la commande à partir du panier. Lève CheckoutError si impossible."""
+    return write_order(user, draft_from_cart(cart, data))
+
+
+def cancel_order(order: Order) -> bool:
+    """
+    Annule une commande en attente/confirmée (portions et usages de promo
+    rendus, voir orders.states). False si elle n'était plus annulable.
+    """
+    try:
+        states.transition(order, states.CANCELED)
+    except states.TransitionError:
+        return False
+    return True
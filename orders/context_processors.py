@@ -1,4 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
 from .cart import Cart
 
+
 def cart(request):
-    return {"cart": Cart(request)}
+    # proxy paresseux : aucun accès session/DB tant qu'un template n'utilise pas le panier
+    return {"cart": SimpleLazyObject(lambda: Cart(request))}
@@ -5,4 +5,6 @@ from comptes.models import UserProfile
 class CheckoutForm(forms.Form):
     customer_name = forms.CharField(label="Nom", max_length=150)
     phone = forms.CharField(label="Téléphone", max_length=30)
-    address = forms.CharField(label="Adresse / Lieu de livraison", widget=forms.Textarea)
\ No newline at end of file
+    address = forms.CharField(label="Adresse / Lieu de livraison", widget=forms.Textarea)
+    # anti double-clic : même clé => même commande (voir orders.idempotency)
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False, max_length=64)
@@ -0,0 +1,88 @@
+"""
+Clés d'idempotence du checkout.
+
+Le formulaire porte une clé aléatoire (ou l'en-tête ``Idempotency-Key`` côté
+API). La première soumission "réserve" la clé dans le cache ; les suivantes,
+tant que la clé n'a pas expiré, récupèrent la commande déjà créée au lieu de
+relancer le pipeline. Valeur stockée : "pending" puis l'id de la commande,
+ou "q:<ticket>" si la commande a été mise en file (orders.queue).
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+KEY_PREFIX = "orders:idem:"
+PENDING = "pending"
+TICKET_PREFIX = "q:"
+DEFAULT_TTL = 60 * 15  # 15 min
+DEFAULT_WAIT = 5.0  # s d'attente d'une soumission concurrente
+MAX_KEY_LENGTH = 64
+
+
+def new_key() -> str:
+    return uuid.uuid4().hex
+
+
+def _ttl():
+    return getattr(settings, "CHECKOUT_IDEMPOTENCY_TTL", DEFAULT_TTL)
+
+
+def _cache_key(user, key: str) -> str:
+    # clé propre à l'utilisateur : impossible de récupérer la commande d'un autre
+    return f"{KEY_PREFIX}{user.pk}:{key[:MAX_KEY_LENGTH]}"
+
+
+def claim(user, key: str):
+    """
+    Retour: (True, None) si la clé est libre et réservée pour cette requête,
+            (False, order_id | "q:<ticket>") si la commande existe déjà,
+            (False, None) si une autre requête est en train de la traiter.
+    """
+    ck = _cache_key(user, key)
+    if cache.add(ck, PENDING, timeout=_ttl()):
+        return True, None
+    value = cache.get(ck)
+    return False, None if value == PENDING else value
+
+
+def wait_for_order(user, key: str, timeout: float | None = None, interval: float = 0.2):
+    """
+    Attend brièvement que la requête concurrente termine.
+    Retour : id ou "q:<ticket>" si elle a abouti, None si elle a rendu la clé
+    (échec), PENDING si elle est toujours en cours à l'expiration du délai.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "CHECKOUT_IDEMPOTENCY_WAIT", DEFAULT_WAIT)
+    ck = _cache_key(user, key)
+    deadline = time.monotonic() + timeout
+    while True:
+        value = cache.get(ck)
+        if value is None:  # la première requête a échoué et rendu la clé
+            return None
+        if value != PENDING:
+            return value
+        if time.monotonic() >= deadline:
+            return PENDING
+        time.sleep(interval)
+
+
+def complete(user, key: str, order_id: int) -> None:
+    cache.set(_cache_key(user, key), order_id, timeout=_ttl())
+
+
+def complete_queued(user, key: str, ticket: str) -> None:
+    cache.set(_cache_key(user, key), TICKET_PREFIX + ticket, timeout=_ttl())
+
+
+def queued_ticket(value):
+    """Ticket si ``value`` (retour de claim/wait_for_order) désigne une mise en file."""
+    if isinstance(value, str) and value.startswith(TICKET_PREFIX):
+        return value[len(TICKET_PREFIX):]
+    return None
+
+
+def release(user, key: str) -> None:
+    cache.delete(_cache_key(user, key))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import queue
+
+
+class Command(BaseCommand):
+    help = "Écrit en base les commandes mises en file (ORDER_INGESTION_MODE = 'queue')."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=50, help="Commandes par transaction")
+        parser.add_argument("--loop", action="store_true", help="Tourner en continu")
+        parser.add_argument("--interval", type=float, default=1.0, help="Pause (s) quand la file est vide")
+        parser.add_argument("--stale", type=int, default=300, help="Reprendre les fichiers bloqués depuis N s")
+
+    def handle(self, *args, **opts):
+        total = 0
+        while True:
+            requeued = queue.requeue_stale(opts["stale"])
+            if requeued:
+                self.stderr.write(f"{requeued} commande(s) reprise(s) d'un worker arrêté")
+
+            done = queue.drain(opts["batch"])
+            total += done
+            if done:
+                self.stdout.write(f"{done} commande(s) traitée(s), file: {queue.depth()}")
+                continue
+            if not opts["loop"]:
+                break
+            time.sleep(opts["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"{total} commande(s) traitée(s)"))
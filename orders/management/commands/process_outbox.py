@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from orders import outbox
+
+
+class Command(BaseCommand):
+    help = "Traite les événements de l'outbox (fidélité, parrainage...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=100, help="Événements par transaction")
+        parser.add_argument("--loop", action="store_true", help="Tourner en continu")
+        parser.add_argument("--interval", type=float, default=1.0, help="Pause (s) quand il n'y a rien à faire")
+        parser.add_argument("--purge-days", type=int, default=0, help="Supprimer les événements traités depuis N jours")
+
+    def handle(self, *args, **opts):
+        if opts["purge_days"]:
+            purged = outbox.purge(timedelta(days=opts["purge_days"]))
+            self.stdout.write(f"{purged} événement(s) supprimé(s)")
+
+        total = 0
+        while True:
+            done = outbox.process(opts["batch"])
+            total += done
+            if done:
+                continue
+            if not opts["loop"]:
+                break
+            time.sleep(opts["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"{total} événement(s) traité(s)"))
@@ -0,0 +1,15 @@
+from .storage import STORAGE_ATTR
+
+
+class CartStorageMiddleware:
+    """Laisse le backend du panier écrire son cookie sur la réponse."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        storage = getattr(request, STORAGE_ATTR, None)
+        if storage is not None:
+            response = storage.process_response(response)
+        return response
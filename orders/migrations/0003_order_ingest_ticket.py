@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_freemealvoucher_loyaltyaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='ingest_ticket',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -35,6 +35,17 @@ class Order(models.Model):
     promo_code = models.CharField(max_length=32, null=True, blank=True)
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    # incrémentée à chaque changement de statut (voir orders.states)
+    version = models.PositiveIntegerField(default=0)
+
+    # ticket de la file d'ingestion (orders.queue) : une commande par ticket
+    ingest_ticket = models.CharField(max_length=32, null=True, blank=True, unique=True)
+
+    class Meta:
+        indexes = [
+            # pagination staff par curseur (staff.orderlist)
+            models.Index(fields=["created_at", "id"], name="orders_created_id_idx"),
+        ]
 
     def recompute_subtotal(self):
         sub = Decimal("0.00")
@@ -83,3 +94,23 @@ class FreeMealVoucher(models.Model):
         null=True,
         blank=True
     )
+
+
+class OutboxEvent(models.Model):
+    """
+    Événement écrit dans la même transaction que le changement qui le
+    produit ; traité plus tard par ``process_outbox`` (voir orders.outbox).
+    """
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(db_index=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [models.Index(fields=["processed_at", "available_at", "id"], name="outbox_pending_idx")]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
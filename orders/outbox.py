@@ -0,0 +1,166 @@
+"""
+Outbox transactionnelle des effets de bord d'une commande.
+
+    with transaction.atomic():
+        ...changement de statut...
+        outbox.record("order.delivered", order_id=order.id)
+
+L'événement n'existe que si la transaction commit. Le worker
+``process_outbox`` lit les événements par lots et appelle les handlers
+enregistrés pour leur topic (un appel par topic et par lot).
+
+Livraison "au moins une fois" : un lot dont le handler échoue est rejoué plus
+tard (backoff exponentiel), donc chaque handler doit être idempotent.
+
+Plusieurs workers : SKIP LOCKED sur PostgreSQL ; sur SQLite (pas de SKIP
+LOCKED) le lot est réservé par un UPDATE conditionnel, voir _claim.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+MAX_BACKOFF = 60 * 60  # 1 h
+CLAIM_MARK = timedelta(minutes=5)  # available_at des événements réservés (SQLite), le temps du lot
+
+_handlers = defaultdict(list)
+_listeners = []
+
+
+def register(topic: str):
+    """
+    Décorateur : ``handler(events)`` reçoit la liste des OutboxEvent du lot
+    pour ce topic. À enregistrer dans AppConfig.ready.
+    """
+    def decorator(func):
+        if func not in _handlers[topic]:
+            _handlers[topic].append(func)
+        return func
+    return decorator
+
+
+def handlers_for(topic: str) -> list:
+    return list(_handlers.get(topic, ()))
+
+
+def add_listener(func) -> None:
+    """
+    ``func(events)`` est appelé dans ce process après le commit qui a écrit
+    les événements (ex. tableau live en mode mono-process, voir staff.live).
+    Ne remplace pas les handlers : aucune garantie de livraison.
+    """
+    if func not in _listeners:
+        _listeners.append(func)
+
+
+def remove_listener(func) -> None:
+    if func in _listeners:
+        _listeners.remove(func)
+
+
+def _notify(events):
+    for func in list(_listeners):
+        try:
+            func(events)
+        except Exception:
+            logger.exception("outbox: listener %r en échec", func)
+
+
+def _after_commit(events):
+    if _listeners and events:
+        transaction.on_commit(lambda: _notify(events))
+    return events
+
+
+def record(topic: str, **payload) -> OutboxEvent:
+    event = OutboxEvent.objects.create(topic=topic, payload=payload, available_at=timezone.now())
+    _after_commit([event])
+    return event
+
+
+def record_many(topic: str, payloads) -> list:
+    now = timezone.now()
+    return _after_commit(OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, payload=p, available_at=now) for p in payloads]
+    ))
+
+
+def pending():
+    return OutboxEvent.objects.filter(
+        processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS, available_at__lte=timezone.now()
+    )
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(2 ** attempts, MAX_BACKOFF))
+
+
+def _claim(batch_size: int, now) -> list:
+    """
+    Événements du lot, réservés jusqu'à la fin de la transaction.
+    Sans SKIP LOCKED (SQLite, où select_for_update est ignoré) : le lot
+    commence par une écriture, qui prend le verrou d'écriture de la base ;
+    un second worker attend ce commit, puis ne voit plus ces événements
+    (traités, ou reportés par le backoff).
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        return list(pending().select_for_update(skip_locked=True).order_by("id")[:batch_size])
+    mark = now + CLAIM_MARK
+    ids = pending().order_by("id").values("id")[:batch_size]
+    if not OutboxEvent.objects.filter(id__in=ids).update(available_at=mark):
+        return []
+    return list(OutboxEvent.objects.filter(available_at=mark, processed_at__isnull=True).order_by("id"))
+
+
+def process(batch_size: int = 100) -> int:
+    """
+    Traite un lot. Une transaction pour le lot (événements réservés par
+    _claim : plusieurs workers possibles), un savepoint par topic. Retourne
+    le nombre d'événements pris (réussis ou reportés).
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        events = _claim(batch_size, now)
+        if not events:
+            return 0
+
+        by_topic = defaultdict(list)
+        for event in events:
+            by_topic[event.topic].append(event)
+
+        done, failed = [], []
+        for topic, batch in by_topic.items():
+            try:
+                with transaction.atomic():
+                    for handler in handlers_for(topic):
+                        handler(batch)
+            except Exception as exc:
+                logger.exception("outbox: échec du topic %s (%s événements)", topic, len(batch))
+                failed.append((batch, repr(exc)))
+            else:
+                done.extend(e.id for e in batch)
+
+        if done:
+            OutboxEvent.objects.filter(id__in=done).update(processed_at=now)
+        for batch, error in failed:
+            for event in batch:
+                event.attempts += 1
+                event.available_at = now + _backoff(event.attempts)
+                event.last_error = error[:2000]
+            OutboxEvent.objects.bulk_update(batch, ["attempts", "available_at", "last_error"])
+
+    return len(events)
+
+
+def purge(older_than: timedelta) -> int:
+    """Supprime les événements traités depuis plus de ``older_than``."""
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=timezone.now() - older_than).delete()
+    return deleted
@@ -0,0 +1,287 @@
+"""
+File d'ingestion des commandes (mode ORDER_INGESTION_MODE = "queue").
+
+Au coup de feu de midi, le checkout ne touche plus la base : il valide le
+panier, écrit la commande figée (OrderDraft) dans un fichier du spool et
+répond tout de suite "en attente". Le worker ``drain_order_queue`` vide le
+spool par lots, une transaction par lot.
+
+Spool sur disque (survit à un redémarrage) :
+    incoming/    <ns>-<ticket>.json, écrit via un .tmp puis os.replace (atomique)
+    processing/  fichiers pris par un worker (os.replace : un seul gagnant)
+    dead/        commandes refusées par la base MAX_ATTEMPTS fois (à examiner)
+
+Exactement une fois : Order.ingest_ticket est unique. Si le worker meurt
+après le commit mais avant d'effacer le fichier, le ticket est retrouvé en
+base au passage suivant et la commande n'est pas recréée.
+
+Contrôle d'admission selon la profondeur de incoming/ :
+    < ORDER_QUEUE_SOFT_DEPTH   accepté
+    < ORDER_QUEUE_MAX_DEPTH    accepté, avec un délai estimé affiché au client
+    au-delà                    refusé (503 + Retry-After)
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from shop.models import Meal
+
+from .checkout import CheckoutError, OrderDraft, write_order
+from .models import Order
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEY = "orders:ticket:{ticket}"
+STATUS_TTL = 60 * 60 * 6
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+RETRY = "retry"  # interne au worker : erreur base, fichier rendu à incoming/
+
+MAX_ATTEMPTS = 3
+
+DEFAULT_SOFT_DEPTH = 100
+DEFAULT_MAX_DEPTH = 500
+DEFAULT_DRAIN_RATE = 10  # commandes / seconde, pour estimer l'attente
+
+
+# ---------- réglages ----------
+
+def is_enabled() -> bool:
+    return getattr(settings, "ORDER_INGESTION_MODE", "sync") == "queue"
+
+
+def _root() -> Path:
+    return Path(getattr(settings, "ORDER_QUEUE_DIR", Path(settings.BASE_DIR) / "var" / "order_queue"))
+
+
+def _dir(name: str) -> Path:
+    path = _root() / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _incoming():
+    return _dir("incoming")
+
+
+def _processing():
+    return _dir("processing")
+
+
+# ---------- admission ----------
+
+@dataclass(frozen=True)
+class Admission:
+    accepted: bool
+    depth: int
+    delay: int = 0        # attente estimée (s) si accepté
+    retry_after: int = 0  # si refusé
+
+
+def depth() -> int:
+    with os.scandir(_incoming()) as entries:
+        return sum(1 for e in entries if e.name.endswith(".json"))
+
+
+def admit() -> Admission:
+    soft = getattr(settings, "ORDER_QUEUE_SOFT_DEPTH", DEFAULT_SOFT_DEPTH)
+    hard = getattr(settings, "ORDER_QUEUE_MAX_DEPTH", DEFAULT_MAX_DEPTH)
+    rate = max(1, getattr(settings, "ORDER_QUEUE_DRAIN_RATE", DEFAULT_DRAIN_RATE))
+
+    n = depth()
+    wait = -(-n // rate)  # arrondi au supérieur
+    if n >= hard:
+        return Admission(False, n, retry_after=max(wait, 5))
+    return Admission(True, n, delay=wait if n >= soft else 0)
+
+
+# ---------- statut des tickets ----------
+
+def new_ticket() -> str:
+    return uuid.uuid4().hex
+
+
+def _set_status(ticket, user_id, state, **extra):
+    cache.set(STATUS_KEY.format(ticket=ticket), {"user_id": user_id, "state": state, **extra}, STATUS_TTL)
+
+
+def status(ticket: str, user) -> dict | None:
+    """Statut d'un ticket pour son propriétaire, None si inconnu."""
+    value = cache.get(STATUS_KEY.format(ticket=ticket))
+    if value is None:
+        # cache vidé : la base fait foi
+        order_id = Order.objects.filter(ingest_ticket=ticket, user=user).values_list("id", flat=True).first()
+        return {"state": DONE, "order_id": order_id} if order_id else None
+    if value["user_id"] != user.pk:
+        return None
+    return value
+
+
+# ---------- producteur ----------
+
+def enqueue(user, draft: OrderDraft) -> str:
+    """Écrit la commande dans le spool ; retourne son ticket."""
+    ticket = draft.ticket
+    payload = {
+        "user_id": user.pk,
+        "day": timezone.localdate().isoformat(),
+        "draft": draft.to_dict(),
+    }
+    name = f"{time.time_ns()}-{ticket}.json"
+    tmp = _incoming() / f".{name}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    _set_status(ticket, user.pk, QUEUED)
+    os.replace(tmp, _incoming() / name)
+    return ticket
+
+
+# ---------- worker ----------
+
+def _claim(limit: int) -> list:
+    """Déplace jusqu'à ``limit`` fichiers (les plus anciens) vers processing/."""
+    names = sorted(e.name for e in os.scandir(_incoming()) if e.name.endswith(".json"))
+    claimed = []
+    for name in names:
+        if len(claimed) >= limit:
+            break
+        target = _processing() / name
+        try:
+            os.replace(_incoming() / name, target)
+        except FileNotFoundError:
+            continue  # pris par un autre worker
+        os.utime(target)  # point de départ pour requeue_stale
+        claimed.append(target)
+    return claimed
+
+
+def _dead():
+    return _dir("dead")
+
+
+def _give_back(paths) -> None:
+    for path in paths:
+        try:
+            os.replace(path, _incoming() / path.name)
+        except FileNotFoundError:
+            pass
+
+
+def requeue_stale(max_age: int = 300) -> int:
+    """Remet dans incoming/ les fichiers d'un worker mort depuis ``max_age`` s."""
+    limit = time.time() - max_age
+    stale = [
+        Path(e.path) for e in os.scandir(_processing())
+        if e.name.endswith(".json") and e.stat().st_mtime < limit
+    ]
+    _give_back(stale)
+    return len(stale)
+
+
+def _ingest(payload, users, meals) -> tuple:
+    draft = OrderDraft.from_dict(payload["draft"])
+    existing = Order.objects.filter(ingest_ticket=draft.ticket).values_list("id", flat=True).first()
+    if existing:
+        return DONE, {"order_id": existing}
+
+    user = users.get(payload["user_id"])
+    if user is None:
+        return FAILED, {"error": "Compte introuvable."}
+    # clés étrangères vérifiées ici : SQLite ne les contrôle qu'au commit du lot
+    missing = [line.name for line in draft.lines if line.meal_id not in meals]
+    if missing:
+        return FAILED, {"error": f"{missing[0]} n'est plus disponible."}
+    try:
+        order = write_order(user, draft, day=parse_date(payload["day"]))
+    except CheckoutError as exc:
+        return FAILED, {"error": exc.message}
+    return DONE, {"order_id": order.id, "total": str(order.total)}
+
+
+def _ingest_one(payload, users, meals) -> tuple:
+    """_ingest dans son propre savepoint : une commande refusée par la base n'annule qu'elle-même."""
+    try:
+        with transaction.atomic():
+            return _ingest(payload, users, meals)
+    except DatabaseError as exc:
+        ticket = payload["draft"]["ticket"]
+        existing = Order.objects.filter(ingest_ticket=ticket).values_list("id", flat=True).first()
+        if existing:  # même ticket écrit entre-temps par un autre worker
+            return DONE, {"order_id": existing}
+        logger.exception("order queue: ticket %s refusé par la base", ticket)
+        return RETRY, {"error": str(exc)}
+
+
+def _retry(path, payload) -> None:
+    """Rend le fichier à incoming/ (tentative +1), ou le range dans dead/ au-delà de MAX_ATTEMPTS."""
+    attempts = payload.get("attempts", 0) + 1
+    ticket, user_id = payload["draft"]["ticket"], payload["user_id"]
+    if attempts >= MAX_ATTEMPTS:
+        logger.error("order queue: ticket %s abandonné après %s tentatives", ticket, attempts)
+        os.replace(path, _dead() / path.name)
+        _set_status(ticket, user_id, FAILED, error="Ta commande n'a pas pu être enregistrée, réessaie.")
+        return
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps({**payload, "attempts": attempts}), encoding="utf-8")
+    os.replace(tmp, path)
+    _give_back([path])
+
+
+def drain(batch_size: int = 50) -> int:
+    """
+    Traite un lot : une transaction pour tout le lot, un savepoint par
+    commande. Retourne le nombre de fichiers traités.
+    Commande refusée par la base : seul son fichier retourne dans incoming/
+    (MAX_ATTEMPTS fois, puis dead/). Si c'est le lot entier qui échoue
+    (verrou au commit...), tous les fichiers y retournent.
+    """
+    paths = _claim(batch_size)
+    if not paths:
+        return 0
+
+    payloads = {}
+    for path in paths:
+        try:
+            payloads[path] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.exception("order queue: fichier illisible %s", path.name)
+            path.rename(path.with_suffix(".bad"))
+
+    results = []
+    try:
+        with transaction.atomic():
+            ids = {p["user_id"] for p in payloads.values()}
+            users = get_user_model().objects.in_bulk(ids)
+            meal_ids = {line[0] for p in payloads.values() for line in p["draft"]["lines"]}
+            meals = set(Meal.objects.filter(pk__in=meal_ids).values_list("pk", flat=True))
+            for path, payload in payloads.items():
+                state, extra = _ingest_one(payload, users, meals)
+                results.append((path, payload, state, extra))
+    except DatabaseError:
+        logger.exception("order queue: lot de %s rendu à la file", len(payloads))
+        _give_back(list(payloads))
+        return 0
+
+    for path, payload, state, extra in results:
+        if state == RETRY:
+            _retry(path, payload)
+            continue
+        _set_status(payload["draft"]["ticket"], payload["user_id"], state, **extra)
+        path.unlink(missing_ok=True)
+    return len(results)
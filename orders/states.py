@@ -0,0 +1,143 @@
+"""
+Machine à états des commandes.
+
+    pending ──> confirmed ──> delivered
+       │            │
+       └────────────┴──> canceled
+
+Chaque passage est un compare-and-swap :
+    UPDATE order SET status = new, version = version + 1
+    WHERE id = .. AND status = old AND version = v
+Deux membres du staff qui cliquent en même temps : un seul UPDATE touche la
+ligne, l'autre reçoit StaleOrder. Chaque passage écrit son événement outbox
+"order.<statut>" dans la même transaction.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from marketing import promotions
+from marketing.models import PromotionRedemption
+from shop import stock
+
+from . import outbox
+from .models import Order, OrderItem
+
+
+PENDING = "pending"
+CONFIRMED = "confirmed"
+DELIVERED = "delivered"
+CANCELED = "canceled"
+
+TRANSITIONS = {
+    PENDING: {CONFIRMED, DELIVERED, CANCELED},
+    CONFIRMED: {DELIVERED, CANCELED},
+    DELIVERED: set(),
+    CANCELED: set(),
+}
+
+# statuts qui comptent comme "commande payée" (paiement à la livraison)
+PAID = (CONFIRMED, DELIVERED)
+
+
+class TransitionError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class InvalidTransition(TransitionError):
+    pass
+
+
+class StaleOrder(TransitionError):
+    """La commande a changé depuis sa lecture (autre onglet, autre membre du staff)."""
+
+
+def can_transition(current: str, target: str) -> bool:
+    return target in TRANSITIONS.get(current, ())
+
+
+def sources_for(target: str) -> tuple:
+    return tuple(s for s, targets in TRANSITIONS.items() if target in targets)
+
+
+def _changes(target, now):
+    changes = {"status": target, "version": F("version") + 1}
+    if target == CONFIRMED:
+        changes["confirmed_at"] = now
+    return changes
+
+
+def _after(moved, target, now):
+    """
+    Effets synchrones du passage (même transaction) + événements outbox.
+    ``moved`` : [(order_id, ancien statut)].
+    """
+    if target == CANCELED:
+        _release_canceled([pk for pk, _ in moved])
+    outbox.record_many(f"order.{target}", [{"order_id": pk, "from": old} for pk, old in moved])
+
+
+def _release_canceled(order_ids):
+    # portions rendues au jour de la commande, usages de promo rendus
+    per_day = defaultdict(lambda: defaultdict(int))
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values_list("order__created_at", "meal_id", "quantity")
+    for created_at, meal_id, qty in rows:
+        per_day[timezone.localdate(created_at)][meal_id] += qty
+    for day, quantities in per_day.items():
+        stock.release(day, quantities)
+    promotions.end_redemptions(PromotionRedemption.objects.filter(order_id__in=order_ids))
+
+
+@transaction.atomic
+def transition(order: Order, target: str) -> Order:
+    """
+    Passe ``order`` (tel qu'il a été lu : statut + version) à ``target``.
+    Lève InvalidTransition ou StaleOrder ; met l'instance à jour sinon.
+    """
+    if not can_transition(order.status, target):
+        raise InvalidTransition(
+            f"Commande #{order.pk} : impossible de passer de « {order.get_status_display()} » à « {target} »."
+        )
+    now = timezone.now()
+    updated = Order.objects.filter(pk=order.pk, status=order.status, version=order.version).update(
+        **_changes(target, now)
+    )
+    if not updated:
+        raise StaleOrder(f"Commande #{order.pk} modifiée entre-temps, recharge la page.")
+
+    previous = order.status
+    order.status = target
+    order.version += 1
+    if target == CONFIRMED:
+        order.confirmed_at = now
+    _after([(order.pk, previous)], target, now)
+    return order
+
+
+@transaction.atomic
+def bulk_transition(order_ids, target: str) -> list:
+    """
+    Passe en une requête toutes les commandes de ``order_ids`` qui peuvent
+    aller vers ``target``. Retourne les ids effectivement passés ; les autres
+    (mauvais statut, modifiées en parallèle) sont ignorés.
+    """
+    sources = sources_for(target)
+    # lignes candidates verrouillées jusqu'au commit : un passage concurrent
+    # attend notre fin puis ne les voit plus dans ``sources`` ; seuls ces ids font foi
+    seen = list(
+        Order.objects.select_for_update()
+        .filter(pk__in=list(order_ids), status__in=sources)
+        .order_by("pk")
+        .values_list("pk", "status")
+    )
+    if not seen:
+        return []
+
+    now = timezone.now()
+    moved = [pk for pk, _ in seen]
+    Order.objects.filter(pk__in=moved).update(**_changes(target, now))
+    _after(seen, target, now)
+    return moved
@@ -0,0 +1,192 @@
+"""
+Stockage du panier.
+
+L'état d'un panier est un petit dict compact :
+    {"i": {"<meal_id>": quantité, ...}, "p": {"code": ..., "discount": ...} | None}
+
+Le backend est choisi par ``settings.CART_STORAGE`` (chemin pointé) :
+- SessionCartStorage      : dans la session Django (écrit dans django_session) ;
+- SignedCookieCartStorage : cookie signé, aucune écriture serveur ;
+- CacheCartStorage        : dans le cache, clé portée par un cookie aléatoire.
+
+Les backends à cookie ont besoin de ``orders.middleware.CartStorageMiddleware``
+pour poser le cookie sur la réponse.
+"""
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+CART_SESSION_ID = "cart"
+PROMO_SESSION_KEY = "cart_promo"
+
+DEFAULT_STORAGE = "orders.storage.SessionCartStorage"
+STORAGE_ATTR = "_cart_storage"
+
+COOKIE_NAME = "cart"
+COOKIE_SALT = "orders.cart"
+CART_ID_COOKIE_NAME = "cart_id"
+CACHE_KEY_PREFIX = "orders:cart:"
+DEFAULT_MAX_AGE = 60 * 60 * 24 * 14  # 14 jours
+
+
+def empty_state():
+    return {"i": {}, "p": None}
+
+
+def normalize(raw):
+    """Accepte un état compact ou l'ancien format session ({id: {"quantity": n}})."""
+    if not isinstance(raw, dict):
+        return empty_state()
+    if "i" in raw:
+        items, promo = raw.get("i") or {}, raw.get("p")
+    else:
+        items, promo = raw, None
+
+    clean = {}
+    for meal_id, qty in items.items():
+        if isinstance(qty, dict):
+            qty = qty.get("quantity", 0)
+        try:
+            qty = int(qty)
+        except (TypeError, ValueError):
+            continue
+        if qty > 0:
+            clean[str(meal_id)] = qty
+    return {"i": clean, "p": promo or None}
+
+
+def is_empty(state):
+    return not state["i"] and not state["p"]
+
+
+class BaseCartStorage:
+    def __init__(self, request):
+        self.request = request
+        self._state = None
+
+    def load(self):
+        # mémorisé : toutes les instances de Cart de la requête voient le même état
+        if self._state is None:
+            self._state = normalize(self.read())
+        return self._state
+
+    def save(self, state):
+        self._state = state
+        self.write(state)
+
+    # à implémenter par les backends
+    def read(self):
+        raise NotImplementedError
+
+    def write(self, state):
+        raise NotImplementedError
+
+    def process_response(self, response):
+        return response
+
+
+class SessionCartStorage(BaseCartStorage):
+    def read(self):
+        session = self.request.session
+        raw = session.get(CART_SESSION_ID)
+        if raw and "i" not in raw and PROMO_SESSION_KEY in session:
+            # ancien format : promo rangée à part dans la session
+            raw = {"i": raw, "p": session.get(PROMO_SESSION_KEY)}
+        return raw
+
+    def write(self, state):
+        session = self.request.session
+        session.pop(PROMO_SESSION_KEY, None)
+        if is_empty(state):
+            session.pop(CART_SESSION_ID, None)
+        else:
+            session[CART_SESSION_ID] = state
+
+
+class SignedCookieCartStorage(BaseCartStorage):
+    def __init__(self, request):
+        super().__init__(request)
+        self.dirty = False
+
+    @property
+    def max_age(self):
+        return getattr(settings, "CART_COOKIE_AGE", DEFAULT_MAX_AGE)
+
+    def read(self):
+        value = self.request.COOKIES.get(COOKIE_NAME)
+        if not value:
+            return None
+        try:
+            return signing.loads(value, salt=COOKIE_SALT, max_age=self.max_age)
+        except signing.BadSignature:
+            return None
+
+    def write(self, state):
+        self.dirty = True
+
+    def process_response(self, response):
+        if not self.dirty:
+            return response
+        if is_empty(self._state):
+            response.delete_cookie(COOKIE_NAME, samesite="Lax")
+        else:
+            response.set_cookie(
+                COOKIE_NAME,
+                signing.dumps(self._state, salt=COOKIE_SALT, compress=True),
+                max_age=self.max_age,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class CacheCartStorage(BaseCartStorage):
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.COOKIES.get(CART_ID_COOKIE_NAME)
+        self.new_id = False
+
+    @property
+    def timeout(self):
+        return getattr(settings, "CART_COOKIE_AGE", DEFAULT_MAX_AGE)
+
+    def read(self):
+        if not self.cart_id:
+            return None
+        return cache.get(CACHE_KEY_PREFIX + self.cart_id)
+
+    def write(self, state):
+        if is_empty(state):
+            if self.cart_id:
+                cache.delete(CACHE_KEY_PREFIX + self.cart_id)
+            return
+        if not self.cart_id:
+            self.cart_id = secrets.token_urlsafe(16)
+            self.new_id = True
+        cache.set(CACHE_KEY_PREFIX + self.cart_id, state, timeout=self.timeout)
+
+    def process_response(self, response):
+        if self.new_id:
+            response.set_cookie(
+                CART_ID_COOKIE_NAME,
+                self.cart_id,
+                max_age=self.timeout,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+def get_cart_storage(request):
+    storage = getattr(request, STORAGE_ATTR, None)
+    if storage is None:
+        storage_class = import_string(getattr(settings, "CART_STORAGE", DEFAULT_STORAGE))
+        storage = storage_class(request)
+        setattr(request, STORAGE_ATTR, storage)
+    return storage
@@ -1,3 +1,474 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from comptes.models import UserProfile
+from marketing import loyalty
+from marketing.models import FreeItemVoucher
+from shop import catalog
+from shop.models import Category, DailyStock, Meal
+
+from . import idempotency, outbox, queue, states, storage
+from .cart import Cart
+from .checkout import DraftLine, OrderDraft, place_order, write_order
+from .models import Order, OutboxEvent
+
+
+CHECKOUT_DATA = {"customer_name": "Awa", "phone": "0700000000", "address": "Cocody"}
+# jamais le cache fichier du serveur de dev (versions catalogue / promos, stock)
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CART_STORAGE="orders.storage.SignedCookieCartStorage", CACHES=LOCMEM_CACHE)
+class CheckoutPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("awa", password="x")
+        UserProfile.objects.create(user=cls.user)
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.meals = [
+            Meal.objects.create(category=category, name=f"Plat {i}", slug=f"plat-{i}", price=Decimal(1000 + i))
+            for i in range(25)
+        ]
+        # un plat sur deux limité : la réservation reste une requête pour tout le panier
+        DailyStock.objects.bulk_create([
+            DailyStock(day=timezone.localdate(), meal=meal, capacity=100) for meal in cls.meals[::2]
+        ])
+        # TestCase ne commit jamais : on_commit(bump_version) ne part pas
+        catalog.bump_version()
+
+    def _cart(self, n_lines):
+        cart = Cart(RequestFactory().get("/"))
+        with cart.batch():
+            for meal in self.meals[:n_lines]:
+                cart.add(meal.id, 2)
+        return cart
+
+    def _checkout_queries(self, n_lines):
+        cart = self._cart(n_lines)
+        cart.snapshot  # le catalogue est chargé hors mesure
+        with CaptureQueriesContext(connection) as ctx:
+            order = place_order(self.user, cart, CHECKOUT_DATA)
+        self.assertEqual(order.items.count(), n_lines)
+        return len(ctx)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        counts = {n: self._checkout_queries(n) for n in (1, 5, 25)}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+        self.assertEqual(DailyStock.objects.get(meal=self.meals[0]).reserved, 6)
+        self.assertEqual(DailyStock.objects.get(meal=self.meals[24]).reserved, 2)
+
+    def test_snapshot_is_resolved_once_per_request(self):
+        cart = self._cart(25)
+        catalog.get_catalog()  # catalogue en mémoire chargé hors mesure
+        with self.assertNumQueries(0):
+            snap = cart.snapshot
+            self.assertEqual(len(snap.lines), 25)
+            self.assertEqual(snap.subtotal, sum(2 * m.price for m in self.meals))
+            # autre instance de la même requête (context processor, template) : même snapshot
+            self.assertIs(Cart(cart.request).snapshot, snap)
+
+        cart.add(self.meals[0].id)
+        self.assertIsNot(cart.snapshot, snap)
+        self.assertEqual(cart.snapshot.lines[0].quantity, 3)
+
+    def test_totals_and_voucher(self):
+        loyalty.issue_vouchers(self.user, 1)
+        order = place_order(self.user, self._cart(2), CHECKOUT_DATA)
+
+        self.assertEqual(order.subtotal, Decimal("4002"))
+        self.assertEqual(order.discount_total, Decimal("1000"))
+        self.assertEqual(order.total, Decimal("3002"))
+        self.assertEqual(FreeItemVoucher.objects.get(user=self.user).status, FreeItemVoucher.Status.USED)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], CACHES=LOCMEM_CACHE, CHECKOUT_IDEMPOTENCY_WAIT=0)
+class CheckoutIdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("awa", password="x")
+        UserProfile.objects.create(user=cls.user)
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.meal = Meal.objects.create(category=category, name="Garba", slug="garba", price=Decimal("1500"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.post(reverse("orders:cart_add", args=[self.meal.id]), {"quantity": 1})
+        self.key = idempotency.new_key()
+
+    def _submit(self, **data):
+        return self.client.post(reverse("orders:checkout"), {**CHECKOUT_DATA, **data, "idempotency_key": self.key})
+
+    def test_double_submit_replays_the_first_order(self):
+        first = self._submit()
+        order = Order.objects.get()
+        self.assertContains(first, f"#{order.id}")
+        self.assertContains(self._submit(), f"#{order.id}")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_pending_submission_is_not_replayed(self):
+        self.assertEqual(idempotency.claim(self.user, self.key), (True, None))  # première requête en cours
+        self.assertEqual(idempotency.wait_for_order(self.user, self.key), idempotency.PENDING)
+        self.assertEqual(self._submit().status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_unknown_order_for_key_is_not_replaced(self):
+        idempotency.complete(self.user, self.key, 999999)
+        self.assertEqual(self._submit().status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_form_does_not_hold_the_key(self):
+        response = self._submit(customer_name="")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Order.objects.exists())
+        # même clé dans le formulaire réaffiché : la correction passe
+        self.assertContains(self._submit(), "Merci pour votre commande")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_shed_submission_does_not_hold_the_key(self):
+        spool = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, spool)
+        with self.settings(ORDER_INGESTION_MODE="queue", ORDER_QUEUE_DIR=spool, ORDER_QUEUE_MAX_DEPTH=0):
+            response = self._submit()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+
+        # nouvel essai après Retry-After, avec la même clé
+        with self.settings(ORDER_INGESTION_MODE="queue", ORDER_QUEUE_DIR=spool):
+            response = self._submit()
+            self.assertEqual(queue.depth(), 1)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("q:", str(idempotency.claim(self.user, self.key)[1]))
+
+    def test_failed_first_attempt_can_be_retried(self):
+        stock = DailyStock.objects.create(day=timezone.localdate(), meal=self.meal, capacity=0)
+        self.assertContains(self._submit(), "épuisé")
+        self.assertFalse(Order.objects.exists())
+
+        stock.capacity = 5
+        with self.captureOnCommitCallbacks(execute=True):  # restant en cache oublié
+            stock.save()
+        self.assertContains(self._submit(), "Merci pour votre commande")
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class IdempotencyClaimTests(TestCase):
+    """Cache configuré du projet (pas de locmem) : add() atomique, pas d'expiration imposée."""
+
+    def test_claim_complete_release(self):
+        user = get_user_model().objects.create_user("awa", password="x")
+        key = idempotency.new_key()
+        self.assertEqual(idempotency.claim(user, key), (True, None))
+        self.assertEqual(idempotency.claim(user, key), (False, None))
+        idempotency.complete(user, key, 42)
+        self.assertEqual(idempotency.claim(user, key), (False, 42))
+        idempotency.release(user, key)
+        self.assertEqual(idempotency.claim(user, key), (True, None))
+
+    def test_version_bump_keeps_the_key(self):
+        version = catalog.current_version()
+        catalog.bump_version()
+        self.assertEqual(cache.get(catalog.VERSION_CACHE_KEY), version + 1)
+        self.assertIsNone(cache.default_timeout)  # incr() réécrit la clé sans lui donner de TTL
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BulkTransitionTests(TransactionTestCase):
+    def test_parallel_bulk_cancel_moves_each_order_once(self):
+        ids = [
+            Order.objects.create(customer_name="c", phone="1", address="a").pk for _ in range(10)
+        ]
+        barrier = threading.Barrier(6)
+        moved = []
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(50):  # SQLite : réessayer si la base est verrouillée
+                    try:
+                        moved.extend(states.bulk_transition(ids, states.CANCELED))
+                        return
+                    except OperationalError:
+                        continue
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(moved), ids)
+        self.assertEqual(OutboxEvent.objects.filter(topic="order.canceled").count(), len(ids))
+        self.assertEqual(states.bulk_transition(ids, states.CANCELED), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class OrderQueueDrainTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("awa", password="x")
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.meal = Meal.objects.create(category=category, name="Garba", slug="garba", price=Decimal("1500"))
+
+    def setUp(self):
+        cache.clear()
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        spool = override_settings(ORDER_QUEUE_DIR=root)
+        spool.enable()
+        self.addCleanup(spool.disable)
+        self.root = root
+
+    def _enqueue(self, meal_id=None, ticket=None):
+        draft = OrderDraft(
+            customer_name="Awa", phone="0700000000", address="Cocody",
+            lines=(DraftLine(meal_id or self.meal.id, "Garba", 2, Decimal("1500")),),
+            subtotal=Decimal("3000"), ticket=ticket or queue.new_ticket(),
+        )
+        return queue.enqueue(self.user, draft)
+
+    def _files(self, name):
+        return sorted(p.name for p in (self.root / name).glob("*.json"))
+
+    def test_happy_path(self):
+        ticket = self._enqueue()
+        self.assertEqual(queue.drain(), 1)
+
+        order = Order.objects.get(ingest_ticket=ticket)
+        self.assertEqual(order.total, Decimal("3000"))
+        self.assertEqual(queue.status(ticket, self.user), {
+            "user_id": self.user.pk, "state": queue.DONE, "order_id": order.id, "total": "3000.00",
+        })
+        self.assertEqual(self._files("incoming") + self._files("processing"), [])
+
+    def test_checkout_error_fails_the_ticket(self):
+        DailyStock.objects.create(day=timezone.localdate(), meal=self.meal, capacity=1)
+        ticket = self._enqueue()
+        self.assertEqual(queue.drain(), 1)
+
+        self.assertFalse(Order.objects.exists())
+        state = queue.status(ticket, self.user)
+        self.assertEqual(state["state"], queue.FAILED)
+        self.assertIn("Plus que 1 portion", state["error"])
+
+    def test_duplicate_ticket_writes_one_order(self):
+        ticket = self._enqueue()
+        self._enqueue(ticket=ticket)  # double envoi, ou fichier repris d'un worker mort
+        self.assertEqual(queue.drain(), 2)
+
+        order = Order.objects.get(ingest_ticket=ticket)
+        self.assertEqual(queue.status(ticket, self.user)["order_id"], order.id)
+
+    def test_missing_meal_fails_before_writing(self):
+        bad = self._enqueue(meal_id=999_999)  # SQLite ne verrait la clé étrangère qu'au commit du lot
+        good = self._enqueue()
+        self.assertEqual(queue.drain(), 2)
+
+        self.assertTrue(Order.objects.filter(ingest_ticket=good).exists())
+        self.assertFalse(Order.objects.filter(ingest_ticket=bad).exists())
+        self.assertEqual(queue.status(bad, self.user)["state"], queue.FAILED)
+
+    def test_database_error_only_fails_its_ticket(self):
+        bad = self._enqueue()
+        good = self._enqueue()
+
+        def write(user, draft, day=None):
+            if draft.ticket == bad:
+                raise OperationalError("database is locked")
+            return write_order(user, draft, day=day)
+
+        with mock.patch("orders.queue.write_order", side_effect=write):
+            with self.assertLogs("orders.queue", "ERROR"):
+                self.assertEqual(queue.drain(), 2)
+
+            self.assertTrue(Order.objects.filter(ingest_ticket=good).exists())
+            self.assertFalse(Order.objects.filter(ingest_ticket=bad).exists())
+            self.assertEqual(queue.status(bad, self.user)["state"], queue.QUEUED)
+            self.assertEqual(len(self._files("incoming")), 1)
+
+            with self.assertLogs("orders.queue", "ERROR") as logs:
+                for _ in range(queue.MAX_ATTEMPTS - 1):
+                    queue.drain()
+        self.assertIn("abandonné", logs.output[-1])
+        self.assertEqual(queue.status(bad, self.user)["state"], queue.FAILED)
+        self.assertEqual(self._files("incoming"), [])
+        self.assertEqual(len(self._files("dead")), 1)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.seen = []
+
+    def _handler(self, topic, fail=False):
+        def handler(events):
+            self.seen.extend(e.payload["n"] for e in events)
+            Category.objects.create(name=f"{topic}-{len(self.seen)}", slug=f"{topic}-{len(self.seen)}")
+            if fail:
+                raise RuntimeError("boom")
+        outbox.register(topic)(handler)
+        self.addCleanup(outbox._handlers[topic].remove, handler)
+
+    def test_each_event_is_handled_once(self):
+        self._handler("test.ok")
+        outbox.record_many("test.ok", [{"n": i} for i in range(3)])
+        self.assertEqual(outbox.process(), 3)
+        self.assertEqual(outbox.process(), 0)
+        self.assertEqual(self.seen, [0, 1, 2])
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_failed_topic_is_rolled_back_and_retried_later(self):
+        self._handler("test.ok")
+        self._handler("test.ko", fail=True)
+        outbox.record("test.ok", n=1)
+        failing = outbox.record("test.ko", n=2)
+        with self.assertLogs("orders.outbox", "ERROR"):
+            self.assertEqual(outbox.process(), 2)
+
+        # le savepoint du topic en échec est annulé, l'autre topic est validé
+        self.assertEqual(list(Category.objects.values_list("name", flat=True)), ["test.ok-1"])
+        failing.refresh_from_db()
+        self.assertIsNone(failing.processed_at)
+        self.assertEqual(failing.attempts, 1)
+        self.assertIn("boom", failing.last_error)
+        self.assertGreater(failing.available_at, timezone.now())
+
+        self.assertEqual(outbox.process(), 0)  # backoff : pas encore disponible
+        OutboxEvent.objects.filter(pk=failing.pk).update(available_at=timezone.now())
+        with self.assertLogs("orders.outbox", "ERROR"):
+            self.assertEqual(outbox.process(), 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.attempts, 2)
+        self.assertGreater(failing.available_at - timezone.now(), outbox._backoff(1))
+
+    def test_claimed_events_are_invisible_to_another_worker(self):
+        outbox.record_many("test.ok", [{"n": i} for i in range(3)])
+        with transaction.atomic():
+            claimed = outbox._claim(10, timezone.now())
+            self.assertEqual(len(claimed), 3)
+            # second worker (même base, après le verrou) : plus rien à prendre
+            self.assertEqual(outbox._claim(10, timezone.now()), [])
+
+
+@override_settings(
+    ALLOWED_HOSTS=["testserver"], CACHES=LOCMEM_CACHE, CART_STORAGE="orders.storage.SignedCookieCartStorage",
+)
+class CartApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.garba, cls.alloco = [
+            Meal.objects.create(category=category, name=name, slug=name.lower(), price=Decimal("1500"))
+            for name in ("Garba", "Alloco")
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _ops(self, *ops):
+        return self.client.post(reverse("orders:cart_api"), {"ops": list(ops)}, content_type="application/json")
+
+    def _lines(self):
+        cart = self.client.get(reverse("orders:cart_api")).json()["cart"]
+        return {line["meal_id"]: line["quantity"] for line in cart["lines"]}
+
+    def test_bad_op_applies_nothing(self):
+        self._ops({"op": "add", "meal_id": self.garba.id})
+        response = self._ops(
+            {"op": "set", "meal_id": self.garba.id, "quantity": 5},
+            {"op": "add", "meal_id": 999_999},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["index"], 1)
+        self.assertEqual(self._lines(), {self.garba.id: 1})
+
+    def test_batch_writes_storage_once(self):
+        with mock.patch("orders.storage.SignedCookieCartStorage.write", autospec=True) as write:
+            response = self._ops(
+                {"op": "add", "meal_id": self.garba.id, "quantity": 2},
+                {"op": "add", "meal_id": self.alloco.id},
+                {"op": "set", "meal_id": self.garba.id, "quantity": 3},
+                {"op": "remove", "meal_id": self.alloco.id},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(write.call_count, 1)
+
+    def test_remove_meal_gone_from_catalog(self):
+        self._ops({"op": "add", "meal_id": self.garba.id}, {"op": "add", "meal_id": self.alloco.id})
+        gone = self.alloco.id
+        self.alloco.delete()
+        catalog.bump_version()  # TestCase ne commit jamais : on_commit(bump_version) ne part pas
+
+        self.assertEqual(self.client.get(reverse("orders:cart_api")).json()["cart"]["count"], 2)
+        response = self._ops({"op": "remove", "meal_id": gone})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["cart"]["count"], 1)  # l'id périmé a quitté le panier
+        self.assertEqual(self._ops({"op": "remove", "meal_id": "x"}).status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], CACHES=LOCMEM_CACHE)
+class CartStorageTests(TestCase):
+    BACKENDS = ("SessionCartStorage", "SignedCookieCartStorage", "CacheCartStorage")
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.meal = Meal.objects.create(category=category, name="Garba", slug="garba", price=Decimal("1500"))
+
+    def setUp(self):
+        cache.clear()
+        catalog.get_catalog()  # catalogue en mémoire chargé hors mesure
+
+    def _set(self, quantity):
+        return self.client.post(
+            reverse("orders:cart_api"),
+            {"ops": [{"op": "set", "meal_id": self.meal.id, "quantity": quantity}]},
+            content_type="application/json",
+        )
+
+    def _writes(self, backend, quantity):
+        original = getattr(storage, backend).write
+        with mock.patch(f"orders.storage.{backend}.write", autospec=True, side_effect=original) as write:
+            response = self._set(quantity)
+        self.assertEqual(response.status_code, 200)
+        return write.call_count
+
+    def test_backends_write_only_when_the_cart_changes(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend), self.settings(CART_STORAGE=f"orders.storage.{backend}"):
+                self.client = self.client_class()
+                self.assertEqual(self._writes(backend, 2), 1)
+                self.assertEqual(self._writes(backend, 2), 0)  # même quantité : rien à écrire
+                self.assertEqual(self._writes(backend, 3), 1)
+
+    @override_settings(CART_STORAGE="orders.storage.SessionCartStorage")
+    def test_unchanged_session_cart_is_not_saved(self):
+        self._set(2)
+        with self.assertNumQueries(1):  # lecture de la session, pas d'UPDATE django_session
+            self._set(2)
+
+    @override_settings(CART_STORAGE="orders.storage.SignedCookieCartStorage")
+    def test_unchanged_cookie_cart_is_not_resent(self):
+        self.assertIn(storage.COOKIE_NAME, self._set(2).cookies)
+        self.assertNotIn(storage.COOKIE_NAME, self._set(2).cookies)
+
+    @override_settings(CART_STORAGE="orders.storage.CacheCartStorage")
+    def test_cache_cart_without_queries(self):
+        self._set(2)
+        with self.assertNumQueries(0):
+            self.assertNotIn(storage.CART_ID_COOKIE_NAME, self._set(2).cookies)
@@ -11,7 +11,10 @@ urlpatterns = [
 
     path('cart/add/<int:meal_id>/', views.cart_add, name='cart_add'),
     path('cart/remove/<int:meal_id>/', views.cart_remove, name='cart_remove'),
+    path('cart/api/', views.cart_api, name='cart_api'),
 
     path('checkout/', views.checkout, name='checkout'),
+    path('checkout/pending/<str:ticket>/', views.checkout_pending, name='checkout_pending'),
+    path('checkout/status/<str:ticket>/', views.checkout_status, name='checkout_status'),
 
 ]
\ No newline at end of file
@@ -1,16 +1,19 @@
+import json
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render
 
-from marketing.models import LoyaltyAccount
-from orders.loyalty import count_meals
 from .cart import Cart
 from comptes.models import UserProfile
-from .models import FreeMealVoucher, Order, OrderItem
+from . import idempotency
+from . import queue
+from .checkout import CheckoutError, check_portions, draft_from_cart, place_order
+from .models import Order
 from .forms import CheckoutForm
 from django.contrib.auth.decorators import login_required
 from orders.cart import Cart
-from django.views.decorators.http import require_POST
-
-from django.db import transaction
+from django.views.decorators.http import require_http_methods, require_POST
+from shop.catalog import get_catalog
 
 @require_POST
 def cart_add(request, meal_id):
@@ -56,59 +59,221 @@ def cart_remove_promo(request):
     return redirect("orders:cart_detail")
 
 
+CART_API_MAX_OPS = 50
+
+
+def _cart_payload(cart):
+    snap = cart.snapshot
+    return {
+        "lines": [
+            {
+                "meal_id": line.meal.id,
+                "slug": line.meal.slug,
+                "name": line.meal.name,
+                "quantity": line.quantity,
+                "price": str(line.price),
+                "total_price": str(line.total_price),
+            }
+            for line in snap.lines
+        ],
+        "count": len(cart),
+        "promo_code": cart.promo_code,
+        "subtotal": str(snap.subtotal),
+        "discount": str(snap.discount),
+        "total": str(snap.total),
+    }
+
+
+def _parse_cart_ops(raw_ops):
+    """
+    Valide toute la liste avant d'appliquer quoi que ce soit.
+    Retour: (ops, erreur) — erreur = (index, message) ou None
+    """
+    if not isinstance(raw_ops, list) or not raw_ops:
+        return None, (None, "Liste d'opérations vide.")
+    if len(raw_ops) > CART_API_MAX_OPS:
+        return None, (None, f"Maximum {CART_API_MAX_OPS} opérations par requête.")
+
+    catalog = get_catalog()
+    ops = []
+    for index, raw in enumerate(raw_ops):
+        if not isinstance(raw, dict):
+            return None, (index, "Opération invalide.")
+        op = raw.get("op")
+
+        if op == "promo":
+            ops.append(("promo", str(raw.get("code") or "")))
+            continue
+        if op not in ("add", "set", "remove"):
+            return None, (index, "Opération inconnue.")
+
+        meal = catalog.get(raw.get("meal_id"))
+        if op == "remove":
+            # plat retiré du catalogue depuis : le panier doit pouvoir s'en défaire
+            try:
+                ops.append(("remove", meal.id if meal else int(raw.get("meal_id")), 0))
+            except (TypeError, ValueError):
+                return None, (index, "Plat introuvable.")
+            continue
+        if meal is None or not meal.is_active:
+            return None, (index, "Plat introuvable.")
+
+        try:
+            quantity = int(raw.get("quantity", 1))
+        except (TypeError, ValueError):
+            return None, (index, "Quantité invalide.")
+        if op == "add" and quantity < 1:
+            return None, (index, "Quantité invalide.")
+
+        ops.append((op, meal.id, quantity))
+    return ops, None
+
+
+@require_http_methods(["GET", "POST"])
+def cart_api(request):
+    """
+    API JSON du panier. POST: {"ops": [
+        {"op": "add", "meal_id": 3, "quantity": 1},
+        {"op": "set", "meal_id": 3, "quantity": 2},
+        {"op": "remove", "meal_id": 3},
+        {"op": "promo", "code": "WELCOME1000"},   # code vide => retire la promo
+    ]}
+    Tout ou rien : les opérations sont validées puis appliquées avec une seule
+    écriture du panier ; la réponse contient les lignes et totaux recalculés.
+    """
+    cart = Cart(request)
+    if request.method == "GET":
+        return JsonResponse({"ok": True, "cart": _cart_payload(cart)})
+
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "JSON invalide."}, status=400)
+
+    ops, error = _parse_cart_ops(body.get("ops") if isinstance(body, dict) else None)
+    if error:
+        index, message = error
+        return JsonResponse({"ok": False, "error": message, "index": index}, status=400)
+
+    user = request.user if request.user.is_authenticated else None
+    promo = None
+    with cart.batch():
+        for op in ops:
+            if op[0] == "add":
+                cart.add(op[1], op[2])
+            elif op[0] == "set":
+                cart.set(op[1], op[2])
+            elif op[0] == "remove":
+                cart.remove(op[1])
+            else:
+                ok, msg = cart.apply_promo(user=user, promo_code=op[1])
+                promo = {"ok": ok, "message": msg}
+
+    return JsonResponse({"ok": True, "promo": promo, "cart": _cart_payload(cart)})
+
+
+def _in_progress(request):
+    """La même commande est encore en cours (ou déjà traitée) : ne jamais la relancer."""
+    return render(request, 'orders/checkout_in_progress.html', status=409)
+
+
+def _replay(request, key):
+    """
+    Réponse pour une clé déjà vue (double soumission) ; None seulement si
+    cette requête détient la clé et doit passer la commande.
+    """
+    claimed, value = idempotency.claim(request.user, key)
+    if claimed:
+        return None
+    value = value or idempotency.wait_for_order(request.user, key)
+    if value == idempotency.PENDING:
+        # la première requête est lente (verrou base...) : pas de seconde commande
+        return _in_progress(request)
+    if value is None:
+        # la première tentative a échoué et rendu la clé : on la reprend,
+        # sauf si une autre soumission a été plus rapide
+        claimed, _ = idempotency.claim(request.user, key)
+        return None if claimed else _in_progress(request)
+    ticket = idempotency.queued_ticket(value)
+    if ticket:
+        return redirect('orders:checkout_pending', ticket=ticket)
+    order = Order.objects.filter(pk=value, user=request.user).first()
+    if order is None:
+        return _in_progress(request)
+    Cart(request).clear()
+    return render(request, 'orders/checkout_success.html', {'order': order})
+
+
+def _shed(request, cart, form, admission):
+    """File pleine : 503 + Retry-After, le formulaire reste rempli."""
+    form.add_error(None, "Beaucoup de commandes en ce moment, réessaie dans quelques instants.")
+    response = render(request, 'orders/checkout.html', {'cart': cart, 'form': form}, status=503)
+    response['Retry-After'] = str(admission.retry_after)
+    return response
+
+
+def _enqueue_checkout(request, cart, form, key, admission):
+    """Mode file : met en file, redirige vers la page d'attente."""
+    draft = draft_from_cart(cart, form.cleaned_data, ticket=queue.new_ticket())
+    check_portions(draft)
+    ticket = queue.enqueue(request.user, draft)
+    if key:
+        idempotency.complete_queued(request.user, key, ticket)
+    if admission.delay:
+        request.session['queue_delay'] = admission.delay
+    return redirect('orders:checkout_pending', ticket=ticket)
+
+
 @login_required(login_url='login')
 def checkout(request):
     cart = Cart(request)
-    if not list(cart):
-        return redirect('shop:meal_list')
-
-    # Toujours avoir un profil disponible
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
 
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
+        key = request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        # formulaire invalide : clé jamais réservée, la correction repart avec la même
         if form.is_valid():
-            # Mettre à jour le profil
-            profile.full_name = form.cleaned_data['customer_name']
-            profile.phone = form.cleaned_data['phone']
-            profile.address = form.cleaned_data['address']
-            profile.save()
-
-            # Créer la commande
-            order = Order.objects.create(
-                user=request.user,
-                customer_name=profile.full_name,
-                phone=profile.phone,
-                address=profile.address,
-                total=cart.get_total_price(),
-            )
-
-            voucher = FreeMealVoucher.objects.filter(
-                user=request.user,
-                is_used=False
-            ).first()
-
-            if voucher:
-                # appliquer remise équivalente à 1 plat
-                voucher.is_used = True
-                voucher.used_order = order
-                voucher.save()
-
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    meal=item['meal'],
-                    quantity=item['quantity'],
-                    unit_price=item['meal'].price
-                )
-
-            cart.clear()
-            return render(request, 'orders/checkout_success.html', {'order': order})
+            if key:
+                response = _replay(request, key)
+                if response is not None:
+                    return response
+
+            order = None
+            placed = False  # commande écrite ou mise en file : sinon la clé est rendue
+            try:
+                if not cart.snapshot.lines:
+                    return redirect('shop:meal_list')
+                if queue.is_enabled():
+                    admission = queue.admit()
+                    if not admission.accepted:
+                        return _shed(request, cart, form, admission)
+                    response = _enqueue_checkout(request, cart, form, key, admission)
+                    placed = True
+                    return response
+                order = place_order(request.user, cart, form.cleaned_data)
+                placed = True
+            except CheckoutError as exc:
+                form.add_error(None, exc.message)
+            finally:
+                if key and not placed:
+                    idempotency.release(request.user, key)
+
+            if order is not None:
+                if key:
+                    idempotency.complete(request.user, key, order.id)
+                cart.clear()
+                return render(request, 'orders/checkout_success.html', {'order': order})
     else:
+        if not cart.snapshot.lines:
+            return redirect('shop:meal_list')
+
+        # Toujours avoir un profil disponible
+        profile, created = UserProfile.objects.get_or_create(user=request.user)
         form = CheckoutForm(initial={
             'customer_name': profile.full_name,
             'phone': profile.phone,
             'address': profile.address,
+            'idempotency_key': idempotency.new_key(),
         })
 
     return render(request, 'orders/checkout.html', {
@@ -117,23 +282,35 @@ def checkout(request):
     })
 
 
+def _ticket_status(request, ticket):
+    state = queue.status(ticket, request.user)
+    if state is None:
+        raise Http404("Ticket inconnu")
+    return state
 
 
+@login_required(login_url='login')
+def checkout_pending(request, ticket):
+    state = _ticket_status(request, ticket)
+    if state["state"] == queue.DONE:
+        order = Order.objects.filter(pk=state["order_id"], user=request.user).first()
+        if order is not None:
+            # panier vidé seulement une fois la commande écrite
+            Cart(request).clear()
+            return render(request, 'orders/checkout_success.html', {'order': order})
+    return render(request, 'orders/checkout_pending.html', {
+        'ticket': ticket,
+        'state': state,
+        'delay': request.session.pop('queue_delay', 0),
+    })
 
 
-@transaction.atomic
-def apply_loyalty_on_delivery(order):
-    if not order.user:
-        return  # invité = pas de fidélité
-
-    account, _ = LoyaltyAccount.objects.get_or_create(user=order.user)
-
-    meals = count_meals(order)
-    account.points += meals
-
-    free_count = account.points // 8
-    account.points = account.points % 8
-    account.save()
+@login_required(login_url='login')
+def checkout_status(request, ticket):
+    state = _ticket_status(request, ticket)
+    return JsonResponse({
+        "state": state["state"],
+        "order_id": state.get("order_id"),
+        "error": state.get("error"),
+    })
 
-    for _ in range(free_count):
-        FreeMealVoucher.objects.create(user=order.user)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'orders.middleware.CartStorageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -90,6 +92,37 @@ DATABASES = {
 }
 
 
+# Cache partagé entre les workers gunicorn : versions catalogue / promos,
+# clés d'idempotence, paniers (CacheCartStorage), tickets de la file...
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+#
+# Il faut un add() et un incr() atomiques (pas FileBasedCache) :
+#   REDIS_URL défini  -> Redis (add / incr atomiques, TTL conservé par incr)
+#   sinon             -> table en base (python manage.py createcachetable) :
+#                        add() atomique par la clé primaire ; TIMEOUT None pour
+#                        que incr() ne fasse pas expirer les versions ; assez
+#                        d'entrées pour ne pas évincer paniers et clés en cours
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'resto_cache',
+            'TIMEOUT': None,
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -126,3 +159,21 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 LOGIN_REDIRECT_URL = "/comptes/profile/"
+
+# Panier : orders.storage.SessionCartStorage / SignedCookieCartStorage / CacheCartStorage
+CART_STORAGE = 'orders.storage.SignedCookieCartStorage'
+CART_COOKIE_AGE = 60 * 60 * 24 * 14
+
+# Checkout : "sync" (écriture directe) ou "queue" (file + worker drain_order_queue)
+ORDER_INGESTION_MODE = 'sync'
+ORDER_QUEUE_DIR = BASE_DIR / 'var' / 'order_queue'
+ORDER_QUEUE_SOFT_DEPTH = 100   # au-delà : délai d'attente annoncé au client
+ORDER_QUEUE_MAX_DEPTH = 500    # au-delà : 503 + Retry-After
+ORDER_QUEUE_DRAIN_RATE = 10    # commandes/s traitées par le worker (estimation)
+
+# Tableau live (staff.live) : flux SSE seulement sous ASGI,
+#   gunicorn resto.asgi:application -k uvicorn.workers.UvicornWorker
+# sous WSGI le tableau se recharge périodiquement.
+# InProcessBroker avec un seul worker ASGI, OutboxTailBroker dès qu'il y a plusieurs workers
+LIVE_BROKER = 'staff.live.InProcessBroker'
+LIVE_POLL_INTERVAL = 1.0
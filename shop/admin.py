@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Category, Meal
+from . import search
+from .models import Category, DailyMenu, DailyMenuItem, DailyStock, Meal
 
 
 @admin.register(Category)
@@ -16,4 +17,36 @@ class MealAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
 
+    def get_search_results(self, request, queryset, search_term):
+        # index en mémoire (shop.search) au lieu de icontains sur toute la table
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        ids = [m.id for m in search.search(search_term, limit=None, active_only=False)]
+        return queryset.filter(pk__in=ids), False
 
+
+@admin.register(DailyStock)
+class DailyStockAdmin(admin.ModelAdmin):
+    list_display = ('day', 'meal', 'capacity', 'reserved')
+    list_filter = ('day',)
+    raw_id_fields = ('meal',)
+
+
+class DailyMenuItemInline(admin.TabularInline):
+    model = DailyMenuItem
+    extra = 1
+    raw_id_fields = ('meal',)
+
+
+@admin.register(DailyMenu)
+class DailyMenuAdmin(admin.ModelAdmin):
+    list_display = ('day', 'cutoff_time', 'meals', 'note')
+    date_hierarchy = 'day'
+    inlines = [DailyMenuItemInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('items__meal')
+
+    @admin.display(description='Plats')
+    def meals(self, obj):
+        return ", ".join(item.meal.name for item in obj.items.all())
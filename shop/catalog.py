@@ -0,0 +1,205 @@
+"""
+Catalogue en mémoire (plats + catégories).
+
+Le menu change quelques fois par jour mais il est lu à chaque page : on garde
+une copie compacte par process, indexée par id et par slug. Chaque save/delete
+de Meal/Category incrémente une version partagée dans le cache ; un worker qui
+voit une version différente de la sienne recharge paresseusement.
+
+Attention : les ``QuerySet.update()`` ne déclenchent pas les signaux, appeler
+``bump_version()`` à la main dans ce cas.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import Category, Meal
+
+
+VERSION_CACHE_KEY = "shop:catalog:version"
+
+
+@dataclass(frozen=True, slots=True)
+class ImageRef:
+    """Remplace ImageFieldFile dans les templates (``meal.image.url``)."""
+    name: str
+    # ((format, largeur, nom), ...) triées par largeur, voir shop.images
+    variants: tuple = ()
+
+    def __bool__(self):
+        return bool(self.name)
+
+    @property
+    def url(self) -> str:
+        return default_storage.url(self.name) if self.name else ""
+
+    def srcset(self, fmt: str) -> str:
+        """``"<url> 320w, <url> 640w"`` pour un format, "" si pas de variantes."""
+        return ", ".join(f"{default_storage.url(n)} {w}w" for f, w, n in self.variants if f == fmt)
+
+    @classmethod
+    def build(cls, name, variants):
+        name = name or ""
+        if not variants or variants.get("src") != name:
+            return cls(name)  # variantes absentes ou d'une ancienne photo
+        return cls(name, tuple(sorted(
+            (fmt, int(width), target)
+            for fmt, by_width in variants.items() if fmt != "src"
+            for width, target in by_width.items()
+        )))
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryRecord:
+    id: int
+    slug: str
+    name: str
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass(frozen=True, slots=True)
+class MealRecord:
+    id: int
+    slug: str
+    name: str
+    price: Decimal
+    category: CategoryRecord
+    is_active: bool
+    description: str
+    image: ImageRef
+
+    def __str__(self):
+        return self.name
+
+
+class Catalog:
+    def __init__(self, version: int, categories, meals):
+        self.version = version
+        self.categories = tuple(categories)
+        self.meals = tuple(meals)
+        self.active_meals = tuple(m for m in self.meals if m.is_active)
+
+        self._by_id = {m.id: m for m in self.meals}
+        self._by_slug = {m.slug: m for m in self.meals}
+        self._category_by_slug = {c.slug: c for c in self.categories}
+
+        self._active_by_category = {}
+        for m in self.active_meals:
+            self._active_by_category.setdefault(m.category.id, []).append(m)
+
+        self._latest_active = max(self.active_meals, key=lambda m: m.id, default=None)
+        self._json = None
+
+    def get(self, meal_id) -> MealRecord | None:
+        try:
+            return self._by_id.get(int(meal_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_by_slug(self, slug: str) -> MealRecord | None:
+        return self._by_slug.get(slug)
+
+    def category(self, slug: str) -> CategoryRecord | None:
+        return self._category_by_slug.get(slug)
+
+    def active_in_category(self, category_id: int) -> tuple:
+        return tuple(self._active_by_category.get(category_id, ()))
+
+    def latest_active(self) -> MealRecord | None:
+        """Dernier plat actif (par id) : le "plat du jour" historique."""
+        return self._latest_active
+
+    def to_json(self) -> bytes:
+        """Catalogue public (catégories, plats actifs) en JSON, sérialisé une fois par version."""
+        if self._json is None:
+            self._json = json.dumps({
+                "version": self.version,
+                "categories": [{"id": c.id, "slug": c.slug, "name": c.name} for c in self.categories],
+                "meals": [
+                    {
+                        "id": m.id,
+                        "slug": m.slug,
+                        "name": m.name,
+                        "category_id": m.category.id,
+                        "price": str(m.price),
+                        "description": m.description,
+                        "image": _image_json(m.image),
+                    }
+                    for m in self.active_meals
+                ],
+            }, ensure_ascii=False, separators=(",", ":")).encode()
+        return self._json
+
+
+def _image_json(image: ImageRef):
+    if not image:
+        return None
+    variants = {}
+    for fmt, width, name in image.variants:
+        variants.setdefault(fmt, {})[str(width)] = default_storage.url(name)
+    return {"url": image.url, **variants}
+
+
+_lock = threading.Lock()
+_catalog: Catalog | None = None
+
+
+def current_version() -> int:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # ms depuis epoch : reste croissant même si la clé a été évincée
+        cache.add(VERSION_CACHE_KEY, time.time_ns() // 1_000_000, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def bump_version() -> None:
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.add(VERSION_CACHE_KEY, time.time_ns() // 1_000_000, timeout=None)
+
+
+def _load(version: int) -> Catalog:
+    categories = {
+        cid: CategoryRecord(cid, slug, name)
+        for cid, slug, name in Category.objects.order_by("name").values_list("id", "slug", "name")
+    }
+    rows = (
+        Meal.objects
+        .order_by("category__name", "name")
+        .values_list(
+            "id", "slug", "name", "price", "category_id", "is_active", "description", "image", "image_variants",
+        )
+    )
+    meals = [
+        MealRecord(
+            mid, slug, name, price, categories[cat_id], is_active, description, ImageRef.build(image, variants)
+        )
+        for mid, slug, name, price, cat_id, is_active, description, image, variants in rows
+    ]
+    return Catalog(version, categories.values(), meals)
+
+
+def get_catalog() -> Catalog:
+    """Catalogue courant ; ne touche la DB que si la version a changé."""
+    global _catalog
+    # lire la version AVANT de charger : une donnée périmée porte toujours une
+    # version plus ancienne et sera rechargée au prochain appel
+    version = current_version()
+    catalog = _catalog
+    if catalog is None or catalog.version != version:
+        with _lock:
+            catalog = _catalog
+            if catalog is None or catalog.version != version:
+                catalog = _catalog = _load(version)
+    return catalog
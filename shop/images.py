@@ -0,0 +1,88 @@
+"""
+Variantes responsive des photos de plats (Pillow).
+
+Pour chaque photo, on génère des copies redimensionnées à largeur fixe, en
+WebP et en JPEG, à côté de l'original :
+    meals/garba.png  ->  meals/garba-320w.webp, meals/garba-320w.jpg, ...
+Les noms sont gardés dans Meal.image_variants :
+    {"src": "meals/garba.png", "webp": {"320": "meals/...", ...}, "jpeg": {...}}
+"src" permet de savoir si les variantes correspondent encore à la photo.
+
+Génération à l'upload (signal post_save) ou en masse via
+``build_meal_images`` (pool de process).
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (320, 640, 1024)
+FORMATS = {
+    # format : (extension, options Pillow)
+    "webp": ("webp", {"quality": 78, "method": 4}),
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def variant_name(name: str, width: int, fmt: str) -> str:
+    stem, _ = posixpath.splitext(name)
+    return f"{stem}-{width}w.{FORMATS[fmt][0]}"
+
+
+def is_current(image_name: str, variants: dict) -> bool:
+    return bool(image_name) and (variants or {}).get("src") == image_name
+
+
+def _encode(img, fmt) -> bytes:
+    buf = BytesIO()
+    img.save(buf, format=fmt.upper(), **FORMATS[fmt][1])
+    return buf.getvalue()
+
+
+def generate(name: str) -> dict:
+    """
+    Crée les variantes de ``name`` (nom dans le storage) et retourne le dict
+    à ranger dans Meal.image_variants ; {} si l'image est illisible.
+    Fonction de module, sans état : appelable depuis un process du pool.
+    """
+    try:
+        with default_storage.open(name, "rb") as fh:
+            source = Image.open(fh)
+            source = ImageOps.exif_transpose(source)  # photos de téléphone : orientation EXIF
+            source.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("images: %s illisible", name)
+        return {}
+
+    if source.mode not in ("RGB", "L"):
+        background = Image.new("RGB", source.size, "white")  # transparence -> fond blanc (JPEG)
+        background.paste(source, mask=source.convert("RGBA").getchannel("A"))
+        source = background
+    else:
+        source = source.convert("RGB")
+
+    # pas d'agrandissement : les largeurs au-delà de l'original sont ramenées à l'original
+    widths = sorted({min(w, source.width) for w in WIDTHS})
+    variants = {"src": name, **{fmt: {} for fmt in FORMATS}}
+    for width in widths:
+        height = max(1, round(source.height * width / source.width))
+        resized = source if width == source.width else source.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            target = variant_name(name, width, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            # le storage peut renommer (collision, nom normalisé) : garder son nom à lui
+            variants[fmt][str(width)] = default_storage.save(target, ContentFile(_encode(resized, fmt)))
+    return variants
+
+
+def delete(variants: dict) -> None:
+    for fmt in FORMATS:
+        for target in (variants or {}).get(fmt, {}).values():
+            default_storage.delete(target)
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shop import images
+from shop.catalog import bump_version
+from shop.models import Meal
+
+
+def _init_worker():
+    # process neuf (spawn) : Django à initialiser ; fork : déjà prêt
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Génère les variantes WebP/JPEG des photos de plats (pool de process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regénérer même les variantes à jour")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **opts):
+        rows = Meal.objects.exclude(image="").exclude(image__isnull=True).values_list("id", "image", "image_variants")
+        todo = {
+            meal_id: (name, variants) for meal_id, name, variants in rows
+            if opts["all"] or not images.is_current(name, variants)
+        }
+        if not todo:
+            self.stdout.write("Toutes les variantes sont à jour.")
+            return
+
+        # pas de connexion DB héritée par les process du pool
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, opts["workers"]), initializer=_init_worker) as pool:
+            futures = {pool.submit(images.generate, name): meal_id for meal_id, (name, _) in todo.items()}
+            for future in as_completed(futures):
+                meal_id = futures[future]
+                name, old = todo[meal_id]
+                try:
+                    variants = future.result()
+                except Exception as exc:  # noqa : un plat en échec n'arrête pas le lot
+                    self.stderr.write(f"#{meal_id} {name} : {exc}")
+                    failed += 1
+                    continue
+                if not variants:
+                    failed += 1
+                    continue
+                stale = {
+                    fmt: {w: n for w, n in old.get(fmt, {}).items() if n not in variants.get(fmt, {}).values()}
+                    for fmt in images.FORMATS
+                } if old else {}
+                images.delete(stale)
+                Meal.objects.filter(pk=meal_id).update(image_variants=variants)
+                done += 1
+
+        bump_version()  # update() ne déclenche pas les signaux
+        self.stdout.write(self.style.SUCCESS(f"{done} plat(s) traité(s), {failed} en échec"))
@@ -0,0 +1,123 @@
+"""
+Menu du jour planifié (DailyMenu) : plats, portions et heure limite par date.
+
+Le menu d'un jour est résolu une fois puis gardé dans le cache jusqu'à
+minuit ; toute modification du planning (menu ou plats) efface la clé du
+jour concerné (signaux). Le cache ne garde que des ids : les plats eux-mêmes
+viennent du catalogue en mémoire.
+
+Jour sans menu planifié : comportement historique, dernier plat actif et
+DEFAULT_CUTOFF_TIME.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import DailyMenu, DailyStock
+
+
+DEFAULT_CUTOFF_TIME = time(14, 35)
+CACHE_KEY = "shop:menu:{day}"
+PLANNING_DAYS = 7
+
+
+@dataclass(frozen=True)
+class Menu:
+    day: object
+    meals: tuple          # MealRecord, plat mis en avant en premier
+    cutoff_time: time
+    planned: bool         # False : repli sur le dernier plat actif
+
+    @property
+    def meal(self):
+        return self.meals[0] if self.meals else None
+
+    @property
+    def key(self) -> str:
+        """Identifie le contenu du menu (clé du cache de page)."""
+        return f"{'-'.join(str(m.id) for m in self.meals)}@{self.cutoff_time:%H%M}"
+
+    def is_closed(self, now=None) -> bool:
+        now = timezone.localtime(now)
+        return now.date() > self.day or (now.date() == self.day and now.time() >= self.cutoff_time)
+
+
+def _seconds_until_midnight(day) -> int:
+    midnight = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return max(1, int((midnight - timezone.now()).total_seconds()))
+
+
+def _load(day):
+    """(ids des plats, heure limite) du menu planifié, ou None."""
+    menu = DailyMenu.objects.filter(day=day).first()
+    if menu is None:
+        return None
+    ids = list(menu.items.order_by("position", "id").values_list("meal_id", flat=True))
+    return ids, menu.cutoff_time
+
+
+def for_day(day=None) -> Menu:
+    day = day or timezone.localdate()
+    key = CACHE_KEY.format(day=day)
+    entry = cache.get(key)
+    if entry is None:
+        entry = _load(day) or ()  # () = pas de menu planifié, mis en cache aussi
+        cache.set(key, entry, _seconds_until_midnight(day) if day == timezone.localdate() else 60 * 60)
+
+    catalog = get_catalog()
+    if not entry:
+        latest = catalog.latest_active()
+        return Menu(day, (latest,) if latest else (), DEFAULT_CUTOFF_TIME, planned=False)
+
+    ids, cutoff = entry
+    meals = tuple(m for m in (catalog.get(i) for i in ids) if m is not None and m.is_active)
+    return Menu(day, meals, cutoff, planned=True)
+
+
+def forget(day) -> None:
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY.format(day=day)))
+
+
+def sync_stock(day, meal_id, capacity) -> None:
+    """Portions du menu -> DailyStock (réservations conservées) ; None = illimité."""
+    if capacity is None:
+        DailyStock.objects.filter(day=day, meal_id=meal_id).delete()
+    else:
+        DailyStock.objects.update_or_create(day=day, meal_id=meal_id, defaults={"capacity": capacity})
+
+
+def week(start=None, days=PLANNING_DAYS):
+    """[(jour, DailyMenu ou None)] pour le planning staff, plats préchargés."""
+    start = start or timezone.localdate()
+    planned = {
+        m.day: m for m in
+        DailyMenu.objects.filter(day__gte=start, day__lt=start + timedelta(days=days))
+        .prefetch_related("items__meal")
+    }
+    return [(start + timedelta(days=i), planned.get(start + timedelta(days=i))) for i in range(days)]
+
+
+@transaction.atomic
+def copy(source_day, target_day):
+    """
+    Recopie le menu de ``source_day`` sur ``target_day`` ; None si rien à copier.
+    Menu cible modifié sur place : les portions déjà réservées ce jour-là restent.
+    """
+    source = DailyMenu.objects.filter(day=source_day).first()
+    if source is None:
+        return None
+    target, _ = DailyMenu.objects.update_or_create(
+        day=target_day, defaults={"cutoff_time": source.cutoff_time, "note": source.note},
+    )
+    items = list(source.items.all())
+    target.items.exclude(meal_id__in=[item.meal_id for item in items]).delete()
+    # un save() par plat : les signaux recopient les portions dans DailyStock
+    for item in items:
+        target.items.update_or_create(
+            meal_id=item.meal_id, defaults={"position": item.position, "capacity": item.capacity},
+        )
+    return target
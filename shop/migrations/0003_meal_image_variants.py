@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_dailystock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
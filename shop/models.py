@@ -21,15 +21,58 @@ class Meal(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     is_active = models.BooleanField(default=True)
     image = models.ImageField(upload_to='meals/', blank=True, null=True)
+    # variantes redimensionnées de ``image`` (shop.images)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
 
+class DailyStock(models.Model):
+    """Portions disponibles d'un plat pour une journée (pas de ligne = illimité)."""
+    day = models.DateField()
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='daily_stocks')
+    capacity = models.PositiveIntegerField()
+    reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'meal'], name='uniq_daily_stock'),
+        ]
+
+    @property
+    def remaining(self):
+        return max(0, self.capacity - self.reserved)
+
+    def __str__(self):
+        return f"{self.meal} – {self.day} ({self.reserved}/{self.capacity})"
 
 
+class DailyMenu(models.Model):
+    """Menu planifié d'une journée (shop.menu) ; sans menu, le dernier plat actif sert de plat du jour."""
+    day = models.DateField(unique=True)
+    cutoff_time = models.TimeField(help_text="Heure limite de commande")
+    note = models.CharField(max_length=200, blank=True)
 
+    class Meta:
+        ordering = ['day']
 
+    def __str__(self):
+        return f"Menu du {self.day}"
 
 
+class DailyMenuItem(models.Model):
+    menu = models.ForeignKey(DailyMenu, on_delete=models.CASCADE, related_name='items')
+    meal = models.ForeignKey(Meal, on_delete=models.PROTECT, related_name='menu_items')
+    position = models.PositiveSmallIntegerField(default=0)  # 0 = plat mis en avant
+    # portions du jour, recopiées dans DailyStock (vide = illimité)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
 
+    class Meta:
+        ordering = ['position', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['menu', 'meal'], name='uniq_menu_meal'),
+        ]
+
+    def __str__(self):
+        return f"{self.meal} ({self.menu.day})"
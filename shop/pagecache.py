@@ -0,0 +1,64 @@
+"""
+Cache des pages de la vitrine, avec des "trous" rendus par requête.
+
+La page est rendue une fois avec un marqueur à la place de chaque fragment
+personnel ({% hole "..." %}, templates shop/holes/<nom>.html) puis gardée en
+cache sous une clé qui change avec le catalogue (version) et l'état de la
+journée (ouvert / sold out, portions restantes). À chaque requête, seuls
+les trous sont rendus :
+    cart_badge   badge du panier
+    auth_nav     connexion / profil / déconnexion
+    csrf         champ csrfmiddlewaretoken des formulaires
+
+Hors page en cache, {% hole %} rend simplement le fragment sur place.
+Les requêtes avec paramètres (?q=...) ne passent pas par le cache.
+"""
+import re
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+
+from .catalog import current_version
+
+
+PAGE_KEY = "shop:page:{template}:{version}:{state}"
+PAGE_TTL = 60 * 60
+
+HOLES_FLAG = "pagecache_holes"  # présent dans le contexte : émettre des marqueurs
+HOLE_TEMPLATE = "shop/holes/{name}.html"
+HOLE_RE = re.compile(r"<!--hole:([a-z_]+)-->")
+
+
+def marker(name: str) -> str:
+    return f"<!--hole:{name}-->"
+
+
+def fill(html: str, request) -> str:
+    """Remplace chaque marqueur par son fragment, rendu une fois par requête."""
+    rendered = {}
+
+    def fragment(match):
+        name = match.group(1)
+        if name not in rendered:
+            rendered[name] = render_to_string(HOLE_TEMPLATE.format(name=name), request=request)
+        return rendered[name]
+
+    return HOLE_RE.sub(fragment, html)
+
+
+def render_page(request, template_name, state, get_context):
+    """
+    Comme ``render``, mais la page (hors trous) vient du cache pour un même
+    ``state``. ``get_context()`` n'est appelé que pour reconstruire la page.
+    """
+    if request.method != "GET" or request.GET:
+        return render(request, template_name, get_context())
+
+    key = PAGE_KEY.format(template=template_name, version=current_version(), state=state)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(template_name, {**get_context(), HOLES_FLAG: True}, request=request)
+        cache.set(key, html, PAGE_TTL)
+    return HttpResponse(fill(html, request))
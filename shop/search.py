@@ -0,0 +1,159 @@
+"""
+Recherche de plats : index inversé en mémoire, construit depuis le catalogue.
+
+    "Poulet braisé, sauce épicée"  ->  poulet, braise, sauce, epicee
+
+Tokenisation française simple : minuscules, accents retirés (NFKD), mots
+vides ignorés. Chaque mot pointe vers {meal_id: poids} (nom 3, catégorie 2,
+description 1). Les mots triés permettent la recherche par préfixe (bisect)
+pour les suggestions pendant la frappe.
+
+Requête : chaque mot doit correspondre (ET), le dernier aussi par préfixe ;
+score = somme des meilleurs poids, un préfixe compte moins qu'un mot entier.
+
+L'index suit shop.catalog : quand la version change, seuls les plats dont
+l'enregistrement a changé sont retirés / réindexés. Aucune requête SQL.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from .catalog import Catalog, get_catalog
+
+
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_FACTOR = 0.6
+MAX_RESULTS = 50
+
+STOPWORDS = frozenset(
+    "a au aux avec d de des du en et l la le les ou par pour sans sur un une".split()
+)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> list:
+    return [w for w in _WORD_RE.findall(fold(text)) if w not in STOPWORDS]
+
+
+def _fields(meal):
+    yield meal.name, NAME_WEIGHT
+    yield meal.category.name, CATEGORY_WEIGHT
+    yield meal.description, DESCRIPTION_WEIGHT
+
+
+class SearchIndex:
+    def __init__(self):
+        self.version = None
+        self.meals = {}                      # meal_id -> MealRecord indexé
+        self._postings = defaultdict(dict)   # mot -> {meal_id: poids}
+        self._words = []                     # mots triés, pour les préfixes
+        self._terms = {}                     # meal_id -> mots du plat (pour le retrait)
+
+    # ---------- mise à jour ----------
+
+    def add(self, meal) -> None:
+        weights = {}
+        for text, weight in _fields(meal):
+            for word in tokenize(text):
+                weights[word] = max(weights.get(word, 0.0), weight)
+        for word, weight in weights.items():
+            if word not in self._postings:
+                insort(self._words, word)
+            self._postings[word][meal.id] = weight
+        self._terms[meal.id] = tuple(weights)
+        self.meals[meal.id] = meal
+
+    def remove(self, meal_id) -> None:
+        for word in self._terms.pop(meal_id, ()):
+            posting = self._postings.get(word)
+            if posting is None:
+                continue
+            posting.pop(meal_id, None)
+            if not posting:
+                del self._postings[word]
+                i = bisect_left(self._words, word)
+                if i < len(self._words) and self._words[i] == word:
+                    del self._words[i]
+        self.meals.pop(meal_id, None)
+
+    def sync(self, catalog: Catalog) -> None:
+        """Aligne l'index sur ``catalog`` : ne retouche que les plats modifiés."""
+        current = {m.id: m for m in catalog.meals}
+        for meal_id in [i for i in self.meals if i not in current]:
+            self.remove(meal_id)
+        for meal_id, meal in current.items():
+            if self.meals.get(meal_id) != meal:
+                self.remove(meal_id)
+                self.add(meal)
+        self.version = catalog.version
+
+    # ---------- lecture ----------
+
+    def _prefixed(self, prefix):
+        i = bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            yield self._words[i]
+            i += 1
+
+    def _scores(self, word, prefix) -> dict:
+        scores = dict(self._postings.get(word, {}))
+        if prefix:
+            for other in self._prefixed(word):
+                if other == word:
+                    continue
+                for meal_id, weight in self._postings[other].items():
+                    scores[meal_id] = max(scores.get(meal_id, 0.0), weight * PREFIX_FACTOR)
+        return scores
+
+    def search(self, query: str, limit=MAX_RESULTS, active_only=True) -> list:
+        """Plats triés par pertinence puis par nom."""
+        # dernier mot en cours de frappe, sauf si la requête finit par un espace ;
+        # gardé même s'il ressemble à un mot vide ("la" -> lasagnes)
+        as_you_type = not query[-1:].isspace()
+        raw = _WORD_RE.findall(fold(query))
+        words = [w for w in raw if w not in STOPWORDS]
+        if as_you_type and raw and raw[-1] in STOPWORDS:
+            words.append(raw[-1])
+        if not words:
+            return []
+
+        total = None
+        for n, word in enumerate(words):
+            scores = self._scores(word, prefix=as_you_type and n == len(words) - 1)
+            if total is None:
+                total = scores
+            else:
+                total = {i: s + scores[i] for i, s in total.items() if i in scores}
+            if not total:
+                return []
+
+        meals = [self.meals[i] for i in total if not active_only or self.meals[i].is_active]
+        meals.sort(key=lambda m: (-total[m.id], m.name))
+        return meals[:limit]
+
+
+_lock = threading.Lock()
+_index = SearchIndex()
+
+
+def search(query: str, limit=MAX_RESULTS, active_only=True) -> list:
+    """
+    Recherche dans l'index du process, resynchronisé si le catalogue a changé.
+    Verrou pour tout l'appel : l'index est modifié sur place par sync().
+    """
+    catalog = get_catalog()
+    with _lock:
+        if _index.version != catalog.version:
+            _index.sync(catalog)
+        return _index.search(query, limit=limit, active_only=active_only)
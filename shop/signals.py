@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import images, menu, stock
+from .catalog import bump_version
+from .models import Category, DailyMenu, DailyMenuItem, DailyStock, Meal
+
+
+@receiver([post_save, post_delete], sender=Meal)
+@receiver([post_save, post_delete], sender=Category)
+def on_catalog_changed(sender, **kwargs):
+    # après commit : les autres workers ne doivent pas recharger une version non visible
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Meal)
+def on_meal_image_saved(sender, instance, **kwargs):
+    name = instance.image.name if instance.image else ""
+    if images.is_current(name, instance.image_variants) or (not name and not instance.image_variants):
+        return
+    old = instance.image_variants
+    # après commit : l'encodage ne garde pas la transaction ouverte
+    transaction.on_commit(lambda: refresh_variants(instance.pk, name, old))
+
+
+def refresh_variants(meal_id, name, old):
+    images.delete(old)
+    variants = images.generate(name) if name else {}
+    # update() ne déclenche pas les signaux : version du catalogue à la main
+    Meal.objects.filter(pk=meal_id).update(image_variants=variants)
+    bump_version()
+
+
+@receiver(post_delete, sender=Meal)
+def on_meal_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: images.delete(instance.image_variants))
+
+
+@receiver([post_save, post_delete], sender=DailyStock)
+def on_daily_stock_changed(sender, instance, **kwargs):
+    # capacité modifiée depuis l'admin : le restant en cache est faux
+    transaction.on_commit(lambda: stock._forget(instance.day, [instance.meal_id]))
+
+
+@receiver([post_save, post_delete], sender=DailyMenu)
+def on_daily_menu_changed(sender, instance, **kwargs):
+    menu.forget(instance.day)
+
+
+@receiver(post_save, sender=DailyMenuItem)
+def on_menu_item_saved(sender, instance, **kwargs):
+    day = instance.menu.day
+    menu.sync_stock(day, instance.meal_id, instance.capacity)
+    menu.forget(day)
+
+
+@receiver(post_delete, sender=DailyMenuItem)
+def on_menu_item_deleted(sender, instance, **kwargs):
+    day = instance.menu.day
+    menu.sync_stock(day, instance.meal_id, None)
+    menu.forget(day)
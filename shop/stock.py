@@ -0,0 +1,86 @@
+"""
+Portions du jour (DailyStock).
+
+Réservation au checkout : un seul UPDATE conditionnel pour tout le panier,
+    UPDATE ... SET reserved = reserved + CASE meal_id WHEN .. THEN q .. END
+    WHERE day = .. AND meal_id IN (..) AND reserved + CASE .. END <= capacity
+toutes les lignes limitées touchées, ou SoldOut. Pas de verrou sur la table :
+deux clients sur deux plats différents ne se gênent pas, et sur le même plat
+le dernier servi échoue proprement.
+
+Lecture rapide du restant via le cache (invalidé après chaque réservation).
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import DailyStock
+
+
+CACHE_KEY = "shop:stock:{day}:{meal_id}"
+CACHE_TTL = 60
+UNLIMITED = -1  # valeur en cache pour "pas de limite ce jour-là"
+
+
+class SoldOut(Exception):
+    def __init__(self, meal_id, remaining):
+        super().__init__(f"meal {meal_id}: {remaining} left")
+        self.meal_id = meal_id
+        self.remaining = remaining
+
+
+def _forget(day, meal_ids):
+    cache.delete_many([CACHE_KEY.format(day=day, meal_id=m) for m in meal_ids])
+
+
+def reserve(day, quantities: dict) -> None:
+    """
+    Réserve {meal_id: quantité} pour ``day``. À appeler dans la transaction
+    du checkout : si SoldOut est levée, tout le checkout est annulé.
+    """
+    limited = list(DailyStock.objects.filter(day=day, meal_id__in=quantities).values_list("meal_id", flat=True))
+    if not limited:
+        return
+
+    wanted = Case(
+        *[When(meal_id=m, then=Value(quantities[m])) for m in limited],
+        default=Value(0), output_field=IntegerField(),
+    )
+    with transaction.atomic():  # point de sauvegarde : pas de réservation partielle
+        updated = DailyStock.objects.filter(
+            day=day, meal_id__in=limited, reserved__lte=F("capacity") - wanted,
+        ).update(reserved=F("reserved") + wanted)
+        if updated != len(limited):
+            transaction.set_rollback(True)
+    if updated != len(limited):
+        rows = DailyStock.objects.filter(day=day, meal_id__in=limited).values_list("meal_id", "capacity", "reserved")
+        left = {meal_id: max(0, capacity - reserved) for meal_id, capacity, reserved in rows}
+        meal_id = next((m for m in limited if left.get(m, 0) < quantities[m]), limited[0])
+        _forget(day, limited)
+        raise SoldOut(meal_id, left.get(meal_id, 0))
+
+    transaction.on_commit(lambda: _forget(day, limited))
+
+
+def release(day, quantities: dict) -> None:
+    """Rend les portions (commande annulée)."""
+    touched = []
+    for meal_id, qty in quantities.items():
+        if DailyStock.objects.filter(day=day, meal_id=meal_id).update(reserved=Greatest(F("reserved") - qty, 0)):
+            touched.append(meal_id)
+    if touched:
+        transaction.on_commit(lambda: _forget(day, touched))
+
+
+def remaining(meal_id, day=None, fresh=False):
+    """Portions restantes, ou None si le plat n'est pas limité ce jour-là."""
+    day = day or timezone.localdate()
+    key = CACHE_KEY.format(day=day, meal_id=meal_id)
+    value = None if fresh else cache.get(key)
+    if value is None:
+        row = DailyStock.objects.filter(day=day, meal_id=meal_id).values_list("capacity", "reserved").first()
+        value = UNLIMITED if row is None else max(0, row[0] - row[1])
+        cache.set(key, value, CACHE_TTL)
+    return None if value == UNLIMITED else value
@@ -0,0 +1,32 @@
+from django import template
+
+from shop.catalog import ImageRef
+
+
+register = template.Library()
+
+
+@register.filter
+def srcset(image, fmt="jpeg"):
+    """``{{ meal.image|srcset:"webp" }}`` -> "<url> 320w, <url> 640w, ..." ("" sans variantes)."""
+    return image.srcset(fmt) if isinstance(image, ImageRef) else ""
+
+
+@register.inclusion_tag("shop/includes/meal_picture.html")
+def meal_picture(image, alt, sizes="100vw", css_class="", placeholder="", lazy=True):
+    """
+    <picture> avec variantes WebP / JPEG (shop.images) ; le navigateur choisit
+    la largeur selon ``sizes``. Sans variantes : l'original, comme avant.
+    """
+    jpeg = srcset(image, "jpeg")
+    largest = [n for f, _, n in getattr(image, "variants", ()) if f == "jpeg"]
+    return {
+        "image": image,
+        "src": ImageRef(largest[-1]).url if largest else (image.url if image else placeholder),
+        "webp": srcset(image, "webp"),
+        "jpeg": jpeg,
+        "sizes": sizes,
+        "alt": alt,
+        "css_class": css_class,
+        "lazy": lazy,
+    }
@@ -0,0 +1,16 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from shop import pagecache
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name):
+    """Fragment personnel : marqueur dans une page mise en cache, rendu direct sinon."""
+    if context.get(pagecache.HOLES_FLAG):
+        return mark_safe(pagecache.marker(name))
+    fragment = context.template.engine.get_template(pagecache.HOLE_TEMPLATE.format(name=name))
+    return fragment.render(context)
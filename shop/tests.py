@@ -1,3 +1,235 @@
-from django.test import TestCase
+from datetime import time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from orders import states
+from orders.models import Order, OrderItem
+
+from . import menu, search, stock
+from .catalog import Catalog, CategoryRecord, ImageRef, MealRecord
+from .models import Category, DailyMenu, DailyStock, Meal
+
+
+@override_settings(
+    ALLOWED_HOSTS=["testserver"],
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.meal = Meal.objects.create(category=category, name="Garba", slug="garba", price=Decimal("1500"))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_homepage_is_served_without_queries(self):
+        url = reverse("shop:meal_list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Garba")
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertContains(response, "Connexion")
+        self.assertNotContains(response, "<!--hole:")
+
+    def test_holes_are_rendered_per_user(self):
+        url = reverse("shop:meal_list")
+        self.client.get(url)  # page en cache, rendue pour un anonyme
+        self.client.force_login(get_user_model().objects.create_user("awa", password="x"))
+        self.client.post(reverse("orders:cart_add", args=[self.meal.id]), {"quantity": 2})
+        response = self.client.get(url)
+        self.assertContains(response, "Déconnexion")
+        self.assertNotContains(response, reverse("comptes:login"))
+        self.assertContains(response, "rounded-pill")
+
+    def test_menu_change_invalidates_page(self):
+        url = reverse("shop:meal_list")
+        self.client.get(url)
+        self.meal.name = "Alloco"
+        with self.captureOnCommitCallbacks(execute=True):  # bump_version part au commit
+            self.meal.save()
+        self.assertContains(self.client.get(url), "Alloco")
+
+    def test_catalog_api_etag(self):
+        url = reverse("shop:catalog_api")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["name"] for m in response.json()["meals"]], ["Garba"])
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meal.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        plats = CategoryRecord(1, "plats", "Plats")
+        grillades = CategoryRecord(2, "grillades", "Grillades")
+        self.index = search.SearchIndex()
+        self.index.sync(Catalog(1, [plats, grillades], [
+            self._meal(1, "Poulet braisé", grillades, "Avec attiéké"),
+            self._meal(2, "Sauce graine", plats, "Poulet ou poisson fumé"),
+            self._meal(3, "Lasagnes", plats, ""),
+            self._meal(4, "Poisson braisé", grillades, "", is_active=False),
+        ]))
+
+    @staticmethod
+    def _meal(pk, name, category, description, is_active=True):
+        return MealRecord(pk, f"m{pk}", name, Decimal("1000"), category, is_active, description, ImageRef(""))
+
+    def _names(self, query, **kwargs):
+        return [m.name for m in self.index.search(query, **kwargs)]
+
+    def test_accent_folding_and_ranking(self):
+        # le nom pèse plus que la description
+        self.assertEqual(self._names("POULET "), ["Poulet braisé", "Sauce graine"])
+        self.assertEqual(self._names("attieke"), ["Poulet braisé"])
+
+    def test_prefix_on_last_word_only(self):
+        self.assertEqual(self._names("pou"), ["Poulet braisé", "Sauce graine"])
+        self.assertEqual(self._names("pou "), [])
+        self.assertEqual(self._names("la"), ["Lasagnes"])  # mot vide gardé en cours de frappe
+        self.assertEqual(self._names("sauce gr"), ["Sauce graine"])
+
+    def test_inactive_meals(self):
+        self.assertEqual(self._names("braise"), ["Poulet braisé"])
+        self.assertEqual(self._names("braise", active_only=False), ["Poisson braisé", "Poulet braisé"])
+
+    def test_sync_reindexes_changed_meals_only(self):
+        plats = CategoryRecord(1, "plats", "Plats")
+        kept = self.index.meals[3]
+        self.index.sync(Catalog(2, [plats], [kept, self._meal(2, "Alloco", plats, "")]))
+        self.assertIs(self.index.meals[3], kept)
+        self.assertEqual(self._names("sauce"), [])
+        self.assertEqual(self._names("alloco"), ["Alloco"])
+        self.assertEqual(self._names("poulet"), [])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class DailyMenuTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.garba, cls.alloco, cls.latest = [
+            Meal.objects.create(category=category, name=name, slug=name.lower(), price=Decimal("1500"))
+            for name in ("Garba", "Alloco", "Placali")
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+
+    def _plan(self, day, *meals, cutoff=time(11, 0)):
+        with self.captureOnCommitCallbacks(execute=True):
+            daily = DailyMenu.objects.create(day=day, cutoff_time=cutoff)
+            for position, (meal, capacity) in enumerate(meals):
+                daily.items.create(meal=meal, position=position, capacity=capacity)
+        return daily
+
+    def test_fallback_without_schedule(self):
+        today = menu.for_day(self.today)
+        self.assertFalse(today.planned)
+        self.assertEqual(today.meal.id, self.latest.id)
+        self.assertEqual(today.cutoff_time, menu.DEFAULT_CUTOFF_TIME)
+
+    def test_planned_menu_is_cached_until_edited(self):
+        daily = self._plan(self.today, (self.garba, 30), (self.alloco, None))
+        self.assertEqual([m.id for m in menu.for_day().meals], [self.garba.id, self.alloco.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(menu.for_day().cutoff_time, time(11, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            daily.items.filter(meal=self.alloco).get().delete()
+        self.assertEqual([m.id for m in menu.for_day().meals], [self.garba.id])
+
+    def test_capacity_goes_to_daily_stock(self):
+        self._plan(self.today, (self.garba, 30), (self.alloco, None))
+        self.assertEqual(DailyStock.objects.get(day=self.today, meal=self.garba).capacity, 30)
+        self.assertFalse(DailyStock.objects.filter(day=self.today, meal=self.alloco).exists())
+
+    def test_copy_previous_day(self):
+        tomorrow = self.today + timedelta(days=1)
+        self._plan(self.today, (self.alloco, 10))
+        with self.captureOnCommitCallbacks(execute=True):
+            menu.copy(self.today, tomorrow)
+        self.assertEqual([m.id for m in menu.for_day(tomorrow).meals], [self.alloco.id])
+        self.assertEqual(DailyStock.objects.get(day=tomorrow, meal=self.alloco).capacity, 10)
+
+    def test_copy_onto_a_day_with_reservations(self):
+        self._plan(self.today - timedelta(days=1), (self.garba, 12), (self.latest, None))
+        self._plan(self.today, (self.garba, 10), (self.alloco, 5))
+        stock.reserve(self.today, {self.garba.id: 8})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu.copy(self.today - timedelta(days=1), self.today)
+        self.assertEqual([m.id for m in menu.for_day().meals], [self.garba.id, self.latest.id])
+        row = DailyStock.objects.get(day=self.today, meal=self.garba)
+        self.assertEqual((row.capacity, row.reserved), (12, 8))
+        self.assertFalse(DailyStock.objects.filter(day=self.today, meal=self.alloco).exists())
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class DailyStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.garba, cls.alloco, cls.placali = [
+            Meal.objects.create(category=category, name=name, slug=name.lower(), price=Decimal("1500"))
+            for name in ("Garba", "Alloco", "Placali")
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        DailyStock.objects.create(day=self.today, meal=self.garba, capacity=5)
+        DailyStock.objects.create(day=self.today, meal=self.alloco, capacity=2)
+
+    def _reserved(self):
+        return dict(DailyStock.objects.values_list("meal_id", "reserved"))
+
+    def test_reserve_is_one_update(self):
+        # placali n'est pas limité : ignoré
+        with self.assertNumQueries(4):  # SELECT, SAVEPOINT, UPDATE, RELEASE
+            stock.reserve(self.today, {self.garba.id: 3, self.alloco.id: 2, self.placali.id: 9})
+        self.assertEqual(self._reserved(), {self.garba.id: 3, self.alloco.id: 2})
+
+    def test_sold_out_reserves_nothing(self):
+        with self.assertRaises(stock.SoldOut) as ctx:
+            stock.reserve(self.today, {self.garba.id: 2, self.alloco.id: 3})
+        self.assertEqual((ctx.exception.meal_id, ctx.exception.remaining), (self.alloco.id, 2))
+        self.assertEqual(self._reserved(), {self.garba.id: 0, self.alloco.id: 0})
+
+    def test_cancel_releases_portions(self):
+        stock.reserve(self.today, {self.garba.id: 4})
+        order = Order.objects.create(customer_name="c", phone="1", address="a")
+        OrderItem.objects.create(order=order, meal=self.garba, quantity=4, unit_price=Decimal("1500"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            states.transition(order, states.CANCELED)
+        self.assertEqual(self._reserved()[self.garba.id], 0)
+        self.assertEqual(stock.remaining(self.garba.id), 5)
+
+    def test_remaining_is_cached_until_reservation(self):
+        self.assertEqual(stock.remaining(self.garba.id), 5)
+        self.assertIsNone(stock.remaining(self.placali.id))
+        with self.assertNumQueries(0):
+            self.assertEqual(stock.remaining(self.garba.id), 5)
+            self.assertIsNone(stock.remaining(self.placali.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve(self.today, {self.garba.id: 2})
+        self.assertEqual(stock.remaining(self.garba.id), 3)
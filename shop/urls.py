@@ -5,6 +5,9 @@ app_name = 'shop'
 
 urlpatterns = [
     path('', views.meal_llist, name='meal_list'),
+    path('search/', views.meal_search, name='search'),
+    path('search/suggest/', views.meal_suggest, name='search_suggest'),
+    path('api/catalog/', views.catalog_api, name='catalog_api'),
     path('meal/<slug:slug>/', views.meal_detail, name='meal_detail'),
 ]
 
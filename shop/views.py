@@ -1,55 +1,109 @@
-from django.shortcuts import render, get_object_or_404
-from .models import Meal, Category
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from . import menu, pagecache, search, stock
+from .catalog import current_version, get_catalog
 
 
 def meal_list(request, category_slug=None):
+    catalog = get_catalog()
     category = None
-    categories = Category.objects.all()
-    meals = Meal.objects.filter(is_active=True)
+    categories = catalog.categories
+    meals = catalog.active_meals
 
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
-        meals = meals.filter(category=category)
+        category = catalog.category(category_slug)
+        if category is None:
+            raise Http404("Catégorie introuvable.")
+        meals = catalog.active_in_category(category.id)
 
-    return render(request, 'shop/meal_list.html', {
+    # page du menu en cache par catégorie (clé : version du catalogue)
+    return pagecache.render_page(request, 'shop/meal_list.html', category_slug or '-', lambda: {
         'category': category,
         'categories': categories,
         'meals': meals,
     })
 
 
-def meal_detail(request, slug):
-    meal = get_object_or_404(Meal, slug=slug, is_active=True)
-    return render(request, 'shop/meal_detail.html', {'meal': meal})
+def meal_search(request):
+    """Résultats de recherche (index en mémoire, shop.search)."""
+    query = request.GET.get('q', '').strip()[:100]
+    return render(request, 'shop/search.html', {
+        'meals': search.search(query) if query else (),
+        'query': query,
+    })
 
 
+SUGGEST_LIMIT = 8
+
+
+def meal_suggest(request):
+    """Suggestions pendant la frappe : GET ?q=pou -> {"results": [{name, url, price}]}."""
+    query = request.GET.get('q', '')[:100]
+    return JsonResponse({"results": [
+        {
+            "name": meal.name,
+            "url": reverse('shop:meal_detail', args=[meal.slug]),
+            "price": str(meal.price),
+        }
+        for meal in search.search(query, limit=SUGGEST_LIMIT)
+    ]})
+
+
+def _catalog_etag(request):
+    # version lue dans le cache : un 304 ne touche pas la base
+    return f"catalog-{current_version()}"
+
+
+@condition(etag_func=_catalog_etag)
+def catalog_api(request):
+    """
+    Catalogue JSON pour l'appli mobile (catégories, plats actifs, prix, images).
+    ETag fort = version du catalogue ; If-None-Match -> 304.
+    """
+    response = HttpResponse(get_catalog().to_json(), content_type='application/json')
+    patch_cache_control(response, public=True, no_cache=True)  # toujours revalider, à bas coût
+    return response
+
+
+def meal_detail(request, slug):
+    meal = get_catalog().get_by_slug(slug)
+    if meal is None or not meal.is_active:
+        raise Http404("Plat introuvable.")
+    return render(request, 'shop/meal_detail.html', {'meal': meal})
 
 
-from datetime import time
-from django.utils import timezone
-from django.shortcuts import render
-from .models import Meal, Category
 
-CUTOFF_TIME = time(14, 35)  # 08:30
 
 def meal_llist(request, category_slug=None):
     now = timezone.localtime()
-    sold_out = now.time() >= CUTOFF_TIME
+    catalog = get_catalog()
+
+    # 1) Menu du jour planifié (DailyMenu), en cache jusqu'à minuit
+    day_menu = menu.for_day(now.date())
+    meal_of_day = day_menu.meal
+    sold_out = day_menu.is_closed(now)
 
-    # 1) Plat du jour (simple)
-    meal_of_day = Meal.objects.filter(is_active=True).order_by("-id").first()
+    # portions restantes (None = pas de limite), lues dans le cache
+    remaining = stock.remaining(meal_of_day.id, now.date()) if meal_of_day else None
+    if remaining == 0:
+        sold_out = True
 
     # si tu veux garder les catégories pour plus tard (optionnel)
-    categories = Category.objects.all()
+    categories = catalog.categories
 
-    return render(request, "shop/meal_of_day.html", {
+    # page en cache : change avec le catalogue, le menu, ouvert / sold out et
+    # le restant ; seuls panier, connexion et csrf sont rendus par requête
+    state = f"{now.date()}:{day_menu.key}:{'closed' if sold_out else 'open'}:{remaining}"
+    return pagecache.render_page(request, "shop/meal_of_day.html", state, lambda: {
         "meal": meal_of_day,
+        "also": day_menu.meals[1:],
         "categories": categories,
         "sold_out": sold_out,
-        "cutoff_time": CUTOFF_TIME,
+        "remaining": remaining,
+        "cutoff_time": day_menu.cutoff_time,
         "now": now,
     })
-
-
-
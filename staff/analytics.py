@@ -0,0 +1,193 @@
+"""
+Analyses de ventes et prévision des portions du lendemain (NumPy).
+
+L'historique est lu en une seule requête (OrderItem joint à Order, commandes
+annulées exclues), en flux par blocs via .iterator(), et converti bloc par
+bloc en colonnes NumPy :
+    ts (secondes locales), order_id, meal_id, quantity, unit_price
+Tous les calculs sont ensuite vectoriels (bincount, produits matriciels) :
+pas de boucle Python par ligne en dehors de la lecture.
+
+Prévision : moyenne du même jour de semaine sur les dernières semaines
+(saisonnalité hebdo), mélangée à la moyenne des 7 derniers jours (niveau
+récent), pour chaque plat.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from orders import states
+from orders.models import OrderItem
+from shop.catalog import get_catalog
+
+
+CHUNK_ROWS = 50_000
+DEFAULT_DAYS = 56          # 8 semaines d'historique
+SEASONAL_WEIGHT = 0.6      # part du "même jour de semaine" dans la prévision
+CACHE_TTL = 60 * 10
+WEEKDAYS = ("Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim")
+
+
+@dataclass
+class Columns:
+    ts: np.ndarray        # float64, secondes depuis epoch en heure locale
+    order_id: np.ndarray  # int64
+    meal_id: np.ndarray   # int64
+    quantity: np.ndarray  # int64
+    price: np.ndarray     # float64
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def load(since: datetime, until: datetime | None = None) -> Columns:
+    """Historique [since, until) en colonnes, une requête lue en flux."""
+    qs = OrderItem.objects.filter(order__created_at__gte=since).exclude(order__status=states.CANCELED)
+    if until is not None:
+        qs = qs.filter(order__created_at__lt=until)
+    rows = qs.values_list("order__created_at", "order_id", "meal_id", "quantity", "unit_price").iterator(
+        chunk_size=CHUNK_ROWS
+    )
+
+    offset = timezone.localtime().utcoffset().total_seconds()
+    parts = []
+    while True:
+        chunk = list(islice(rows, CHUNK_ROWS))
+        if not chunk:
+            break
+        n = len(chunk)
+        created, order_ids, meal_ids, qty, prices = zip(*chunk)
+        parts.append((
+            np.fromiter((d.timestamp() for d in created), dtype=np.float64, count=n) + offset,
+            np.fromiter(order_ids, dtype=np.int64, count=n),
+            np.fromiter(meal_ids, dtype=np.int64, count=n),
+            np.fromiter(qty, dtype=np.int64, count=n),
+            np.fromiter(prices, dtype=np.float64, count=n),
+        ))
+
+    if not parts:
+        empty_f, empty_i = np.empty(0, np.float64), np.empty(0, np.int64)
+        return Columns(empty_f, empty_i, empty_i, empty_i, empty_f)
+    return Columns(*(np.concatenate(col) for col in zip(*parts)))
+
+
+def _day_index(ts):
+    return np.floor_divide(ts, 86400).astype(np.int64)
+
+
+def hour_histogram(cols: Columns) -> dict:
+    """Commandes et plats par heure de la journée (0-23)."""
+    hours = (np.mod(cols.ts, 86400) // 3600).astype(np.int64)
+    _, first = np.unique(cols.order_id, return_index=True)
+    return {
+        "orders": np.bincount(hours[first], minlength=24),
+        "quantity": np.bincount(hours, weights=cols.quantity, minlength=24).astype(np.int64),
+    }
+
+
+def weekday_histogram(cols: Columns) -> dict:
+    """Commandes et plats par jour de semaine (0 = lundi)."""
+    weekdays = np.mod(_day_index(cols.ts) + 3, 7)  # 1970-01-01 était un jeudi
+    _, first = np.unique(cols.order_id, return_index=True)
+    return {
+        "orders": np.bincount(weekdays[first], minlength=7),
+        "quantity": np.bincount(weekdays, weights=cols.quantity, minlength=7).astype(np.int64),
+    }
+
+
+def daily_matrix(cols: Columns, first_day: int, n_days: int):
+    """(ids des plats, matrice plats x jours des quantités)."""
+    meals, meal_idx = np.unique(cols.meal_id, return_inverse=True)
+    day_idx = _day_index(cols.ts) - first_day
+    keep = (day_idx >= 0) & (day_idx < n_days)
+    flat = meal_idx[keep] * n_days + day_idx[keep]
+    matrix = np.bincount(flat, weights=cols.quantity[keep], minlength=len(meals) * n_days)
+    return meals, matrix.reshape(len(meals), n_days)
+
+
+def trend(matrix: np.ndarray) -> np.ndarray:
+    """Pente (portions / jour) de la droite des moindres carrés, par plat."""
+    n_days = matrix.shape[1]
+    if n_days < 2:
+        return np.zeros(matrix.shape[0])
+    t = np.arange(n_days, dtype=np.float64)
+    t -= t.mean()
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    return centered @ t / (t @ t)
+
+
+def forecast(matrix: np.ndarray, first_day: int, target_day: int, weight=SEASONAL_WEIGHT) -> np.ndarray:
+    """Portions prévues pour ``target_day`` (index de jour epoch), par plat."""
+    n_days = matrix.shape[1]
+    if n_days == 0:
+        return np.zeros(matrix.shape[0], dtype=np.int64)
+    days = np.arange(first_day, first_day + n_days)
+    same_weekday = np.mod(days - target_day, 7) == 0
+    recent = matrix[:, -7:].mean(axis=1)
+    seasonal = matrix[:, same_weekday].mean(axis=1) if same_weekday.any() else recent
+    return np.ceil(weight * seasonal + (1 - weight) * recent).astype(np.int64)
+
+
+@dataclass
+class Report:
+    days: int
+    rows: int
+    hours: dict
+    weekdays: dict
+    meals: list  # dicts triés par prévision décroissante
+    target: object  # date prévue
+
+
+def build(days: int = DEFAULT_DAYS, today=None) -> Report:
+    today = today or timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today - timedelta(days=days), datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+    cols = load(start, end)  # jours complets seulement
+
+    offset = timezone.localtime().utcoffset().total_seconds()
+    first_day = int((start.timestamp() + offset) // 86400)
+    meals, matrix = daily_matrix(cols, first_day, days)
+
+    revenue = np.bincount(
+        np.searchsorted(meals, cols.meal_id), weights=cols.quantity * cols.price, minlength=len(meals)
+    )
+    totals = matrix.sum(axis=1)
+    slopes = trend(matrix)
+    planned = forecast(matrix, first_day, first_day + days + 1)  # demain
+
+    catalog = get_catalog()
+    rows = []
+    for i in np.argsort(-planned, kind="stable"):
+        meal = catalog.get(int(meals[i]))
+        rows.append({
+            "meal_id": int(meals[i]),
+            "name": meal.name if meal else f"#{meals[i]}",
+            "quantity": int(totals[i]),
+            "revenue": round(float(revenue[i]), 2),
+            "per_day": round(float(totals[i]) / days, 1),
+            "trend": round(float(slopes[i]), 2),
+            "forecast": int(planned[i]),
+        })
+
+    return Report(
+        days=days,
+        rows=len(cols),
+        hours={k: v.tolist() for k, v in hour_histogram(cols).items()},
+        weekdays={k: v.tolist() for k, v in weekday_histogram(cols).items()},
+        meals=rows,
+        target=today + timedelta(days=1),
+    )
+
+
+def cached_report(days: int = DEFAULT_DAYS) -> Report:
+    """L'historique ne bouge pas dans la journée (jours complets) : cache court."""
+    key = f"staff:analytics:{timezone.localdate()}:{days}"
+    report = cache.get(key)
+    if report is None:
+        report = build(days)
+        cache.set(key, report, CACHE_TTL)
+    return report
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class StaffConfig(AppConfig):
     name = 'staff'
+
+    def ready(self):
+        from . import prep, rollups  # noqa : handlers outbox (liste cuisine, agrégats)
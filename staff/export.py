@@ -0,0 +1,137 @@
+"""
+Export comptable des commandes (CSV ou JSONL), en flux.
+
+Les commandes sont lues par blocs côté serveur (``iterator(chunk_size)``) ;
+pour chaque bloc, lignes, promos et bons sont chargés en trois requêtes
+(prefetch). Les writers sont des générateurs : une ligne produite, une
+ligne envoyée. La mémoire dépend de la taille d'un bloc, pas de la période.
+
+    CSV   : une ligne par plat commandé (commande sans plat : une ligne, plat vide)
+    JSONL : une commande par ligne, plats / promos / bons imbriqués
+
+CSV ouvert dans un tableur : les textes saisis par les clients qui
+commencent par = + - @ (formules) sont préfixés d'une apostrophe.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from marketing.models import FreeItemVoucher, PromotionRedemption
+from orders.models import OrderItem
+
+from .orderlist import filtered
+
+
+CHUNK_SIZE = 500
+FORMATS = ("csv", "jsonl")
+
+FORMULA_CHARS = ("=", "+", "-", "@", "\t", "\r")
+
+CSV_COLUMNS = (
+    "order_id", "created_at", "status", "customer_name", "phone", "user_id",
+    "subtotal", "discount_total", "total",
+    "promo_code", "promo_discount", "voucher_ids", "voucher_value",
+    "meal_id", "meal_name", "quantity", "unit_price", "line_total",
+)
+
+
+def orders(statuses=(), date_from=None, date_to=None):
+    """Commandes de la période, plus anciennes d'abord, relations préchargées par bloc."""
+    return (
+        filtered(statuses, date_from, date_to)
+        .order_by("created_at", "id")
+        .prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("meal").only(
+                "order_id", "meal_id", "meal__name", "quantity", "unit_price",
+            ).order_by("id")),
+            Prefetch("promo_redemptions", queryset=PromotionRedemption.objects.select_related("promotion").only(
+                "order_id", "discount_amount", "status", "promotion__code",
+            )),
+            Prefetch("used_vouchers", queryset=FreeItemVoucher.objects.only(
+                "used_order_id", "max_item_value",
+            )),
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def as_record(order) -> dict:
+    redemptions = [r for r in order.promo_redemptions.all() if r.status == PromotionRedemption.Status.APPLIED]
+    vouchers = list(order.used_vouchers.all())
+    return {
+        "id": order.id,
+        "created_at": order.created_at.isoformat(),
+        "status": order.status,
+        "customer_name": order.customer_name,
+        "phone": order.phone,
+        "user_id": order.user_id,
+        "subtotal": str(order.subtotal),
+        "discount_total": str(order.discount_total),
+        "total": str(order.total),
+        "promo_code": order.promo_code or "",
+        "promo_discount": str(sum((r.discount_amount for r in redemptions), 0)),
+        "promotions": [
+            {"code": r.promotion.code, "discount": str(r.discount_amount)} for r in redemptions
+        ],
+        "vouchers": [{"id": v.id, "max_item_value": str(v.max_item_value)} for v in vouchers],
+        "voucher_value": str(sum((v.max_item_value for v in vouchers), 0)) if vouchers else "",
+        "items": [
+            {
+                "meal_id": item.meal_id,
+                "meal_name": item.meal.name,
+                "quantity": item.quantity,
+                "unit_price": str(item.unit_price),
+                "line_total": str(item.subtotal()),
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+def records(**filters):
+    for order in orders(**filters):
+        yield as_record(order)
+
+
+# ---------- writers ----------
+
+class _Echo:
+    """Pseudo-fichier : csv.writer écrit une ligne, on la récupère telle quelle."""
+
+    def write(self, value):
+        return value
+
+
+def _text(value: str) -> str:
+    """Texte libre : jamais interprété comme une formule par le tableur."""
+    return f"'{value}" if value.startswith(FORMULA_CHARS) else value
+
+
+def csv_lines(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for r in records:
+        head = [
+            r["id"], r["created_at"], r["status"], _text(r["customer_name"]), _text(r["phone"]), r["user_id"] or "",
+            r["subtotal"], r["discount_total"], r["total"],
+            _text(r["promo_code"]), r["promo_discount"],
+            " ".join(str(v["id"]) for v in r["vouchers"]), r["voucher_value"],
+        ]
+        if not r["items"]:
+            yield writer.writerow(head + [""] * 5)
+        for item in r["items"]:
+            yield writer.writerow(head + [
+                item["meal_id"], _text(item["meal_name"]), item["quantity"], item["unit_price"], item["line_total"],
+            ])
+
+
+def jsonl_lines(records):
+    for r in records:
+        yield json.dumps(r, ensure_ascii=False) + "\n"
+
+
+def stream(fmt, **filters):
+    """Générateur de lignes (str) au format demandé."""
+    lines = csv_lines if fmt == "csv" else jsonl_lines
+    return lines(records(**filters))
@@ -0,0 +1,170 @@
+"""
+Tableau des commandes en direct (Server-Sent Events, à servir en ASGI).
+
+    source (broker) ──> Hub du process ──> une file par écran connecté
+
+Un seul flux de changements par process, quel que soit le nombre d'écrans :
+le Hub lit le broker, enrichit chaque lot d'événements en une requête, puis
+le distribue aux abonnés. Le flux s'arrête quand le dernier écran se
+déconnecte.
+
+Brokers (réglage LIVE_BROKER) :
+- InProcessBroker : événements de l'outbox reçus après commit dans ce
+  process ; suffit avec un seul worker ASGI.
+- OutboxTailBroker : lit les nouvelles lignes de l'outbox (id > dernier vu)
+  toutes les LIVE_POLL_INTERVAL secondes ; fonctionne avec plusieurs
+  workers, une requête par intervalle et par process.
+"""
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from orders import outbox
+from orders.models import Order, OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+TOPIC_PREFIX = "order."
+SUBSCRIBER_QUEUE_SIZE = 200
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def _raw(event):
+    return {"event_id": event.id, "topic": event.topic, "order_id": event.payload.get("order_id")}
+
+
+# ---------- brokers ----------
+
+class InProcessBroker:
+    """Écoute outbox.add_listener ; les événements arrivent depuis n'importe quel thread."""
+
+    def __init__(self):
+        self._queue = None
+        self._loop = None
+
+    def _on_events(self, events):
+        batch = [_raw(e) for e in events if e.topic.startswith(TOPIC_PREFIX)]
+        if batch and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, batch)
+
+    async def batches(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        outbox.add_listener(self._on_events)
+        try:
+            while True:
+                yield await self._queue.get()
+        finally:
+            outbox.remove_listener(self._on_events)
+            self._loop = None
+
+
+class OutboxTailBroker:
+    """Suit la table de l'outbox : un curseur par process, pas par client."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, "LIVE_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)
+
+    @staticmethod
+    def _last_id():
+        return OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+    @staticmethod
+    def _after(last_id, limit=500):
+        return [
+            {"event_id": pk, "topic": topic, "order_id": payload.get("order_id")}
+            for pk, topic, payload in (
+                OutboxEvent.objects.filter(id__gt=last_id, topic__startswith=TOPIC_PREFIX)
+                .order_by("id").values_list("id", "topic", "payload")[:limit]
+            )
+        ]
+
+    async def batches(self):
+        last_id = await sync_to_async(self._last_id)()
+        while True:
+            await asyncio.sleep(self.interval)
+            batch = await sync_to_async(self._after)(last_id)
+            if batch:
+                last_id = batch[-1]["event_id"]
+                yield batch
+
+
+def get_broker():
+    return import_string(getattr(settings, "LIVE_BROKER", "staff.live.InProcessBroker"))()
+
+
+# ---------- hub ----------
+
+def _enrich(batch):
+    """Un lot d'événements bruts -> messages du tableau (une requête)."""
+    ids = {e["order_id"] for e in batch if e["order_id"]}
+    orders = Order.objects.in_bulk(ids)
+    messages = []
+    for e in batch:
+        order = orders.get(e["order_id"])
+        if order is None:
+            continue
+        messages.append({
+            "id": e["event_id"],
+            "type": "created" if e["topic"] == "order.placed" else "status",
+            "order": {
+                "id": order.id,
+                "status": order.status,
+                "status_display": order.get_status_display(),
+                "customer_name": order.customer_name,
+                "phone": order.phone,
+                "address": order.address,
+                "total": str(order.total),
+                "created_at": order.created_at.isoformat(),
+            },
+        })
+    return messages
+
+
+class Hub:
+    def __init__(self, broker_factory=get_broker):
+        self._broker_factory = broker_factory
+        self._subscribers = set()
+        self._task = None
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(queue)
+            if self._task is None or self._task.done():
+                self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue) -> None:
+        with self._lock:
+            self._subscribers.discard(queue)
+            if not self._subscribers and self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+    def _fan_out(self, messages):
+        for queue in list(self._subscribers):
+            for message in messages:
+                if queue.full():
+                    queue.get_nowait()  # écran trop lent : on perd le plus ancien
+                queue.put_nowait(message)
+
+    async def _run(self):
+        try:
+            async for batch in self._broker_factory().batches():
+                messages = await sync_to_async(_enrich)(batch)
+                if messages:
+                    self._fan_out(messages)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("live: flux interrompu")
+
+
+hub = Hub()
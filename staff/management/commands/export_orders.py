@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from staff import export
+
+
+class Command(BaseCommand):
+    help = "Exporte les commandes (plats, promos, bons) en CSV ou JSONL, en flux."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="Premier jour (AAAA-MM-JJ)")
+        parser.add_argument("--to", dest="date_to", help="Dernier jour inclus (AAAA-MM-JJ)")
+        parser.add_argument("--status", action="append", default=[], help="Filtre statut (répétable)")
+        parser.add_argument("--format", choices=export.FORMATS, default="csv")
+        parser.add_argument("--output", "-o", default="-", help="Fichier de sortie ; '-' = sortie standard")
+
+    def handle(self, *args, **opts):
+        dates = {}
+        for name in ("date_from", "date_to"):
+            if opts[name]:
+                dates[name] = parse_date(opts[name])
+                if dates[name] is None:
+                    raise CommandError(f"{name} : date AAAA-MM-JJ attendue.")
+
+        lines = export.stream(opts["format"], statuses=opts["status"], **dates)
+        if opts["output"] == "-":
+            sys.stdout.writelines(lines)
+            return
+        with open(opts["output"], "w", encoding="utf-8", newline="") as fh:
+            fh.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(f"Export écrit dans {opts['output']}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from staff import prep
+
+
+class Command(BaseCommand):
+    help = "Recalcule la liste de préparation cuisine depuis les commandes ouvertes."
+
+    def handle(self, *args, **opts):
+        n = prep.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{n} plat(s) à préparer"))
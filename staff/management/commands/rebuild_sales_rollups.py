@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.models import Order
+from staff import rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats de ventes (jour, heure, plat) depuis les commandes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Premier jour (AAAA-MM-JJ) ; défaut : première commande")
+        parser.add_argument("--until", help="Dernier jour inclus ; défaut : aujourd'hui")
+        parser.add_argument("--days", type=int, help="Seulement les N derniers jours")
+
+    def handle(self, *args, **opts):
+        until = parse_date(opts["until"]) if opts["until"] else timezone.localdate()
+        if opts["days"]:
+            since = until - timedelta(days=opts["days"] - 1)
+        elif opts["since"]:
+            since = parse_date(opts["since"])
+        else:
+            bounds = Order.objects.aggregate(first=Min("created_at"), last=Max("created_at"))
+            if bounds["first"] is None:
+                self.stdout.write("Aucune commande.")
+                return
+            since = timezone.localdate(bounds["first"])
+        if since is None or until is None or since > until:
+            raise CommandError("Période invalide.")
+
+        day, n = since, 0
+        while day <= until:
+            rollups.rebuild_day(day)
+            day += timedelta(days=1)
+            n += 1
+        self.stdout.write(self.style.SUCCESS(f"{n} jour(s) recalculé(s) ({since} → {until})"))
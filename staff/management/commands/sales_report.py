@@ -0,0 +1,36 @@
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand
+
+from staff import analytics
+
+
+class Command(BaseCommand):
+    help = "Histogrammes de ventes, tendances par plat et portions prévues pour demain."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=analytics.DEFAULT_DAYS, help="Jours d'historique")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON")
+
+    def handle(self, *args, **opts):
+        report = analytics.build(opts["days"])
+        if opts["json"]:
+            self.stdout.write(json.dumps(asdict(report), default=str, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"{report.rows} lignes sur {report.days} jours — prévision pour le {report.target}\n")
+        self.stdout.write(f"{'Plat':30} {'Qté':>7} {'CA':>12} {'/jour':>7} {'tend.':>7} {'demain':>7}")
+        for m in report.meals:
+            self.stdout.write(
+                f"{m['name'][:30]:30} {m['quantity']:>7} {m['revenue']:>12.0f} "
+                f"{m['per_day']:>7} {m['trend']:>+7} {m['forecast']:>7}"
+            )
+
+        self.stdout.write("\nCommandes par heure :")
+        for hour, n in enumerate(report.hours["orders"]):
+            if n:
+                self.stdout.write(f"  {hour:02d}h {n:>6}")
+        self.stdout.write("\nCommandes par jour :")
+        for name, n in zip(analytics.WEEKDAYS, report.weekdays["orders"]):
+            self.stdout.write(f"  {name} {n:>6}")
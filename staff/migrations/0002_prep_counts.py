@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 10:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_dailystock'),
+        ('staff', '0001_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrepCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('meal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prep_count', to='shop.meal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-quantity'], name='prep_count_open_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 11:01
+
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    # commandes ouvertes au déploiement : sans leurs portions, leur livraison
+    # ou annulation ferait passer PrepCount en négatif
+    from staff import prep
+    prep.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_created_id_index'),
+        ('staff', '0002_prep_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
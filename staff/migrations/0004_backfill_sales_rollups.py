@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 11:08
+
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    # agrégats des jours déjà passés, sinon le tableau de bord part de zéro
+    # (et devient négatif quand une commande plus ancienne change d'état)
+    from orders.models import Order
+    from staff import rollups
+    for day in Order.objects.dates("created_at", "day"):
+        rollups.rebuild_day(day)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_created_id_index'),
+        ('staff', '0003_backfill_prep_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,59 @@
+from decimal import Decimal
+
 from django.db import models
 
-# Create your models here.
+from shop.models import Meal
+
+
+# Agrégats du tableau de bord, tenus à jour par les handlers outbox
+# (staff.rollups) ; reconstruits au besoin par rebuild_sales_rollups.
+
+class DailySales(models.Model):
+    day = models.DateField(unique=True)
+    orders_count = models.PositiveIntegerField(default=0)    # commandes passées
+    canceled_count = models.PositiveIntegerField(default=0)
+    pending_count = models.IntegerField(default=0)           # encore en attente
+    items_count = models.IntegerField(default=0)             # plats (hors annulées)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))  # hors annulées
+
+    def __str__(self):
+        return f"{self.day} : {self.orders_count} commandes"
+
+
+class HourlySales(models.Model):
+    day = models.DateField()
+    hour = models.PositiveSmallIntegerField()  # heure locale 0-23
+    orders_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["day", "hour"], name="uniq_hourly_sales")]
+
+
+class MealSales(models.Model):
+    day = models.DateField()
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name="daily_sales")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["day", "meal"], name="uniq_meal_sales")]
+        indexes = [models.Index(fields=["day", "-quantity"], name="meal_sales_top_idx")]
+
+
+class PrepCount(models.Model):
+    """Portions restant à préparer par plat, toutes commandes ouvertes confondues (staff.prep)."""
+
+    meal = models.OneToOneField(Meal, on_delete=models.CASCADE, related_name="prep_count")
+    quantity = models.IntegerField(default=0)   # commandes en attente + confirmées
+    confirmed = models.IntegerField(default=0)  # dont confirmées (en cuisine)
+
+    class Meta:
+        indexes = [models.Index(fields=["-quantity"], name="prep_count_open_idx")]
+
+    @property
+    def pending(self):
+        return self.quantity - self.confirmed
+
+    def __str__(self):
+        return f"{self.meal_id} : {self.quantity}"
@@ -0,0 +1,126 @@
+"""
+Liste des commandes pour le staff, paginée par curseur (keyset).
+
+Tri : (created_at, id) décroissants. La page suivante part de la dernière
+ligne vue :
+    WHERE created_at < c OR (created_at = c AND id < i)
+ORDER BY created_at DESC, id DESC LIMIT n+1
+Coût constant quelle que soit la profondeur (pas d'OFFSET), une seule
+requête par page (utilisateur joint, colonnes limitées), index
+orders_created_id_idx.
+"""
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+from orders.models import Order
+
+from .rollups import day_bounds
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+FIELDS = (
+    "id", "created_at", "customer_name", "phone", "address", "total", "status",
+    "user__id", "user__username",
+)
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def encode_cursor(order) -> str:
+    raw = f"{order.created_at.isoformat()}|{order.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidQuery("Curseur invalide.")
+    if not isinstance(created_at, datetime):
+        raise InvalidQuery("Curseur invalide.")
+    return created_at, pk
+
+
+@dataclass(frozen=True)
+class OrderPage:
+    orders: list
+    next_cursor: str | None
+
+
+def parse_params(params) -> dict:
+    """QueryDict -> arguments de ``page`` ; lève InvalidQuery."""
+    statuses = [s for s in params.getlist("status") if s]
+    valid = dict(Order.STATUS_CHOICES)
+    if any(s not in valid for s in statuses):
+        raise InvalidQuery("Statut inconnu.")
+
+    dates = {}
+    for name in ("date_from", "date_to"):
+        value = params.get(name)
+        if value:
+            dates[name] = parse_date(value)
+            if dates[name] is None:
+                raise InvalidQuery(f"{name} : date AAAA-MM-JJ attendue.")
+
+    try:
+        size = int(params.get("size") or PAGE_SIZE)
+    except ValueError:
+        raise InvalidQuery("Taille de page invalide.")
+
+    return {
+        "statuses": statuses,
+        "cursor": params.get("cursor") or None,
+        "size": max(1, min(size, MAX_PAGE_SIZE)),
+        **dates,
+    }
+
+
+def filtered(statuses=(), date_from=None, date_to=None):
+    qs = Order.objects.all()
+    if statuses:
+        qs = qs.filter(status__in=statuses)
+    # bornes en plage sur created_at (index), jamais de __date
+    if date_from:
+        qs = qs.filter(created_at__gte=day_bounds(date_from)[0])
+    if date_to:
+        qs = qs.filter(created_at__lt=day_bounds(date_to)[1])
+    return qs
+
+
+def page(statuses=(), date_from=None, date_to=None, cursor=None, size=PAGE_SIZE) -> OrderPage:
+    qs = filtered(statuses, date_from, date_to)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    rows = list(
+        qs.select_related("user").only(*FIELDS).order_by("-created_at", "-id")[: size + 1]
+    )
+    more = len(rows) > size
+    rows = rows[:size]
+    return OrderPage(rows, encode_cursor(rows[-1]) if more else None)
+
+
+def as_json(order) -> dict:
+    return {
+        "id": order.id,
+        "created_at": order.created_at.isoformat(),
+        "customer_name": order.customer_name,
+        "phone": order.phone,
+        "address": order.address,
+        "total": str(order.total),
+        "status": order.status,
+        "status_display": order.get_status_display(),
+        "user": {"id": order.user.id, "username": order.user.username} if order.user_id else None,
+    }
@@ -0,0 +1,107 @@
+"""
+Liste de préparation cuisine : portions restant à préparer par plat.
+
+Une ligne PrepCount par plat, tenue à jour par deltas depuis l'outbox :
+    order.placed                  +qté
+    order.confirmed (d'attente)   confirmed +qté
+    order.delivered / canceled    -qté (et -confirmed si elle l'était)
+
+Lecture : une requête sur prep_count_open_idx (quantity > 0), plat joint.
+Les deltas commutent : l'ordre de traitement des sujets dans un lot
+n'influe pas sur le résultat. En cas de doute, rebuild() recalcule tout
+depuis les commandes ouvertes.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+
+from orders import outbox, states
+from orders.models import OrderItem
+
+from .models import PrepCount
+from .rollups import _upsert, _zero
+
+
+OPEN = (states.PENDING, states.CONFIRMED)
+
+
+def _portions(events, sources=OPEN):
+    """{meal_id: qté} des commandes des événements dont l'état précédent est dans ``sources``."""
+    ids = [e.payload["order_id"] for e in events if e.payload.get("from", states.PENDING) in sources]
+    totals = defaultdict(int)
+    for meal_id, qty in OrderItem.objects.filter(order_id__in=ids).values_list("meal_id", "quantity"):
+        totals[meal_id] += qty
+    return totals
+
+
+def _apply(deltas):
+    _upsert(PrepCount, ("meal_id",), {(meal_id,): v for meal_id, v in deltas.items()})
+
+
+@outbox.register("order.placed")
+def on_placed(events):
+    deltas = defaultdict(_zero)
+    for meal_id, qty in _portions(events).items():
+        deltas[meal_id]["quantity"] += qty
+    _apply(deltas)
+
+
+@outbox.register("order.confirmed")
+def on_confirmed(events):
+    deltas = defaultdict(_zero)
+    for meal_id, qty in _portions(events, (states.PENDING,)).items():
+        deltas[meal_id]["confirmed"] += qty
+    _apply(deltas)
+
+
+@outbox.register("order.delivered")
+@outbox.register("order.canceled")
+def on_closed(events):
+    deltas = defaultdict(_zero)
+    for source in OPEN:
+        for meal_id, qty in _portions(events, (source,)).items():
+            deltas[meal_id]["quantity"] -= qty
+            if source == states.CONFIRMED:
+                deltas[meal_id]["confirmed"] -= qty
+    _apply(deltas)
+
+
+# ---------- lecture ----------
+
+def prep_list():
+    return list(
+        PrepCount.objects.filter(quantity__gt=0)
+        .select_related("meal")
+        .only("quantity", "confirmed", "meal__name")
+        .order_by("-quantity")
+    )
+
+
+def as_json(row) -> dict:
+    return {
+        "meal_id": row.meal_id,
+        "name": row.meal.name,
+        "quantity": row.quantity,
+        "confirmed": row.confirmed,
+        "pending": row.pending,
+    }
+
+
+# ---------- reconstruction ----------
+
+@transaction.atomic
+def rebuild() -> int:
+    """Recalcule la liste depuis les commandes ouvertes ; retourne le nombre de plats."""
+    items = OrderItem.objects.filter(order__status__in=OPEN)
+    open_qty = dict(items.values("meal_id").annotate(n=Sum("quantity")).values_list("meal_id", "n"))
+    confirmed = dict(
+        items.filter(order__status=states.CONFIRMED)
+        .values("meal_id").annotate(n=Sum("quantity")).values_list("meal_id", "n")
+    )
+    PrepCount.objects.all().delete()
+    PrepCount.objects.bulk_create([
+        PrepCount(meal_id=meal_id, quantity=qty, confirmed=confirmed.get(meal_id, 0))
+        for meal_id, qty in open_qty.items()
+    ])
+    return len(open_qty)
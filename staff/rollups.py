@@ -0,0 +1,196 @@
+"""
+Agrégats de ventes du tableau de bord (jour, heure, plat du jour).
+
+Mis à jour par deltas depuis l'outbox des commandes :
+    order.placed     +1 commande, +CA, +plats, +1 en attente
+    order.canceled   -CA, -plats, +1 annulée (et -1 en attente si elle l'était)
+    order.confirmed / order.delivered   -1 en attente si elle l'était
+
+Un lot d'événements = un UPDATE ... SET x = x + delta par ligne touchée
+(en pratique : une ligne jour, une ou deux heures, quelques plats). Les deltas
+sont écrits dans la même transaction que le marquage "traité" de l'outbox :
+un événement n'est jamais compté deux fois.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from orders import outbox, states
+from orders.models import Order, OrderItem
+
+from .models import DailySales, HourlySales, MealSales
+
+
+def _zero():
+    return defaultdict(int)
+
+
+class Deltas:
+    """Deltas accumulés pour un lot, appliqués en une passe."""
+
+    def __init__(self):
+        self.daily = defaultdict(_zero)
+        self.hourly = defaultdict(_zero)
+        self.meals = defaultdict(_zero)
+
+    def apply(self):
+        _upsert(DailySales, ("day",), self.daily)
+        _upsert(HourlySales, ("day", "hour"), self.hourly)
+        _upsert(MealSales, ("day", "meal_id"), self.meals)
+
+
+def _upsert(model, key_fields, deltas):
+    deltas = {k: v for k, v in deltas.items() if any(v.values())}
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas],
+        ignore_conflicts=True,
+    )
+    for key, changes in deltas.items():
+        model.objects.filter(**dict(zip(key_fields, key))).update(
+            **{field: F(field) + value for field, value in changes.items() if value}
+        )
+
+
+def _local(dt):
+    local = timezone.localtime(dt)
+    return local.date(), local.hour
+
+
+def _orders(events):
+    ids = {e.payload["order_id"] for e in events}
+    return {o["id"]: o for o in Order.objects.filter(id__in=ids).values("id", "created_at", "total")}
+
+
+def _lines(order_ids):
+    return (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list("order__created_at", "meal_id", "quantity", "unit_price")
+    )
+
+
+def _add_lines(deltas, order_ids, sign):
+    for created_at, meal_id, qty, price in _lines(order_ids):
+        day, _ = _local(created_at)
+        deltas.daily[(day,)]["items_count"] += sign * qty
+        meal = deltas.meals[(day, meal_id)]
+        meal["quantity"] += sign * qty
+        meal["revenue"] += sign * qty * price
+
+
+@outbox.register("order.placed")
+def on_placed(events):
+    deltas = Deltas()
+    orders = _orders(events)
+    for order in orders.values():
+        day, hour = _local(order["created_at"])
+        daily = deltas.daily[(day,)]
+        daily["orders_count"] += 1
+        daily["pending_count"] += 1
+        daily["revenue"] += order["total"]
+        hourly = deltas.hourly[(day, hour)]
+        hourly["orders_count"] += 1
+        hourly["revenue"] += order["total"]
+    _add_lines(deltas, list(orders), +1)
+    deltas.apply()
+
+
+@outbox.register("order.canceled")
+def on_canceled(events):
+    deltas = Deltas()
+    orders = _orders(events)
+    for event in events:
+        order = orders.get(event.payload["order_id"])
+        if order is None:
+            continue
+        day, hour = _local(order["created_at"])
+        daily = deltas.daily[(day,)]
+        daily["canceled_count"] += 1
+        daily["revenue"] -= order["total"]
+        deltas.hourly[(day, hour)]["revenue"] -= order["total"]
+        if event.payload.get("from") == states.PENDING:
+            daily["pending_count"] -= 1
+    _add_lines(deltas, list(orders), -1)
+    deltas.apply()
+
+
+@outbox.register("order.confirmed")
+@outbox.register("order.delivered")
+def on_left_pending(events):
+    deltas = Deltas()
+    orders = _orders([e for e in events if e.payload.get("from") == states.PENDING])
+    for order in orders.values():
+        day, _ = _local(order["created_at"])
+        deltas.daily[(day,)]["pending_count"] -= 1
+    deltas.apply()
+
+
+# ---------- lecture ----------
+
+def today_summary(day=None):
+    day = day or timezone.localdate()
+    row = DailySales.objects.filter(day=day).first() or DailySales(day=day)
+    pending = DailySales.objects.filter(pending_count__gt=0).aggregate(n=Sum("pending_count"))["n"] or 0
+    return row, pending
+
+
+def top_meals(day=None, limit=5):
+    day = day or timezone.localdate()
+    return list(
+        MealSales.objects.filter(day=day, quantity__gt=0)
+        .order_by("-quantity")
+        .values("meal__name", "quantity", "revenue")[:limit]
+    )
+
+
+# ---------- reconstruction ----------
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+@transaction.atomic
+def rebuild_day(day) -> DailySales:
+    """Recalcule entièrement les agrégats d'un jour depuis Order / OrderItem."""
+    start, end = day_bounds(day)
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    kept = orders.exclude(status=states.CANCELED)
+
+    DailySales.objects.filter(day=day).delete()
+    HourlySales.objects.filter(day=day).delete()
+    MealSales.objects.filter(day=day).delete()
+
+    counts = orders.aggregate(
+        n=Count("id"),
+        canceled=Count("id", filter=Q(status=states.CANCELED)),
+        pending=Count("id", filter=Q(status=states.PENDING)),
+    )
+    row = DailySales.objects.create(
+        day=day,
+        orders_count=counts["n"],
+        canceled_count=counts["canceled"],
+        pending_count=counts["pending"],
+        items_count=OrderItem.objects.filter(order__in=kept).aggregate(n=Sum("quantity"))["n"] or 0,
+        revenue=kept.aggregate(s=Sum("total"))["s"] or Decimal("0.00"),
+    )
+
+    hourly = defaultdict(_zero)
+    for created_at, status, total in orders.values_list("created_at", "status", "total"):
+        _, hour = _local(created_at)
+        hourly[hour]["orders_count"] += 1
+        if status != states.CANCELED:
+            hourly[hour]["revenue"] += total
+    HourlySales.objects.bulk_create([HourlySales(day=day, hour=h, **v) for h, v in hourly.items()])
+
+    meals = defaultdict(_zero)
+    for meal_id, qty, price in OrderItem.objects.filter(order__in=kept).values_list("meal_id", "quantity", "unit_price"):
+        meals[meal_id]["quantity"] += qty
+        meals[meal_id]["revenue"] += qty * price
+    MealSales.objects.bulk_create([MealSales(day=day, meal_id=m, **v) for m, v in meals.items()])
+    return row
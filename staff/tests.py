@@ -1,3 +1,248 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders import outbox, states
+from orders.models import Order, OrderItem
+from shop.models import Category, Meal
+
+from . import orderlist, prep, rollups
+from .views import BULK_MAX_ORDERS
+from .models import DailySales, HourlySales, MealSales, PrepCount
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class OrderListApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user("chef", password="x", is_staff=True)
+        cls.clients = [User.objects.create_user(f"client{i}", password="x") for i in range(5)]
+
+    def _orders(self, n, status="pending"):
+        orders = Order.objects.bulk_create([
+            Order(
+                user=self.clients[i % len(self.clients)] if i % 4 else None,
+                customer_name=f"Client {i}", phone="0700000000", address="Cocody",
+                total=Decimal("1000"), status=status,
+            )
+            for i in range(n)
+        ])
+        # même created_at pour une partie des lignes : le curseur doit départager par id
+        same = timezone.now() - timedelta(hours=1)
+        Order.objects.filter(pk__in=[o.pk for o in orders[: n // 2]]).update(created_at=same)
+        return orders
+
+    def _api_queries(self, **params):
+        self.client.force_login(self.staff)
+        url = reverse("staff:order_list_api")
+        self.client.get(url)  # session / utilisateur déjà chargés une fois
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"size": 20, **params})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()
+
+    def test_page_is_one_query(self):
+        self._orders(30)
+        with self.assertNumQueries(1):
+            result = orderlist.page(size=10)
+            [o.user.username for o in result.orders if o.user_id]
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self._orders(5)
+        small, _ = self._api_queries()
+        self._orders(60)
+        large, body = self._api_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(len(body["results"]), 20)
+
+    def test_cursor_walks_every_order_once(self):
+        orders = self._orders(45)
+        seen, cursor = [], None
+        while True:
+            result = orderlist.page(cursor=cursor, size=10)
+            seen.extend(o.pk for o in result.orders)
+            cursor = result.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(o.pk for o in orders))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_filters(self):
+        self._orders(6)
+        self._orders(4, status="delivered")
+        _, body = self._api_queries(status="delivered")
+        self.assertEqual({o["status"] for o in body["results"]}, {"delivered"})
+        self.assertEqual(len(body["results"]), 4)
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        _, body = self._api_queries(date_from=tomorrow)
+        self.assertEqual(body["results"], [])
+
+    def test_bad_params(self):
+        self.client.force_login(self.staff)
+        url = reverse("staff:order_list_api")
+        self.assertEqual(self.client.get(url, {"status": "PAID"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"cursor": "!!"}).status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class LiveBoardTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user("chef", password="x", is_staff=True))
+
+    def test_stream_refused_under_wsgi(self):
+        # le client de test passe par WSGI : pas de flux ouvert, pas de worker bloqué
+        response = self.client.get(reverse("staff:order_stream"))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+
+    def test_board_falls_back_to_reload(self):
+        response = self.client.get(reverse("staff:live_board"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "EventSource")
+
+
+class OrderEventsMixin:
+    """Commandes écrites à la main + événements outbox, traités par outbox.process()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Plats", slug="plats")
+        cls.garba, cls.alloco = [
+            Meal.objects.create(category=category, name=name, slug=name.lower(), price=Decimal("1500"))
+            for name in ("Garba", "Alloco")
+        ]
+
+    def _order(self, placed=True, **quantities):
+        order = Order.objects.create(
+            customer_name="c", phone="1", address="a", total=Decimal("1500") * sum(quantities.values()),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, meal=getattr(self, name), quantity=qty, unit_price=Decimal("1500"))
+            for name, qty in quantities.items()
+        ])
+        if placed:
+            outbox.record("order.placed", order_id=order.pk)
+        return order
+
+
+class PrepCountTests(OrderEventsMixin, TestCase):
+    def _counts(self):
+        outbox.process()
+        return {row.meal_id: (row.quantity, row.confirmed) for row in PrepCount.objects.all()}
+
+    def test_place_confirm_cancel_deliver(self):
+        first = self._order(garba=2, alloco=1)
+        second = self._order(garba=3)
+        self.assertEqual(self._counts(), {self.garba.id: (5, 0), self.alloco.id: (1, 0)})
+
+        states.transition(first, states.CONFIRMED)
+        self.assertEqual(self._counts(), {self.garba.id: (5, 2), self.alloco.id: (1, 1)})
+
+        states.transition(second, states.CANCELED)
+        self.assertEqual(self._counts(), {self.garba.id: (2, 2), self.alloco.id: (1, 1)})
+
+        states.transition(first, states.DELIVERED)
+        self.assertEqual(self._counts(), {self.garba.id: (0, 0), self.alloco.id: (0, 0)})
+        self.assertEqual(prep.prep_list(), [])
+
+    def test_rebuild_covers_orders_placed_before_the_counts(self):
+        legacy = self._order(placed=False, garba=4)  # ouverte avant la migration
+        prep.rebuild()
+        self._order(garba=1)
+        self.assertEqual(self._counts(), {self.garba.id: (5, 0)})
+
+        states.transition(legacy, states.DELIVERED)
+        self.assertEqual(self._counts(), {self.garba.id: (1, 0)})
+        self.assertEqual([row.quantity for row in prep.prep_list()], [1])
+
+
+class SalesRollupTests(OrderEventsMixin, TestCase):
+    def _snapshot(self):
+        fields = ("orders_count", "canceled_count", "pending_count", "items_count", "revenue")
+        return (
+            list(DailySales.objects.values_list("day", *fields)),
+            sorted(HourlySales.objects.values_list("day", "hour", "orders_count", "revenue")),
+            sorted(MealSales.objects.values_list("day", "meal_id", "quantity", "revenue")),
+        )
+
+    def test_incremental_deltas_match_rebuild_day(self):
+        orders = [self._order(garba=2, alloco=1), self._order(garba=1), self._order(alloco=3), self._order(garba=4)]
+        outbox.process()
+        states.transition(orders[0], states.CONFIRMED)
+        states.transition(orders[1], states.CANCELED)
+        states.transition(orders[0], states.DELIVERED)
+        states.transition(orders[2], states.DELIVERED)
+        outbox.process()
+
+        incremental = self._snapshot()
+        self.assertEqual(incremental[0][0][1:], (4, 1, 1, 10, Decimal("15000")))
+        rollups.rebuild_day(timezone.localdate())
+        self.assertEqual(self._snapshot(), incremental)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class OrderExportTests(OrderEventsMixin, TestCase):
+    def _export(self, fmt):
+        self.client.force_login(get_user_model().objects.create_user("chef", password="x", is_staff=True))
+        response = self.client.get(reverse("staff:order_export"), {"format": fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_rows_and_formula_escaping(self):
+        order = self._order(garba=2, alloco=1)
+        Order.objects.filter(pk=order.pk).update(customer_name='=HYPERLINK("http://x","y")', phone="+2250700")
+        self._order()  # commande sans plat : une ligne, plat vide
+
+        rows = list(csv.DictReader(self._export("csv").splitlines()))
+        self.assertEqual(len(rows), 3)
+        first = [r for r in rows if r["order_id"] == str(order.pk)]
+        self.assertEqual(sorted(r["meal_name"] for r in first), ["Alloco", "Garba"])
+        self.assertEqual(first[0]["customer_name"], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(first[0]["phone"], "'+2250700")
+        self.assertEqual(rows[-1]["meal_id"], "")
+
+    def test_jsonl_keeps_raw_values(self):
+        order = self._order(garba=2)
+        Order.objects.filter(pk=order.pk).update(customer_name="=1+1")
+        (record,) = [json.loads(line) for line in self._export("jsonl").splitlines()]
+        self.assertEqual(record["customer_name"], "=1+1")
+        self.assertEqual(record["items"][0]["quantity"], 2)
+
+
+class BulkOrderActionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user("chef", password="x", is_staff=True))
+
+    def _post(self, ids):
+        response = self.client.post(
+            reverse("staff:bulk_order_action"), {"action": "confirm", "order_ids": ids}, follow=True,
+        )
+        return [str(m) for m in messages.get_messages(response.wsgi_request)]
+
+    def _orders(self, n):
+        return Order.objects.bulk_create(
+            [Order(customer_name="c", phone="1", address="a", total=Decimal("1000")) for _ in range(n)]
+        )
+
+    def test_confirms_selection(self):
+        orders = self._orders(3)
+        self.assertEqual(self._post([o.pk for o in orders]), ["3 commande(s) confirmée(s)."])
+        self.assertEqual(Order.objects.filter(status="confirmed").count(), 3)
+
+    def test_oversized_selection_is_rejected_whole(self):
+        orders = self._orders(BULK_MAX_ORDERS + 1)
+        (message,) = self._post([o.pk for o in orders])
+        self.assertIn("aucune modifiée", message)
+        self.assertFalse(Order.objects.exclude(status="pending").exists())
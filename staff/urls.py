@@ -11,4 +11,15 @@ urlpatterns = [
         views.mark_order_delivered,
         name='mark_order_delivered',
     ),
+    path('admin/orders/bulk/', views.bulk_order_action, name='bulk_order_action'),
+    path('admin/orders/', views.order_list, name='order_list'),
+    path('admin/orders/export/', views.order_export, name='order_export'),
+    path('admin/api/orders/', views.order_list_api, name='order_list_api'),
+    path('admin/analytics/', views.sales_analytics, name='sales_analytics'),
+    path('admin/menu/', views.menu_planning, name='menu_planning'),
+    path('admin/menu/copy/', views.copy_menu, name='copy_menu'),
+    path('admin/prep/', views.prep_board, name='prep_board'),
+    path('admin/api/prep/', views.prep_api, name='prep_api'),
+    path('admin/live/', views.live_board, name='live_board'),
+    path('admin/live/stream/', views.order_stream, name='order_stream'),
 ]
\ No newline at end of file
@@ -1,45 +1,46 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from orders.cart import Cart
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Sum, F
+from django.urls import reverse
 from django.utils import timezone
-from orders.models import Order, OrderItem
-from shop.models import Meal
+from django.utils.dateparse import parse_date
+from orders.models import Order
+from shop import menu
+from shop.catalog import get_catalog
 from django.views.decorators.http import require_POST
 
-from orders.loyalty import apply_loyalty_on_delivery  # import
+from django.contrib import messages
+from orders import states
+from . import analytics, export, live, orderlist, prep, rollups
 # Create your views here.
 
 @staff_member_required
 def admin_dashboard(request):
     today = timezone.localdate()
 
-    orders_today = Order.objects.filter(created_at__date=today)
-    orders_count_today = orders_today.count()
-    total_sales_today = orders_today.aggregate(total=Sum('total'))['total'] or 0
-
-    pending_orders_count = Order.objects.filter(status='pending').count()
-
-    top_meals = (
-        OrderItem.objects
-        .filter(order__created_at__date=today)
-        .values('meal__name')
-        .annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum(F('quantity') * F('unit_price')),
-        )
-        .order_by('-quantity_sold')[:5]
-    )
+    # première page des commandes du jour (une requête, utilisateur joint)
+    orders_page = orderlist.page(date_from=today, date_to=today)
+
+    # compteurs : lignes d'agrégats, pas de scan des commandes
+    sales, pending_orders_count = rollups.today_summary(today)
+    top_meals = rollups.top_meals(today)
 
-    meals = Meal.objects.all().order_by('category__name', 'name')  # ← liste des plats
+    meals = get_catalog().meals  # ← liste des plats (triée catégorie, nom)
 
     context = {
         'today': today,
-        'orders_count_today': orders_count_today,
-        'total_sales_today': total_sales_today,
+        'orders_count_today': sales.orders_count,
+        'total_sales_today': sales.revenue,
         'pending_orders_count': pending_orders_count,
         'top_meals': top_meals,
-        'orders_today': orders_today,
+        'orders_today': orders_page.orders,
+        'orders_next_cursor': orders_page.next_cursor,
         'meals': meals,  # ← on envoie au template
     }
     return render(request, 'admin/dashboard.html', context)
@@ -55,14 +56,231 @@ def admin_dashboard(request):
 def mark_order_delivered(request, order_id):
     order = get_object_or_404(Order, id=order_id)
 
-    # garde-fou anti double comptage
-    if order.status != "delivered":
-        order.status = "delivered"
-        order.save(update_fields=["status"])
+    # CAS sur (statut, version) : deux clics simultanés => une seule livraison ;
+    # fidélité / parrainage suivent via l'outbox "order.delivered"
+    try:
+        states.transition(order, states.DELIVERED)
+    except states.TransitionError as exc:
+        messages.warning(request, exc.message)
+
+    return redirect("staff:admin_dashboard")
+
+
+BULK_ACTIONS = {
+    "confirm": (states.CONFIRMED, "confirmée(s)"),
+    "deliver": (states.DELIVERED, "livrée(s)"),
+    "cancel": (states.CANCELED, "annulée(s)"),
+}
+BULK_MAX_ORDERS = 200
+
+
+@staff_member_required
+@require_POST
+def bulk_order_action(request):
+    """
+    Passe toutes les commandes cochées en une requête (orders.states.bulk_transition).
+    Fidélité / parrainage : un événement outbox par commande, crédités en lot
+    par process_outbox.
+    """
+    action = BULK_ACTIONS.get(request.POST.get("action"))
+    try:
+        ids = sorted({int(pk) for pk in request.POST.getlist("order_ids")})
+    except ValueError:
+        ids = []
+    if action is None or not ids:
+        messages.warning(request, "Sélectionne au moins une commande et une action.")
+        return redirect("staff:admin_dashboard")
+    if len(ids) > BULK_MAX_ORDERS:
+        # refus en bloc plutôt que tronquer : aucune commande ne doit rester de côté sans le dire
+        messages.warning(request, f"{len(ids)} commandes sélectionnées : {BULK_MAX_ORDERS} maximum par action, aucune modifiée.")
+        return redirect("staff:admin_dashboard")
+
+    target, label = action
+    moved = states.bulk_transition(ids, target)
+    skipped = len(ids) - len(moved)
+    messages.success(request, f"{len(moved)} commande(s) {label}.")
+    if skipped:
+        messages.warning(request, f"{skipped} commande(s) ignorée(s) : statut incompatible ou modifiée entre-temps.")
+    return redirect("staff:admin_dashboard")
+
+
+@staff_member_required
+def order_list(request):
+    """Toutes les commandes, filtrées (statut, dates) et paginées par curseur."""
+    try:
+        params = orderlist.parse_params(request.GET)
+        result = orderlist.page(**params)
+    except orderlist.InvalidQuery as exc:
+        messages.warning(request, str(exc))
+        params = {'statuses': [], 'size': orderlist.PAGE_SIZE}
+        result = orderlist.page(**params)
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    return render(request, 'admin/order_list.html', {
+        'orders': result.orders,
+        'next_cursor': result.next_cursor,
+        'params': params,
+        'query': query.urlencode(),
+        'status_choices': Order.STATUS_CHOICES,
+    })
+
+
+@staff_member_required
+def order_list_api(request):
+    """
+    GET ?status=pending&status=confirmed&date_from=AAAA-MM-JJ&date_to=..&size=50&cursor=..
+    -> {"results": [...], "next": curseur ou null}
+    """
+    try:
+        result = orderlist.page(**orderlist.parse_params(request.GET))
+    except orderlist.InvalidQuery as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({
+        "results": [orderlist.as_json(o) for o in result.orders],
+        "next": result.next_cursor,
+    })
+
+
+@staff_member_required
+def order_export(request):
+    """
+    GET ?format=csv|jsonl&date_from=AAAA-MM-JJ&date_to=..&status=..
+    Réponse en flux (staff.export) : mémoire constante quelle que soit la période.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": "Format inconnu."}, status=400)
+    try:
+        params = orderlist.parse_params(request.GET)
+    except orderlist.InvalidQuery as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    filters = {k: params[k] for k in ('statuses', 'date_from', 'date_to') if k in params}
+
+    content_type = 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(export.stream(fmt, **filters), content_type=content_type)
+    span = '_'.join(str(params[k]) for k in ('date_from', 'date_to') if k in params) or 'tout'
+    response['Content-Disposition'] = f'attachment; filename="commandes_{span}.{fmt}"'
+    return response
+
+
+@staff_member_required
+def sales_analytics(request):
+    """Histogrammes, tendances et portions prévues pour demain (staff.analytics)."""
+    try:
+        days = max(7, min(int(request.GET.get('days', analytics.DEFAULT_DAYS)), 365))
+    except ValueError:
+        days = analytics.DEFAULT_DAYS
+    report = analytics.cached_report(days)
+    peak = max(report.hours['orders']) or 1
+    return render(request, 'admin/analytics.html', {
+        'report': report,
+        'hours': [
+            (hour, n, round(100 * n / peak)) for hour, n in enumerate(report.hours['orders']) if n
+        ],
+        'weekdays': list(zip(analytics.WEEKDAYS, report.weekdays['orders'], report.weekdays['quantity'])),
+    })
+
+
+@staff_member_required
+def prep_board(request):
+    """Portions restant à préparer par plat (staff.prep), une requête."""
+    return render(request, 'admin/prep_board.html', {'rows': prep.prep_list()})
+
+
+@staff_member_required
+def prep_api(request):
+    """JSON pour l'écran cuisine : {"meals": [{meal_id, name, quantity, confirmed, pending}]}."""
+    return JsonResponse({
+        "meals": [prep.as_json(row) for row in prep.prep_list()],
+        "generated_at": timezone.now().isoformat(),
+    })
+
+
+@staff_member_required
+def menu_planning(request):
+    """Menus des 7 prochains jours (shop.menu) ; édition dans l'admin DailyMenu."""
+    start = parse_date(request.GET.get('start') or '') or timezone.localdate()
+    days = menu.week(start)
+    return render(request, 'admin/menu_planning.html', {
+        'days': days,
+        'previous_week': start - timedelta(days=menu.PLANNING_DAYS),
+        'next_week': start + timedelta(days=menu.PLANNING_DAYS),
+    })
+
+
+@staff_member_required
+@require_POST
+def copy_menu(request):
+    """Recopie le menu de la veille sur le jour choisi."""
+    day = parse_date(request.POST.get('day') or '')
+    if day is None:
+        messages.warning(request, "Jour invalide.")
+        return redirect('staff:menu_planning')
+    if menu.copy(day - timedelta(days=1), day) is None:
+        messages.warning(request, f"Pas de menu le {day - timedelta(days=1):%d/%m} à recopier.")
+    else:
+        messages.success(request, f"Menu du {day:%d/%m} recopié depuis la veille.")
+    return redirect(f"{reverse('staff:menu_planning')}?start={request.POST.get('start', '')}")
+
+
+def _streaming(request) -> bool:
+    """Le flux SSE ne tient que sous ASGI ; sous WSGI il bloquerait un worker."""
+    return isinstance(request, ASGIRequest)
+
+
+@staff_member_required
+def live_board(request):
+    """
+    Tableau cuisine : liste du jour puis mises à jour poussées par order_stream
+    (sous ASGI), ou page rechargée toutes les LIVE_RELOAD_SECONDS (WSGI).
+    """
+    start, end = rollups.day_bounds(timezone.localdate())
+    orders = (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        .exclude(status__in=(states.DELIVERED, states.CANCELED))
+        .order_by('created_at')
+    )
+    return render(request, 'admin/live_board.html', {
+        'orders': orders,
+        'streaming': _streaming(request),
+        'reload_seconds': LIVE_RELOAD_SECONDS,
+    })
+
+
+LIVE_PING_SECONDS = 15
+LIVE_RELOAD_SECONDS = 30
+
 
-        apply_loyalty_on_delivery(order)
+async def order_stream(request):
+    """
+    Flux SSE des commandes (créées / changement de statut) pour le staff.
+    Vue async : à servir via resto.asgi (uvicorn, daphne...) ; sous WSGI
+    (gunicorn par défaut) réponse 503 immédiate, EventSource n'insiste pas.
+    """
+    user = await request.auser()
+    if not (user.is_active and user.is_staff):
+        return HttpResponseForbidden()
+    if not _streaming(request):
+        return HttpResponse("Flux direct disponible uniquement sous ASGI.", status=503, content_type="text/plain")
 
-    return redirect("admin_dashboard")
+    queue = live.hub.subscribe()
 
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=LIVE_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # garde la connexion ouverte derrière les proxys
+                    continue
+                data = json.dumps(message["order"])
+                yield f"id: {message['id']}\nevent: {message['type']}\ndata: {data}\n\n"
+        finally:
+            live.hub.unsubscribe(queue)
 
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 